@@ -0,0 +1,525 @@
+#! /usr/bin/python3
+
+# End-to-end benchmark: runs main() of xmr_tx_notify.py against a fake
+# monero-wallet-rpc and a fake IRC server, both local, and measures how long a
+# tx takes from arriving in the wallet until its pop-up, plus throughput and
+# CPU use of the notifier.
+# - fake wallet: JSON-RPC `get_height` / `get_transfers` (single and batched)
+#   and `get_transfer_by_txid`, `--history` old txs, new txs arrive with
+#   `--rate` per sec in the mempool and get mined every `--block-seconds`.
+#   With `--tx-notify` it pushes every new tx_id like tx_notify.py does (same
+#   datagram, without starting a process) and the notifier only scans every
+#   `--scan-interval` as a safety net.
+# - fake monerod ZMQ feed (`--zmq`, needs pyzmq): publishes txpool_add for
+#   every new tx and chain_main for every block, like `monerod --zmq-pub`.
+#   The notifier scans on these events, `--scan-interval` and
+#   `--pool-scan-interval` are only the fallback timer.
+# - worker isolation: `--rpc-delay` makes every wallet rpc request slow,
+#   `--stuck-every` lets every Nth pop-up hang until the supervisor restarts
+#   the renderer. The fake IRC server PINGs the bot every 0.2 sec, the PONG
+#   round-trip shows if the MessageReceiver still gets its turn.
+# - fake IRC server: TLS with a throw-away self-signed cert (IRCBot only talks
+#   TLS), sends a PRIVMSG with tx_id and message for `--message-ratio` of the
+#   txs, `--message-delay` sec after the tx arrived
+# - notifier: runs in a child process with a dummy display backend that only
+#   records every pop-up, and a short scan interval and pop-up duration
+#
+# Usage (from repository root):
+#   python3 benchmarks/bench_e2e.py [--seconds S] [--rate N] [--history N] [--max-p99-ms MS]
+# Exits with 1, if the p99 latency is above --max-p99-ms or pop-ups are missing.
+# Needs openssl (cert) and the notifier dependencies (requests, pysocks).
+
+import argparse
+import bisect
+import heapq
+import json
+import os
+import random
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOT_NICK = "bench_bot"
+CHANNEL  = "#bench"
+# Height of the fake wallet at startup
+START_HEIGHT = 3000000
+# Prefix of the lines the child writes for every pop-up and when it is done
+POP_UP_LINE = "BENCH_POP_UP "
+RESULT_LINE = "BENCH_RESULT "
+STUCK_LINE = "BENCH_STUCK "
+
+
+# <-------------------------------- Fake wallet ------------------------------->
+
+# Incoming transfers of one wallet, sorted by height. Txs with a height at or
+# above the current height are still in the mempool.
+class FakeWallet:
+    def __init__(self, history : int, block_seconds : float, rpc_delay : float = 0):
+        self.block_seconds = block_seconds
+        self.rpc_delay = rpc_delay
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.heights = []
+        self.transfers = []
+        # { tx_id : transfer }
+        self.by_tx_id = {}
+        self.num_requests = 0
+        for i in range(history):
+            height = START_HEIGHT - 1 - (history - i) // 10
+            self.append(os.urandom(32).hex(), 10**12, height)
+
+    def height(self):
+        return START_HEIGHT + int((time.monotonic() - self.start_time) / self.block_seconds)
+
+    def append(self, tx_id : str, amount : int, height : int):
+        self.heights.append(height)
+        self.transfers.append({"txid": tx_id, "amounts": [amount], "amount": amount,
+                               "height": height, "type": "in",
+                               "subaddr_index": {"major": 0, "minor": 0}})
+        self.by_tx_id[tx_id] = self.transfers[-1]
+
+    # New tx, in the mempool until the next block.
+    def add_tx(self, tx_id : str, amount : int):
+        with self.lock:
+            self.append(tx_id, amount, self.height())
+
+    def get_transfers(self, params : dict):
+        height = self.height()
+        res = {}
+        with self.lock:
+            # First tx that is still in the mempool
+            i_pool = bisect.bisect_left(self.heights, height)
+            if params.get("in"):
+                min_height = params.get("min_height", 0) if params.get("filter_by_height") else -1
+                i_min = bisect.bisect_right(self.heights, min_height)
+                res["in"] = self.transfers[i_min:i_pool]
+            if params.get("pool"):
+                res["pool"] = [dict(t, type="pool") for t in self.transfers[i_pool:]]
+        return {key : value for key, value in res.items() if len(value) > 0}
+
+    # Returns None, if the tx is not in the wallet.
+    def get_transfer_by_txid(self, params : dict):
+        with self.lock:
+            transfer = self.by_tx_id.get(params.get("txid"))
+        if transfer is None:
+            return None
+        if transfer["height"] >= self.height():
+            transfer = dict(transfer, type="pool", height=0)
+        return {"transfer": transfer, "transfers": [transfer]}
+
+    def handle(self, req : dict):
+        self.num_requests += 1
+        time.sleep(self.rpc_delay)
+        method = req.get("method")
+        if method == "get_height":
+            result = {"height": self.height()}
+        elif method == "refresh":
+            result = {"blocks_fetched": 0, "received_money": False}
+        elif method == "get_transfers":
+            result = self.get_transfers(req.get("params", {}))
+        elif method == "get_transfer_by_txid":
+            result = self.get_transfer_by_txid(req.get("params", {}))
+            if result is None:
+                return {"jsonrpc": "2.0", "id": req.get("id"),
+                        "error": {"code": -8, "message": "Transaction not found."}}
+        else:
+            return {"jsonrpc": "2.0", "id": req.get("id"),
+                    "error": {"code": -32601, "message": "Method not found"}}
+        return {"jsonrpc": "2.0", "id": req.get("id"), "result": result}
+
+
+class FakeWalletHandler(BaseHTTPRequestHandler):
+    # Set by start_fake_wallet()
+    wallet = None
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(req, list):
+            res = [self.wallet.handle(r) for r in req]
+        else:
+            res = self.wallet.handle(req)
+        body = json.dumps(res).encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Stand-in for `monerod --zmq-pub`, same topics and "<topic>:<json>" format.
+class FakeZMQPublisher:
+    def __init__(self, wallet : FakeWallet):
+        import zmq
+        self.wallet = wallet
+        self.sock = zmq.Context.instance().socket(zmq.PUB)
+        self.port = self.sock.bind_to_random_port("tcp://127.0.0.1")
+        # ZMQ sockets are not thread-safe
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.publish_blocks, daemon=True).start()
+
+    def publish(self, topic : str, payload):
+        with self.lock:
+            self.sock.send(f"{topic}:{json.dumps(payload)}".encode("UTF-8"))
+
+    def publish_tx(self, tx_id : str):
+        self.publish("json-minimal-txpool_add", [{"id": tx_id, "blob_size": 1500, "weight": 1500, "fee": 30000000}])
+
+    def publish_blocks(self):
+        height = self.wallet.height()
+        while True:
+            time.sleep(0.01)
+            new_height = self.wallet.height()
+            if new_height != height:
+                height = new_height
+                self.publish("json-minimal-chain_main", {"first_height": height - 1,
+                                                         "first_prev_id": "00" * 32,
+                                                         "ids": [os.urandom(32).hex()]})
+
+
+def start_fake_wallet(wallet : FakeWallet):
+    handler = type("Handler", (FakeWalletHandler,), {"wallet": wallet})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# <------------------------------ Fake IRC server ----------------------------->
+
+# Just enough IRC for IRCBot: welcome after login, PING/PONG, JOIN, and
+# PRIVMSGs from donors.
+class FakeIRCServer:
+    def __init__(self, cert_path : str, key_path : str):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert_path, key_path)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        self.client = None
+        self.send_lock = threading.Lock()
+        self.joined = threading.Event()
+        # { token : send time }, PONG round-trips in sec
+        self.pings = {}
+        self.ping_rtts = []
+
+    def start(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            sock, _ = self.sock.accept()
+            try:
+                client = self.context.wrap_socket(sock, server_side=True)
+            except (ssl.SSLError, OSError):
+                continue
+            threading.Thread(target=self.handle_client, args=(client,), daemon=True).start()
+
+    def handle_client(self, client : ssl.SSLSocket):
+        buffer = b""
+        while True:
+            try:
+                data = client.recv(4096)
+            except OSError:
+                return
+            if len(data) == 0:
+                return
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                self.handle_line(client, line.decode("UTF-8").strip())
+
+    def handle_line(self, client : ssl.SSLSocket, line : str):
+        command, _, params = line.partition(" ")
+        if command == "NICK":
+            self.send(client, f":fake.irc 001 {BOT_NICK} :Welcome to the benchmark")
+        elif command == "PING":
+            self.send(client, f":fake.irc PONG fake.irc {params}")
+        elif command == "JOIN":
+            self.client = client
+            self.joined.set()
+        elif command == "PONG":
+            send_time = self.pings.pop(params.rpartition(":")[2], None)
+            if send_time is not None:
+                self.ping_rtts.append(time.monotonic() - send_time)
+
+    # PING the bot until stopped, like a server checking its clients.
+    def ping(self, stop : threading.Event, interval : float = 0.2):
+        i = 0
+        while not stop.wait(interval):
+            i += 1
+            token = f"bench{i}"
+            self.pings[token] = time.monotonic()
+            self.send(self.client, f"PING :{token}")
+
+    def send(self, client : ssl.SSLSocket, line : str):
+        with self.send_lock:
+            client.sendall((line + "\r\n").encode("UTF-8"))
+
+    def privmsg(self, nick : str, text : str):
+        if self.client is not None:
+            self.send(self.client, f":{nick}!donor@bench PRIVMSG {BOT_NICK} :{text}")
+
+
+def create_cert(tmp_dir : str):
+    cert_path = os.path.join(tmp_dir, "cert.pem")
+    key_path = os.path.join(tmp_dir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                    "-keyout", key_path, "-out", cert_path, "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert_path, key_path
+
+
+# <----------------------------------- Child ---------------------------------->
+
+# Runs in the child process: main() of xmr_tx_notify.py with bench config and
+# a dummy display backend, until stdin is closed.
+def run_child(config : dict):
+    sys.path.insert(0, REPO_DIR)
+    import xmr_tx_notify as app
+    from src import metrics
+    from src.wallet_rpc import WalletRPC
+    from src.wallet_poller import WalletPoller, WalletPollerPool
+    from src.scheduler import PopUpScheduler
+    from src.bots.irc_manager import IRCReceiverManager
+
+    app.IS_FANCY_NOTIFY = False
+    app.JOURNAL_PATH = None
+    app.TRACE_PATH = config["trace"]
+    app.IS_MESSAGE_TX_LOOKUP = config["tx_lookup"]
+    if config["tx_notify_socket"] is not None:
+        from src.tx_notify_listener import TxNotifyListener
+        app.IS_TX_NOTIFY = True
+        app.TxNotifyListener = lambda: TxNotifyListener(config["tx_notify_socket"])
+        app.TX_NOTIFY_SCAN_INTERVAL_SECONDS = config["scan_interval"]
+    if config["zmq_url"] is not None:
+        from src.zmq_subscriber import ChainSubscriber
+        app.IS_ZMQ = True
+        app.ChainSubscriber = ChainSubscriber
+        app.ZMQ_URL = config["zmq_url"]
+        app.ZMQ_SCAN_INTERVAL_SECONDS = 300
+    app.SCAN_INTERVAL_SECONDS = config["scan_interval"]
+    app.MEMPOOL_SCAN_INTERVAL_SECONDS = config["pool_scan_interval"]
+    app.IS_MEMPOOL_DETECTION = True
+    app.WAIT_SECONDS_UNTIL_TX_SHOWN = config["wait"]
+    app.wallet_pool = WalletPollerPool([
+        WalletPoller("bench",
+                     WalletRPC(f"http://127.0.0.1:{config['wallet_port']}/json_rpc", "bench", "bench"),
+                     scan_interval = config["scan_interval"],
+                     pool_scan_interval = config["pool_scan_interval"])])
+    app.scheduler = PopUpScheduler(config["duration"], config["duration"], config["duration"], None, 0)
+    network = {"server": "localhost", "port": config["irc_port"], "password": "bench",
+               "botnick": BOT_NICK, "channel": CHANNEL, "use_proxy": False}
+    app.MessageReceiver = lambda: IRCReceiverManager([network])
+
+    # Dummy display backend, only records the pop-up
+    def record_pop_up(user_name : str, amount : int, message : str, duration : float):
+        print(POP_UP_LINE + json.dumps({"amount": amount, "user_name": user_name,
+                                        "time": time.time()}), flush=True)
+        time.sleep(duration)
+    app.notification_pop_up = record_pop_up
+    if config["stuck_every"] > 0:
+        import functools
+        from src.render_worker import RenderWorker
+        num_pop_ups = [0]
+        def record_or_hang(user_name : str, amount : int, message : str, duration : float):
+            num_pop_ups[0] += 1
+            if num_pop_ups[0] % config["stuck_every"] == 0:
+                print(STUCK_LINE + json.dumps({"amount": amount}), flush=True)
+                threading.Event().wait()
+            record_pop_up(user_name, amount, message, duration)
+        app.notification_pop_up = record_or_hang
+        app.RenderWorker = functools.partial(RenderWorker, stuck_seconds=1)
+
+    threading.Thread(target=app.main, daemon=True).start()
+    start_time = time.monotonic()
+    sys.stdin.read()
+
+    usage = os.times()
+    print(RESULT_LINE + json.dumps({"cpu": usage.user + usage.system,
+                                    "seconds": time.monotonic() - start_time,
+                                    "iterations": metrics.main_loop_iterations_total.values.get((), 0)}),
+          flush=True)
+    app.tracer.close()
+    os._exit(0)
+
+
+# <----------------------------------- Parent --------------------------------->
+
+# Same datagram as tx_notify.py, which monero-wallet-rpc would start.
+def push_tx_id(socket_path : str, tx_id : str):
+    sys.path.insert(0, REPO_DIR)
+    from src.tx_notify_listener import encode_push
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.sendto(encode_push(tx_id), socket_path)
+        except OSError as e:
+            print(f"Push failed: {e}", file=sys.stderr)
+
+
+def percentile(values : list, p : float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30, help="how long txs arrive")
+    parser.add_argument("--rate", type=float, default=5, help="new txs per sec")
+    parser.add_argument("--history", type=int, default=10000, help="old txs in the wallet")
+    parser.add_argument("--block-seconds", type=float, default=5)
+    parser.add_argument("--message-ratio", type=float, default=0.8)
+    parser.add_argument("--message-delay", type=float, default=0.5, help="sec from tx to PRIVMSG")
+    parser.add_argument("--wait", type=float, default=2, help="WAIT_SECONDS_UNTIL_TX_SHOWN")
+    parser.add_argument("--scan-interval", type=float, default=1)
+    parser.add_argument("--pool-scan-interval", type=float, default=0.5)
+    parser.add_argument("--duration", type=float, default=0.01, help="pop-up display time")
+    parser.add_argument("--max-p99-ms", type=float, default=None)
+    parser.add_argument("--trace", type=str, default=None, help="TRACE_PATH of the child")
+    parser.add_argument("--tx-notify", action="store_true", help="push new tx_ids like --tx-notify")
+    parser.add_argument("--no-tx-lookup", action="store_true", help="IS_MESSAGE_TX_LOOKUP = False")
+    parser.add_argument("--zmq", action="store_true", help="publish blocks and pool txs like monerod --zmq-pub")
+    parser.add_argument("--rpc-delay", type=float, default=0, help="sec every wallet rpc request takes")
+    parser.add_argument("--stuck-every", type=int, default=0, help="every Nth pop-up hangs")
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(json.loads(args.child))
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+    cert_path, key_path = create_cert(tmp_dir)
+    wallet = FakeWallet(args.history, args.block_seconds, args.rpc_delay)
+    wallet_server = start_fake_wallet(wallet)
+    irc = FakeIRCServer(cert_path, key_path)
+    irc.start()
+    publisher = None
+    if args.zmq:
+        publisher = FakeZMQPublisher(wallet)
+        publisher.start()
+
+    config = {"wallet_port": wallet_server.server_address[1], "irc_port": irc.port,
+              "wait": args.wait, "scan_interval": args.scan_interval,
+              "pool_scan_interval": args.pool_scan_interval, "duration": args.duration,
+              "trace": None if args.trace is None else os.path.abspath(args.trace),
+              "tx_notify_socket": os.path.join(tmp_dir, "tx.sock") if args.tx_notify else None,
+              "tx_lookup": not args.no_tx_lookup,
+              "zmq_url": f"tcp://127.0.0.1:{publisher.port}" if publisher is not None else None,
+              "stuck_every": args.stuck_every}
+    # IRCBot trusts the throw-away cert like any other
+    env = dict(os.environ, SSL_CERT_FILE=cert_path)
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", json.dumps(config)],
+                             cwd=tmp_dir, env=env, text=True,
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    pop_ups = {}
+    stuck = set()
+    result = {}
+    def read_child():
+        for line in child.stdout:
+            if line.startswith(POP_UP_LINE):
+                pop_up = json.loads(line[len(POP_UP_LINE):])
+                pop_ups[pop_up["amount"]] = pop_up["time"]
+            elif line.startswith(STUCK_LINE):
+                stuck.add(json.loads(line[len(STUCK_LINE):])["amount"])
+            elif line.startswith(RESULT_LINE):
+                result.update(json.loads(line[len(RESULT_LINE):]))
+    reader = threading.Thread(target=read_child, daemon=True)
+    reader.start()
+
+    if not irc.joined.wait(30):
+        child.kill()
+        sys.exit("Notifier didn't join the fake IRC channel in time.")
+    stop_ping = threading.Event()
+    threading.Thread(target=irc.ping, args=(stop_ping,), daemon=True).start()
+
+    # Txs arrive, messages follow after message_delay, amount identifies the tx
+    created = {}
+    messages = []
+    start_time = time.monotonic()
+    num_txs = int(args.seconds * args.rate)
+    for i in range(num_txs):
+        arrival_time = start_time + i / args.rate
+        while True:
+            now = time.monotonic()
+            while len(messages) > 0 and messages[0][0] <= now:
+                _, nick, text = heapq.heappop(messages)
+                irc.privmsg(nick, text)
+            if now >= arrival_time:
+                break
+            time.sleep(min(arrival_time - now, messages[0][0] - now if len(messages) > 0 else 1))
+        tx_id = os.urandom(32).hex()
+        amount = i + 1
+        created[amount] = time.time()
+        wallet.add_tx(tx_id, amount)
+        if args.tx_notify:
+            push_tx_id(config["tx_notify_socket"], tx_id)
+        if publisher is not None:
+            publisher.publish_tx(tx_id)
+        if random.random() < args.message_ratio:
+            heapq.heappush(messages, (time.monotonic() + args.message_delay, f"donor{i}", f"{tx_id}: bench {i}"))
+    while len(messages) > 0:
+        time.sleep(max(0, messages[0][0] - time.monotonic()))
+        _, nick, text = heapq.heappop(messages)
+        irc.privmsg(nick, text)
+
+    # Drain: the last txs still have to be mined, scanned and time out
+    drain_end_time = time.monotonic() + args.wait + args.block_seconds + args.scan_interval + 5
+    while len(pop_ups) + len(stuck) < num_txs and time.monotonic() < drain_end_time:
+        time.sleep(0.1)
+    stop_ping.set()
+    child.stdin.close()
+    child.wait(10)
+    reader.join(5)
+
+    latencies_ms = [(pop_ups[amount] - created_time) * 1000
+                    for amount, created_time in created.items() if amount in pop_ups]
+    # Pop-ups that hung on purpose are expected to be missing
+    num_missing = num_txs - len(latencies_ms) - len(stuck)
+    print(f"e2e: {args.seconds:.0f} s, {args.rate} tx/s, history {args.history} txs, "\
+          f"{args.message_ratio*100:.0f}% with message")
+    print(f"  txs          {num_txs:8d}")
+    print(f"  pop-ups      {len(latencies_ms):8d}, missing {num_missing}"\
+          + (f", stuck {len(stuck)}" if len(stuck) > 0 else ""))
+    if len(latencies_ms) > 0:
+        print(f"  latency      p50 {percentile(latencies_ms, 50):8.1f} ms")
+        print(f"               p90 {percentile(latencies_ms, 90):8.1f} ms")
+        print(f"               p99 {percentile(latencies_ms, 99):8.1f} ms")
+        print(f"               max {max(latencies_ms):8.1f} ms")
+        print(f"               avg {statistics.mean(latencies_ms):8.1f} ms")
+    if len(result) > 0:
+        print(f"  throughput   {len(latencies_ms) / result['seconds']:8.2f} pop-ups/s")
+        print(f"  cpu          {result['cpu']:8.2f} s ({result['cpu'] / result['seconds'] * 100:.1f}% of one core)")
+        print(f"  main loop    {result['iterations'] / result['seconds']:8.1f} iterations/s")
+    print(f"  wallet rpc   {wallet.num_requests / (time.monotonic() - start_time):8.2f} requests/s")
+    if len(irc.ping_rtts) > 0:
+        rtts_ms = [rtt * 1000 for rtt in irc.ping_rtts]
+        print(f"  irc pong     p50 {percentile(rtts_ms, 50):8.1f} ms, p99 {percentile(rtts_ms, 99):.1f} ms, "\
+              f"max {max(rtts_ms):.1f} ms, unanswered {len(irc.pings)}")
+
+    if num_missing > 0 or\
+            (args.max_p99_ms is not None and len(latencies_ms) > 0 and percentile(latencies_ms, 99) > args.max_p99_ms):
+        print("REGRESSION: missing pop-ups or p99 latency above --max-p99-ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
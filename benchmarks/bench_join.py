@@ -0,0 +1,89 @@
+#! /usr/bin/python3
+
+# Tx <-> message join micro-benchmark: cost of matching per event, with a
+# growing number of pending txs that never get a message (e.g. WAIT_SECONDS_UNTIL_TX_SHOWN = -1).
+# - polling: the old update_confirmed_messages(), re-joins every pending tx
+#   every main loop pass
+# - event:   TxMessageMatcher, one lookup when a tx or message arrives
+#
+# Usage (from repository root):
+#   python3 benchmarks/bench_join.py [--pending N ...] [--events N]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ledger import TxLedger
+from src.matcher import TxMessageMatcher
+from src.bots.message_index import MessageIndex
+
+
+def tx_id(i : int, salt : int = 0):
+    return f"{salt:08x}{i:056x}"
+
+
+# Ledger with `num_pending` unmatched txs and an index with a message per
+# event tx, without rate limit and TTL getting in the way.
+def setup(num_pending : int, num_events : int):
+    ledger = TxLedger(wait_seconds = None)
+    for i in range(num_pending):
+        ledger.add_tx(TxLedger.to_bin(tx_id(i)), 1)
+    index = MessageIndex(max_entries = num_events + 1, ttl_seconds = 3600)
+    return ledger, index
+
+
+# Old behaviour: every event (one main loop pass) joins all pending txs.
+def bench_polling(num_pending : int, num_events : int):
+    ledger, index = setup(num_pending, num_events)
+    start = time.perf_counter()
+    for i in range(num_events):
+        ledger.add_tx(TxLedger.to_bin(tx_id(i, 1)), 1)
+        index.add(tx_id(i, 1), "user", "message", is_rate_limited = False)
+        for pending_tx_id in list(ledger.pending):
+            pending_tx_id_hex = pending_tx_id.hex()
+            if pending_tx_id_hex in index:
+                user_name, message = list(index[pending_tx_id_hex].items())[0]
+                ledger.enqueue(pending_tx_id, user_name, message)
+    elapsed = time.perf_counter() - start
+    assert len(ledger.queue) == num_events
+    return elapsed / num_events
+
+
+# Matcher: txs and messages alternate which one arrives first.
+def bench_event(num_pending : int, num_events : int):
+    ledger, index = setup(num_pending, num_events)
+    matcher = TxMessageMatcher(ledger, index, "anon", "")
+    start = time.perf_counter()
+    for i in range(num_events):
+        if i % 2 == 0:
+            ledger.add_tx(TxLedger.to_bin(tx_id(i, 1)), 1)
+            matcher.on_tx(tx_id(i, 1))
+            index.add(tx_id(i, 1), "user", "message", is_rate_limited = False)
+        else:
+            index.add(tx_id(i, 1), "user", "message", is_rate_limited = False)
+            ledger.add_tx(TxLedger.to_bin(tx_id(i, 1)), 1)
+            matcher.on_tx(tx_id(i, 1))
+    elapsed = time.perf_counter() - start
+    assert len(ledger.queue) == num_events
+    return elapsed / num_events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pending", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"join cost per event, {args.events} events:")
+    print(f"  {'pending':>8}  {'polling':>12}  {'event':>12}")
+    for num_pending in args.pending:
+        polling_us = bench_polling(num_pending, args.events) * 10**6
+        event_us = bench_event(num_pending, args.events) * 10**6
+        print(f"  {num_pending:8d}  {polling_us:9.2f} us  {event_us:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#! /usr/bin/python3
+
+# Render micro-benchmark: time PopUpWindow.draw() takes for name, amount and
+# message, with the TextRenderer cache vs. the per-character wrap that
+# rendered every line on every pop-up.
+# Runs offscreen (SDL dummy video driver), only text rendering and blitting
+# are measured, not the window. "text" is the same without the blits, i.e.
+# wrapping and font rendering, which is what the cache saves. Word wrapping
+# fills the lines up to the window width, so a pop-up shows (and blits) more
+# of a long message than with 30 characters per line.
+# The workload is like a stream: a few regulars send most donations, amounts
+# are mostly round, some messages repeat (e.g. copy-pasted "gm").
+#
+# Usage (from repository root):
+#   python3 benchmarks/bench_render.py [--pop-ups N] [--regulars N]
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "hide"
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import pygame
+
+from src import popup
+from src.misc import amt2str
+from src.text_layout import TextRenderer
+
+WIDTH  = 600
+HEIGHT = 300
+MAX_LEN_ROWS = 7
+# Characters per line of the per-character wrap
+MAX_LEN_LINE = 30
+
+WORDS = ("monero", "privacy", "thanks", "for", "the", "stream", "great", "content",
+         "keep", "it", "up", "love", "from", "germany", "fungibility", "is", "freedom",
+         "hello", "chat", "what", "a", "play", "lmao", "gm", "subaddresses", "rock")
+ROUND_AMOUNTS = (10**10, 5 * 10**10, 10**11, 2.5 * 10**11, 10**12)
+
+
+def make_workload(num_pop_ups : int, num_regulars : int, rng : random.Random):
+    regulars = [f"regular_{i}" for i in range(num_regulars)]
+    canned = ["gm", "thanks for the stream", "keep it up"]
+    workload = []
+    for i in range(num_pop_ups):
+        if rng.random() < 0.7:
+            user_name = rng.choice(regulars)
+        else:
+            user_name = f"anon_{i}"
+        if rng.random() < 0.6:
+            amount = int(rng.choice(ROUND_AMOUNTS))
+        else:
+            amount = rng.randrange(10**9, 10**13)
+        if rng.random() < 0.2:
+            message = rng.choice(canned)
+        else:
+            message = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(3, 45)))
+        workload.append((user_name, amount, message))
+    return workload
+
+
+# PopUpWindow with fonts and an offscreen display, no assets or window.
+def make_window():
+    pygame.init()
+    popup.pygame = pygame
+    window = popup.PopUpWindow(0, 0, WIDTH, HEIGHT, "bench", "sent", "", "", "", MAX_LEN_ROWS)
+    window.font_med      = pygame.font.Font(None, popup.FONT_SIZE_MED)
+    window.font_med_bold = pygame.font.Font(None, popup.FONT_SIZE_MED_BOLD)
+    window.font_big_bold = pygame.font.Font(None, popup.FONT_SIZE_BIG_BOLD)
+    window.font_med_bold.set_bold(True)
+    window.font_big_bold.set_bold(True)
+    window.display = pygame.display.set_mode((WIDTH, HEIGHT))
+    window.base_surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+    return window
+
+
+# How draw() worked before the TextRenderer, for comparison.
+def draw_per_character(window, user_name : str, amount : int, message : str):
+    window.display.blit(window.base_surface, (0,0))
+
+    text = window.font_big_bold.render(user_name, True, popup.COLOR_NAME)
+    window.display.blit(text, (popup.PADDING_LEFT, 20))
+    text = window.font_big_bold.render(f"{amt2str(amount)} XMR", True, popup.COLOR_AMOUNT)
+    window.display.blit(text, (popup.PADDING_LEFT+92, 56))
+
+    row = 0
+    sub_str = ""
+    for i in range(len(message)):
+        sub_str += message[i]
+        if (i != 0) and (i % MAX_LEN_LINE == 0) or (i == len(message)-1):
+            text = window.font_med.render(sub_str, True, popup.COLOR_TEXT)
+            window.display.blit(text, (popup.PADDING_LEFT, 98+row*28))
+            row += 1
+            sub_str = ""
+            if row == MAX_LEN_ROWS:
+                break
+
+
+# Only the text surfaces of draw_per_character()
+def text_per_character(window, user_name : str, amount : int, message : str):
+    window.font_big_bold.render(user_name, True, popup.COLOR_NAME)
+    window.font_big_bold.render(f"{amt2str(amount)} XMR", True, popup.COLOR_AMOUNT)
+    row = 0
+    sub_str = ""
+    for i in range(len(message)):
+        sub_str += message[i]
+        if (i != 0) and (i % MAX_LEN_LINE == 0) or (i == len(message)-1):
+            window.font_med.render(sub_str, True, popup.COLOR_TEXT)
+            row += 1
+            sub_str = ""
+            if row == MAX_LEN_ROWS:
+                break
+
+
+# Only the text surfaces of PopUpWindow.draw()
+def text_renderer(window, user_name : str, amount : int, message : str):
+    window.text.render(user_name, window.font_big_bold, popup.COLOR_NAME)
+    window.text.render(f"{amt2str(amount)} XMR", window.font_big_bold, popup.COLOR_AMOUNT)
+    window.text.render_wrapped(message, window.font_med, popup.COLOR_TEXT,
+                               window.max_line_width, window.max_len_rows)
+
+
+def measure(draw, workload : list):
+    times_us = []
+    for user_name, amount, message in workload:
+        start = time.perf_counter()
+        draw(user_name, amount, message)
+        times_us.append((time.perf_counter() - start) * 10**6)
+    return times_us
+
+
+def percentile(values : list, p : float):
+    values = sorted(values)
+    return values[min(len(values)-1, int(len(values) * p / 100))]
+
+
+def report(name : str, times_us : list):
+    print(f"  {name:16s} p50 {percentile(times_us, 50):7.1f} us, p99 {percentile(times_us, 99):7.1f} us, "
+          f"avg {statistics.mean(times_us):7.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pop-up text render micro-benchmark")
+    parser.add_argument("--pop-ups", type=int, default=2000, help="pop-ups drawn per variant")
+    parser.add_argument("--regulars", type=int, default=20, help="users that send most donations")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workload = make_workload(args.pop_ups, args.regulars, random.Random(args.seed))
+    window = make_window()
+
+    print(f"render: {args.pop_ups} pop-ups, {args.regulars} regulars, {WIDTH}x{HEIGHT}")
+    report("per-character", measure(lambda *pop_up: draw_per_character(window, *pop_up), workload))
+    report("  text", measure(lambda *pop_up: text_per_character(window, *pop_up), workload))
+    # Cold cache for each run
+    window.text = TextRenderer()
+    report("text renderer", measure(window.draw, workload))
+    window.text = TextRenderer()
+    report("  text", measure(lambda *pop_up: text_renderer(window, *pop_up), workload))
+    print(f"  surface cache    {window.text.surfaces.hit_rate():7.1%} hits "
+          f"({window.text.surfaces.num_hits} / {window.text.surfaces.num_misses} misses)")
+    print(f"  layout cache     {window.text.layouts.hit_rate():7.1%} hits "
+          f"({window.text.layouts.num_hits} / {window.text.layouts.num_misses} misses)")
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#! /usr/bin/python3
+
+# Startup-time benchmark: how long it takes to import xmr_tx_notify.py, i.e.
+# everything that runs before main() talks to the wallet rpc.
+# pygame and the assets are loaded in the background, so they must not show
+# up here.
+#
+# Usage (from repository root):
+#   python3 benchmarks/bench_startup.py [--runs N] [--max-ms MS]
+# Exits with 1, if the median is above --max-ms.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import only, `__name__` is not `__main__`, so main() does not run.
+IMPORT_CMD = [sys.executable, "-c", "import xmr_tx_notify"]
+
+
+def measure(runs : int):
+    times_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(IMPORT_CMD, cwd=REPO_DIR, check=True,
+                       stdout=subprocess.DEVNULL)
+        times_ms.append((time.perf_counter() - start) * 1000)
+    return times_ms
+
+
+# Slowest imported modules, from `python -X importtime`.
+def slowest_imports(count : int):
+    res = subprocess.run([sys.executable, "-X", "importtime"] + IMPORT_CMD[1:],
+                         cwd=REPO_DIR, check=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [x.strip() for x in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    times_ms = measure(args.runs)
+    median = statistics.median(times_ms)
+    print(f"startup (import xmr_tx_notify), {args.runs} runs:")
+    print(f"  min {min(times_ms):8.1f} ms")
+    print(f"  med {median:8.1f} ms")
+    print(f"  max {max(times_ms):8.1f} ms")
+
+    print("slowest imports (cumulative):")
+    for cumulative_us, name in slowest_imports(10):
+        print(f"  {cumulative_us/1000:8.1f} ms  {name}")
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"REGRESSION: median {median:.1f} ms > {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
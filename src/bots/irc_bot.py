@@ -1,8 +1,12 @@
 import socket
 import ssl
+import time
 import socks # connect via Tor socks5 on 127.0.0.1:9050
 
 from src.misc import *
+from src import metrics
+from src.bots.irc_protocol import IRCMessage, IRCLineBuffer
+from src.bots.message_index import MessageIndex
 
 # <---------------------------------- Config ---------------------------------->
 
@@ -19,6 +23,16 @@ USE_PROXY  = True
 PROXY_IP   = "127.0.0.1"
 PROXY_PORT = 9150                # 9150 = tor browser, 9050 = tor daemon
 
+# Networks the bot connects to (all at once), each one can overwrite the
+# settings above, e.g.
+#   {"server": "irc.libera.chat", "botnick": "unnamed_bot", "channel": "#channel-name"},
+#   {"server": "irc.example.org", "port": 6697, "use_proxy": False},
+IRC_NETWORKS = [
+    {"server": IRC_SERVER, "port": IRC_PORT, "password": IRC_PASSWORD,
+     "botnick": IRC_BOTNICK, "channel": IRC_CHANNEL,
+     "use_proxy": USE_PROXY, "proxy_ip": PROXY_IP, "proxy_port": PROXY_PORT},
+]
+
 
 # <--------------------------------- Constant --------------------------------->
 
@@ -27,6 +41,10 @@ PROXY_PORT = 9150                # 9150 = tor browser, 9050 = tor daemon
 # Constants
 CONN_TIMEOUT = 30   # in sec, socket times out if it fails to connect in time
 RECV_TIMEOUT = 1    # in sec, socket blocks while recv until timeout, doesn't fail, just tries again
+RECV_BUFFER_SIZE = 4096 # in bytes, max read per recv
+
+# Token of our own PINGs, their PONG gives the lag to the server
+LAG_PING_TOKEN = "xmr_tx_notify"
 
 # IRC end of line
 ENDL = "\r\n"
@@ -38,24 +56,53 @@ PRE_MSG = "IRC_Bot"
 
 class IRCBot:
     def __init__(self,
-                 server   : str = IRC_SERVER,
-                 port     : int = IRC_PORT,
-                 password : str = IRC_PASSWORD,
-                 botnick  : str = IRC_BOTNICK):
+                 server     : str = IRC_SERVER,
+                 port       : int = IRC_PORT,
+                 password   : str = IRC_PASSWORD,
+                 botnick    : str = IRC_BOTNICK,
+                 channel    : str = IRC_CHANNEL,
+                 use_proxy  : bool = USE_PROXY,
+                 proxy_ip   : str = PROXY_IP,
+                 proxy_port : int = PROXY_PORT,
+                 potential_tx_id_msg_map : MessageIndex = None,
+                 is_auto_connect : bool = True):
 
         # Init vars
+        self.server = server
+        self.port = port
+        self.password = password
         self.botnick = botnick
+        self.channel = channel
+        self.use_proxy = use_proxy
+        self.proxy_ip = proxy_ip
+        self.proxy_port = proxy_port
+        self.sock = None
         self.is_joined_channel = False
-        # { tx_id : {user_name : message} }
-        self.potential_tx_id_msg_map = {}
-
-        msg_extra = ""
+        self.is_connected = False
+        # Frames received bytes into complete lines
+        self.line_buffer = IRCLineBuffer()
+        # time.monotonic() of the last lag PING, and of the one without PONG yet
+        self.last_lag_ping_time = float("-inf")
+        self.lag_ping_time = None
+        # Bounded { tx_id : {user_name : message} }
+        # Can be shared by several bots, to get one index for all networks.
+        self.potential_tx_id_msg_map = MessageIndex() if potential_tx_id_msg_map is None else potential_tx_id_msg_map
+
+        if is_auto_connect:
+            self.connect()
+
+    # Blocks until connected (or CONN_TIMEOUT), raises OSError on failure.
+    def connect(self):
+        self.is_joined_channel = False
+        self.line_buffer = IRCLineBuffer()
+        self.last_lag_ping_time = time.monotonic()
+        self.lag_ping_time = None
 
         # Init socket
-        if USE_PROXY:
+        if self.use_proxy:
             # Tor SOCKS5 proxy socket
             sock = socks.socksocket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.set_proxy(socks.SOCKS5, PROXY_IP, PROXY_PORT)
+            sock.set_proxy(socks.SOCKS5, self.proxy_ip, self.proxy_port)
             msg_extra = " over tor"
         else:
             # Normal socket
@@ -64,29 +111,49 @@ class IRCBot:
 
         # Connect
         sock.settimeout(CONN_TIMEOUT)
-        sock.connect((server, port))
+        sock.connect((self.server, self.port))
 
         # TLS / SSL socket
         context = ssl.create_default_context()
         context.verify_flags &= ssl.VERIFY_ALLOW_PROXY_CERTS
-        self.sock = context.wrap_socket(sock, server_hostname=server)
+        self.sock = context.wrap_socket(sock, server_hostname=self.server)
 
         self.sock.settimeout(RECV_TIMEOUT)
+        self.is_connected = True
 
         # Send login commands + args to IRC server
-        self.send("PASS", password)
-        self.send("USER", botnick + " " + botnick + " " + botnick + " " + botnick)
-        self.send("NICK", botnick)
+        self.send("PASS", self.password)
+        self.send("USER", self.botnick + " " + self.botnick + " " + self.botnick + " " + self.botnick)
+        self.send("NICK", self.botnick)
+        if not self.is_connected:
+            self.sock.close()
+            raise ConnectionError(f"Sending login to {self.server} failed.")
 
-        printm(PRE_MSG, f"Connected and sent login information to {server}:{port}{msg_extra}.")
+        printm(PRE_MSG, f"Connected and sent login information to {self.server}:{self.port}{msg_extra}.")
 
+    def close(self):
+        self.is_connected = False
+        self.is_joined_channel = False
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
 
+
+    # A failed send marks the connection as lost, like recv() does, the
+    # IRCReceiverManager reconnects.
     def send(self, command : str, msg : str):
         # command + space + \r\n
         msg_extra_len = len(command) + 1 + 2
         if msg_extra_len + len(msg) > 512:
             msg = msg[:512-msg_extra_len]
-        self.sock.send(bytes(command + " " + msg + ENDL, "UTF-8"))
+        try:
+            self.sock.send(bytes(command + " " + msg + ENDL, "UTF-8"))
+        except OSError as e:
+            if self.is_connected:
+                printw(PRE_MSG, f"Connection to {self.server} lost: {e}")
+            self.is_connected = False
 
     def join_channel(self, channel : str):
         self.send("JOIN", channel)
@@ -95,37 +162,47 @@ class IRCBot:
 
     # Respond to server pings, so we don't get kicked
     def ping_pong(self, response : str):
-        self.send("PONG :", response)
+        self.send("PONG", ":" + response)
         printm(PRE_MSG, f">> PONG {response}")
 
-    def handle_welcome(self, msg : str):
-        printd(PRE_MSG, f"msg:\n{msg}\n<--msg end-->")
-        if "Welcome" in msg:
-            self.join_channel(IRC_CHANNEL)
-
-    def handle_ping_pong(self, msg : str):
-        if "PING :" in msg:
-            start_idx = msg.find("PING :")+6
-            end_idx = msg[start_idx:].find(ENDL)
-            if end_idx == -1:
-                self.ping_pong(msg[start_idx:])
-            else:
-                self.ping_pong(msg[start_idx:start_idx+end_idx])
+    # Measure the lag to the server, answered by handle_pong().
+    def send_lag_ping(self, now : float):
+        self.send("PING", ":" + LAG_PING_TOKEN)
+        self.last_lag_ping_time = now
+        self.lag_ping_time = now
+
+    def handle_pong(self, msg : IRCMessage):
+        if msg.command != "PONG" or len(msg.params) == 0 or msg.params[-1] != LAG_PING_TOKEN:
+            return False
+        if self.lag_ping_time is not None:
+            metrics.irc_lag_seconds.observe(time.monotonic() - self.lag_ping_time, (self.server,))
+            self.lag_ping_time = None
+        return True
+
+    # RPL_WELCOME, server accepted our login
+    def handle_welcome(self, msg : IRCMessage):
+        if msg.command == "001":
+            printd(PRE_MSG, f"welcome: {msg}")
+            self.join_channel(self.channel)
+            return True
+        return False
+
+    def handle_ping_pong(self, msg : IRCMessage):
+        if msg.command == "PING":
+            self.ping_pong(msg.params[-1] if len(msg.params) > 0 else "")
             return True
         return False
 
-    def handle_private_msg(self, msg : str):
-        handled_priv_msg = False
-        for m in msg.split(ENDL):
-            if not "PRIVMSG "+self.botnick+" :" in m:
-                continue
-            user_name = m[1:m.find("!")]
-            priv_msg = m[m.find(self.botnick+" :")+len(self.botnick)+2:]
-            self.find_potential_tx_id_msg_pair(user_name, priv_msg)
-            printd(PRE_MSG, "handle priv msg " + priv_msg)
-            printd(PRE_MSG, "user_name " + user_name)
-            handled_priv_msg = True
-        return handled_priv_msg
+    def handle_private_msg(self, msg : IRCMessage):
+        if msg.command != "PRIVMSG" or len(msg.params) < 2 or\
+                msg.params[0].lower() != self.botnick.lower():
+            return False
+        user_name = msg.nick
+        priv_msg = msg.params[-1]
+        printd(PRE_MSG, "handle priv msg " + priv_msg)
+        printd(PRE_MSG, "user_name " + user_name)
+        self.find_potential_tx_id_msg_pair(user_name, priv_msg)
+        return True
 
     # Everything else is pretty generic bot stuff, this is where the customization begins.
     # Just check length and allowed chars to see if tx_id could be valid.
@@ -135,44 +212,64 @@ class IRCBot:
             return False
         printd(PRE_MSG, "user " + user_name)
         printd(PRE_MSG, "msg " + msg)
-        # Check tx_id
-        tx_id = msg[msg.find("\2")+1:msg.find(":")].strip(" ")
-        if len(tx_id) != 64:
-            printw(PRE_MSG, f"Abort: invalid tx_id length: {len(tx_id)}")
+        # Check tx_id, wallets show it in lower case, some users paste it in upper case
+        tx_id = msg[msg.find("\2")+1:msg.find(":")].strip(" ").lower()
+        if not is_tx_id(tx_id):
+            printw(PRE_MSG, f"Abort: invalid tx_id: {tx_id[:64]!r}")
             return False
-        for chr in tx_id:
-            if not ((ord(chr) >= 97 and ord(chr) <= 102) or (ord(chr) >= 48 and ord(chr) <= 57)):
-                printw(PRE_MSG, f"Abort: invalid tx_id char: {chr}")
-                return False
 
         message = msg[msg.find(":")+1:]
 
-        if tx_id not in self.potential_tx_id_msg_map:
+        # Rate limited per user, flood of fake tx_ids doesn't grow the index
+        if self.potential_tx_id_msg_map.add(tx_id, user_name, message):
             printm(PRE_MSG, f"Added potential <tx_id>:<msg> pair:\n"\
                             f"\tuser: {user_name}\n"\
                             f"\ttx_id: {tx_id}\n"\
                             f"\tmessage:{message}")
-            self.potential_tx_id_msg_map[tx_id] = {user_name : message}
             return True
         return False
 
+    # Lets the socket be registered in a selector, to only call step() when readable.
+    def fileno(self):
+        return self.sock.fileno()
+
+    # TLS socket may hold already decrypted data, which doesn't make the socket readable.
+    def has_pending(self):
+        return self.is_connected and self.sock.pending() > 0
+
+    # Returns list of complete IRCMessages, lines split over several reads are
+    # kept in the line buffer until they are complete.
     def recv(self):
         try:
-            return self.sock.recv(2048).decode("UTF-8").strip(ENDL)
+            data = self.sock.recv(RECV_BUFFER_SIZE)
         except TimeoutError:
-            return ""
-
+            return []
+        except OSError as e:
+            printw(PRE_MSG, f"Connection to {self.server} lost: {e}")
+            self.is_connected = False
+            return []
+        if len(data) == 0:
+            printw(PRE_MSG, f"Connection closed by {self.server}.")
+            self.is_connected = False
+            return []
+        return self.line_buffer.feed_messages(data)
+
+    # Handle every line of the received chunk
     def step(self):
-        irc_msg = self.recv()
-        if len(irc_msg) == 0:
+        if not self.is_connected:
             return
 
-        printd(PRE_MSG, f"IRC MSG:\n{irc_msg}")
-
-        if not self.is_joined_channel and self.handle_welcome(irc_msg):
-            pass
-        elif self.handle_ping_pong(irc_msg):
-            pass
-        elif self.is_joined_channel and self.handle_private_msg(irc_msg):
-            pass
-
+        for msg in self.recv():
+            # A send for an earlier line failed
+            if not self.is_connected:
+                return
+            printd(PRE_MSG, f"IRC MSG: {msg}")
+
+            if self.handle_ping_pong(msg):
+                pass
+            elif self.handle_pong(msg):
+                pass
+            elif not self.is_joined_channel and self.handle_welcome(msg):
+                pass
+            elif self.is_joined_channel and self.handle_private_msg(msg):
+                pass
@@ -0,0 +1,148 @@
+import selectors
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.misc import *
+from src import metrics
+from src.bots.irc_bot import IRCBot, IRC_NETWORKS
+from src.bots.message_index import MessageIndex
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# Connects run in the background, so a slow (Tor) connect doesn't block the main loop.
+MAX_CONNECT_WORKERS = 4
+# in sec, wait before reconnecting a lost network, doubles up to the max
+RECONNECT_BACKOFF_SECONDS     = 5
+RECONNECT_BACKOFF_MAX_SECONDS = 300
+# in sec, how often to check on connects running in the background
+CONNECT_POLL_SECONDS = 0.5
+# in sec, how often every joined bot pings its server to measure the lag
+LAG_PING_SECONDS = 60
+
+# Output prefix
+PRE_MSG = "IRC_Manager"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# MessageReceiver for many IRC networks/channels at once.
+# Every IRCBot gets registered in the main loop selector, so all networks are
+# handled by one loop without a thread per network, and all bots write into
+# one shared potential_tx_id_msg_map.
+class IRCReceiverManager:
+    def __init__(self, networks : list = IRC_NETWORKS):
+        # Bounded { tx_id : {user_name : message} }, shared by all bots
+        self.potential_tx_id_msg_map = MessageIndex()
+
+        self.bots = [IRCBot(**network,
+                            potential_tx_id_msg_map = self.potential_tx_id_msg_map,
+                            is_auto_connect = False)
+                     for network in networks]
+        self.selector = None
+
+        # Background connects: { bot : future }
+        self.executor = ThreadPoolExecutor(max_workers = max(1, min(MAX_CONNECT_WORKERS, len(self.bots))),
+                                           thread_name_prefix = "irc_connect")
+        self.connecting = {}
+        # { bot : (reconnect time.monotonic(), backoff) }
+        self.reconnect_at = {}
+
+        for bot in self.bots:
+            self.connect(bot)
+
+    # Every bot joined its channel
+    @property
+    def is_ready(self):
+        return all(bot.is_joined_channel for bot in self.bots)
+
+    # A connect failed or a connection was lost, e.g. for `--check`, which
+    # doesn't wait for the reconnects.
+    @property
+    def is_failed(self):
+        return len(self.reconnect_at) > 0
+
+    def connect(self, bot : IRCBot):
+        printm(PRE_MSG, f"Connecting to {bot.server}:{bot.port} ...")
+        self.connecting[bot] = self.executor.submit(bot.connect)
+
+    # MessageReceiver interface, connected bots get registered right away,
+    # the others once their connect is done.
+    def register(self, selector : selectors.BaseSelector):
+        self.selector = selector
+        for bot in self.bots:
+            if bot.is_connected and not bot in self.connecting:
+                selector.register(bot, selectors.EVENT_READ, bot)
+
+    # TLS may hold already decrypted data, that the socket doesn't signal
+    def has_pending(self):
+        return any(bot.has_pending() for bot in self.bots if not bot in self.connecting)
+
+    # Returns the monotonic time when step() has to run next (connects, reconnects), or None.
+    def next_wake_up_time(self):
+        wake_up_time = None
+        if len(self.connecting) > 0:
+            wake_up_time = time.monotonic() + CONNECT_POLL_SECONDS
+        for reconnect_time, _ in self.reconnect_at.values():
+            if wake_up_time is None or reconnect_time < wake_up_time:
+                wake_up_time = reconnect_time
+        for bot in self.bots:
+            if bot.is_joined_channel and not bot in self.connecting:
+                ping_time = bot.last_lag_ping_time + LAG_PING_SECONDS
+                if wake_up_time is None or ping_time < wake_up_time:
+                    wake_up_time = ping_time
+        return wake_up_time
+
+    # Handle buffered data, finished connects, lost connections and reconnects.
+    # Readable sockets are handled by the main loop selector, calling bot.step().
+    def step(self):
+        now = time.monotonic()
+        self.potential_tx_id_msg_map.expire(now)
+
+        # Finished background connects
+        for bot, future in list(self.connecting.items()):
+            if not future.done():
+                continue
+            del self.connecting[bot]
+            e = future.exception()
+            if e is not None:
+                printw(PRE_MSG, f"Connect to {bot.server}:{bot.port} failed: {e}")
+                self.schedule_reconnect(bot, now)
+                continue
+            self.reconnect_at.pop(bot, None)
+            if self.selector is not None:
+                self.selector.register(bot, selectors.EVENT_READ, bot)
+
+        for bot in self.bots:
+            if bot in self.connecting:
+                continue
+            if bot.is_connected and bot.has_pending():
+                bot.step()
+            if bot.is_connected and bot.is_joined_channel and\
+                    now - bot.last_lag_ping_time >= LAG_PING_SECONDS:
+                bot.send_lag_ping(now)
+            if bot.is_connected:
+                continue
+
+            if bot in self.reconnect_at:
+                if self.reconnect_at[bot][0] <= now:
+                    self.connect(bot)
+                continue
+
+            # Lost connection
+            if self.selector is not None and bot in self.registered_bots():
+                self.selector.unregister(bot)
+            bot.close()
+            self.schedule_reconnect(bot, now)
+
+    def registered_bots(self):
+        return [key.data for key in self.selector.get_map().values()]
+
+    def schedule_reconnect(self, bot : IRCBot, now : float):
+        _, backoff = self.reconnect_at.get(bot, (None, RECONNECT_BACKOFF_SECONDS / 2))
+        backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX_SECONDS)
+        self.reconnect_at[bot] = (now + backoff, backoff)
+        metrics.irc_reconnects_total.inc(labels=(bot.server,))
+        printm(PRE_MSG, f"Reconnect to {bot.server}:{bot.port} in {backoff:.0f} sec.")
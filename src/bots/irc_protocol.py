@@ -0,0 +1,87 @@
+import codecs       # Incremental UTF-8 decoding
+
+# <--------------------------------- Constant --------------------------------->
+
+# IRC end of line, some servers only send \n
+ENDL = "\r\n"
+# A line longer than this (without end of line) is cut off, IRC allows 512
+# bytes, IRCv3 message tags can add up to 8191 more.
+MAX_LINE_LEN = 8191 + 512
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# One parsed IRC line:
+#   [@tags] [:prefix] COMMAND [params...] [:trailing]
+class IRCMessage:
+    __slots__ = ("prefix", "command", "params")
+
+    def __init__(self, prefix : str, command : str, params : list):
+        # e.g. "nick!user@host" or "irc.oftc.net", "" if there is none
+        self.prefix = prefix
+        # Upper case, e.g. "PRIVMSG", "PING" or numeric reply "001"
+        self.command = command
+        # Trailing param is the last element, without its ":"
+        self.params = params
+
+    # Nick name from prefix "nick!user@host"
+    @property
+    def nick(self):
+        return self.prefix.split("!", 1)[0]
+
+    def __repr__(self):
+        return f"IRCMessage({self.prefix!r}, {self.command!r}, {self.params!r})"
+
+    @staticmethod
+    def parse(line : str):
+        # IRCv3 message tags are not used
+        if line.startswith("@"):
+            line = line.split(" ", 1)[1] if " " in line else ""
+
+        prefix = ""
+        if line.startswith(":"):
+            prefix, _, line = line[1:].partition(" ")
+
+        trailing = None
+        if " :" in line:
+            line, trailing = line.split(" :", 1)
+        elif line.startswith(":"):
+            line, trailing = "", line[1:]
+
+        params = line.split()
+        if len(params) == 0:
+            return None
+        command = params.pop(0).upper()
+        if trailing is not None:
+            params.append(trailing)
+        return IRCMessage(prefix, command, params)
+
+
+# Turns the received byte stream into complete lines.
+# A line (or a UTF-8 character) that is split over several recv() calls is
+# kept until it is complete, one recv() can yield any number of lines.
+class IRCLineBuffer:
+    def __init__(self):
+        # Invalid UTF-8 (some clients send latin-1) doesn't break the stream
+        self.decoder = codecs.getincrementaldecoder("UTF-8")(errors="replace")
+        self.buffer = ""
+
+    # Returns list of complete lines, without end of line, empty lines skipped.
+    def feed(self, data : bytes):
+        self.buffer += self.decoder.decode(data)
+        if not "\n" in self.buffer:
+            if len(self.buffer) > MAX_LINE_LEN:
+                self.buffer = self.buffer[:MAX_LINE_LEN]
+            return []
+
+        *lines, self.buffer = self.buffer.split("\n")
+        return [line.rstrip("\r")[:MAX_LINE_LEN] for line in lines if line.rstrip("\r") != ""]
+
+    # Returns list of parsed IRCMessages of every complete line.
+    def feed_messages(self, data : bytes):
+        messages = []
+        for line in self.feed(data):
+            msg = IRCMessage.parse(line)
+            if msg is not None:
+                messages.append(msg)
+        return messages
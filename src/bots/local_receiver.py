@@ -0,0 +1,213 @@
+import json
+import selectors
+import socket
+
+from src.misc import *
+from src.bots.message_index import MessageIndex
+
+# <---------------------------------- Config ---------------------------------->
+
+# Linux: Unix socket, only reachable by local processes with file permissions.
+LOCAL_SOCKET_PATH = "/tmp/xmr_tx_notify_msg.sock"
+# Windows (no Unix sockets): TCP on localhost.
+LOCAL_IP   = "127.0.0.1"
+LOCAL_PORT = 18101
+
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+RECV_BUFFER_SIZE = 65536 # in bytes, max read per recv
+MAX_LINE_LEN     = 4096  # in bytes, longer lines are rejected
+MAX_CLIENTS      = 64    # concurrent connections, further ones are closed right away
+# Same limits as a PRIVMSG, so both receivers behave the same
+MAX_USER_NAME_LEN = 64
+MAX_MESSAGE_LEN   = 512
+
+# Output prefix
+PRE_MSG = "Local_Receiver"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# One connected submitter, e.g. the backend of a donation web page.
+# Protocol: newline delimited JSON, one submission per line
+#   {"tx_id": "<64 hex>", "user_name": "<name>", "message": "<message>"}
+# any number of lines per connection. After the client shuts down its write
+# side, it gets one summary line {"accepted": int, "rejected": int} and the
+# connection is closed.
+class LocalClient:
+    def __init__(self, receiver, sock : socket.socket):
+        self.receiver = receiver
+        self.sock = sock
+        self.buffer = b""
+        # True while the rest of a rejected oversized line is dropped
+        self.is_skipping_line = False
+        self.num_accepted = 0
+        self.num_rejected = 0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def step(self):
+        try:
+            data = self.sock.recv(RECV_BUFFER_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.receiver.remove_client(self)
+            return
+
+        if len(data) == 0:
+            self.finish()
+            return
+
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        if self.is_skipping_line and len(lines) > 0:
+            # End of an oversized line, already counted as rejected
+            lines.pop(0)
+            self.is_skipping_line = False
+        if len(self.buffer) > MAX_LINE_LEN:
+            if not self.is_skipping_line:
+                self.num_rejected += 1
+            self.is_skipping_line = True
+            self.buffer = b""
+
+        num_long = sum(1 for line in lines if len(line) > MAX_LINE_LEN)
+        if num_long > 0:
+            self.num_rejected += num_long
+            lines = [line for line in lines if len(line) <= MAX_LINE_LEN]
+        if len(lines) == 0:
+            return
+        accepted, rejected = self.receiver.submit_lines(lines)
+        self.num_accepted += accepted
+        self.num_rejected += rejected
+
+    # Client is done sending, answer with summary.
+    def finish(self):
+        if len(self.buffer) > 0 and not self.is_skipping_line:
+            accepted, rejected = self.receiver.submit_lines([self.buffer])
+            self.num_accepted += accepted
+            self.num_rejected += rejected
+        try:
+            self.sock.setblocking(True)
+            self.sock.sendall(json.dumps({"accepted": self.num_accepted,
+                                          "rejected": self.num_rejected}).encode("UTF-8") + b"\n")
+        except OSError:
+            pass
+        self.receiver.remove_client(self)
+
+
+# MessageReceiver that listens on a local socket for <tx_id>:<message> pairs,
+# handed over directly, e.g. by a donation web page. No IRC rate limits and no
+# Tor round-trips, submissions can be batched and are validated in bulk.
+# Same interface as IRCReceiverManager.
+class LocalReceiver:
+    def __init__(self,
+                 socket_path : str = LOCAL_SOCKET_PATH,
+                 ip          : str = LOCAL_IP,
+                 port        : int = LOCAL_PORT):
+
+        # Bounded { tx_id : {user_name : message} }
+        self.potential_tx_id_msg_map = MessageIndex()
+        self.clients = set()
+        self.selector = None
+
+        if hasattr(socket, "AF_UNIX"):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # Owner only
+            bind_unix_socket(self.sock, socket_path, 0o600)
+            address = socket_path
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((ip, port))
+            address = f"{ip}:{port}"
+        self.sock.listen(MAX_CLIENTS)
+        self.sock.setblocking(False)
+
+        printm(PRE_MSG, f"Listening for <tx_id>:<message> submissions on {address}.")
+
+    # Listening is all there is to be ready
+    @property
+    def is_ready(self):
+        return True
+
+    @property
+    def is_failed(self):
+        return False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def register(self, selector : selectors.BaseSelector):
+        self.selector = selector
+        selector.register(self, selectors.EVENT_READ, self)
+
+    def has_pending(self):
+        return False
+
+    def next_wake_up_time(self):
+        return None
+
+    # Listening socket readable: accept new clients.
+    # Called by the main loop every iteration as well, then only expires old pairs.
+    def step(self):
+        self.potential_tx_id_msg_map.expire()
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            if len(self.clients) >= MAX_CLIENTS:
+                printw(PRE_MSG, "Too many clients, connection closed.")
+                sock.close()
+                continue
+            sock.setblocking(False)
+            client = LocalClient(self, sock)
+            self.clients.add(client)
+            if self.selector is not None:
+                self.selector.register(client, selectors.EVENT_READ, client)
+
+    def remove_client(self, client : LocalClient):
+        self.clients.discard(client)
+        if self.selector is not None:
+            self.selector.unregister(client)
+        client.sock.close()
+
+    # Validate and add a batch of NDJSON lines, returns (accepted, rejected).
+    def submit_lines(self, lines : list):
+        num_accepted = 0
+        num_rejected = 0
+        for line in lines:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                entry = json.loads(line)
+                tx_id = entry["tx_id"].strip().lower()
+                user_name = str(entry.get("user_name", ""))[:MAX_USER_NAME_LEN]
+                message = str(entry.get("message", ""))[:MAX_MESSAGE_LEN]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                num_rejected += 1
+                continue
+
+            # Local submitter is trusted, no rate limit
+            if not is_tx_id(tx_id) or\
+                    not self.potential_tx_id_msg_map.add(tx_id, user_name, message, is_rate_limited=False):
+                num_rejected += 1
+                continue
+            num_accepted += 1
+
+        if num_accepted > 0 or num_rejected > 0:
+            printd(PRE_MSG, f"Batch: {num_accepted} accepted, {num_rejected} rejected.")
+        return num_accepted, num_rejected
+
+    def close(self):
+        for client in list(self.clients):
+            self.remove_client(client)
+        if self.selector is not None:
+            self.selector.unregister(self)
+        self.sock.close()
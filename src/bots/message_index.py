@@ -0,0 +1,131 @@
+import heapq        # TTL expiry
+import time         # Misc
+
+from src.misc import *
+from src import metrics
+from src.token_bucket import TokenBucket
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# Max potential <tx_id>:<msg> pairs kept, oldest get evicted first
+MAX_ENTRIES = 10000
+# in sec, a pair is dropped, if no matching tx shows up in time
+ENTRY_TTL_SECONDS = 3600
+# Per user token bucket: burst size and refill rate
+RATE_LIMIT_BURST      = 5
+RATE_LIMIT_PER_SECOND = 0.1
+# Max users with a token bucket, idle (full) buckets get dropped first
+MAX_RATE_LIMITED_USERS = 10000
+
+# Output prefix
+PRE_MSG = "Msg_Index"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Size-capped index of potential <tx_id>:<msg> pairs with TTL expiry and a
+# token bucket per user, so a flood of well-formed but fake tx_ids can't grow
+# memory or CPU without bounds.
+# Can be used like the previous dict: `tx_id in index`, `index[tx_id]` returns
+# {user_name : message}.
+class MessageIndex:
+    def __init__(self,
+                 max_entries : int = MAX_ENTRIES,
+                 ttl_seconds : float = ENTRY_TTL_SECONDS,
+                 burst       : int = RATE_LIMIT_BURST,
+                 per_second  : float = RATE_LIMIT_PER_SECOND):
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.burst = burst
+        self.per_second = per_second
+
+        # { tx_id : (user_name, message, expire_time) }, insertion ordered
+        self.entries = {}
+        # [(expire_time, tx_id), ...], entries evicted by size are skipped lazily
+        self.expiry_heap = []
+        # { user_name : TokenBucket }
+        self.buckets = {}
+        # Called with (tx_id, user_name, message) for every added pair,
+        # e.g. to match it with an already pending tx right away
+        self.on_add = None
+
+    def __contains__(self, tx_id : str):
+        return tx_id in self.entries
+
+    def __getitem__(self, tx_id : str):
+        user_name, message, _ = self.entries[tx_id]
+        return {user_name : message}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, tx_id : str, default = None):
+        return self[tx_id] if tx_id in self.entries else default
+
+    # Returns True if the user has a token left, takes it.
+    def take_token(self, user_name : str, now : float):
+        bucket = self.buckets.get(user_name)
+        if bucket is None:
+            if len(self.buckets) >= MAX_RATE_LIMITED_USERS:
+                self.prune_buckets(now)
+            bucket = self.buckets[user_name] = TokenBucket(self.burst, self.per_second, now)
+        return bucket.take(now)
+
+    # Drop buckets that are full again, they behave like new ones.
+    def prune_buckets(self, now : float):
+        for user_name, bucket in list(self.buckets.items()):
+            if bucket.is_full(now):
+                del self.buckets[user_name]
+        # Still full, drop the oldest
+        while len(self.buckets) >= MAX_RATE_LIMITED_USERS:
+            del self.buckets[next(iter(self.buckets))]
+
+    # Returns True if the pair got added.
+    # Trusted sources (e.g. a local web page) can skip the rate limit.
+    def add(self,
+            tx_id     : str,
+            user_name : str,
+            message   : str,
+            is_rate_limited : bool = True):
+
+        now = time.monotonic()
+        self.expire(now)
+
+        if tx_id in self.entries:
+            metrics.messages_dropped_total.inc(labels=("duplicate",))
+            return False
+        if is_rate_limited and not self.take_token(user_name, now):
+            metrics.messages_dropped_total.inc(labels=("rate_limited",))
+            printd(PRE_MSG, f"Rate limited: {user_name}")
+            return False
+
+        if len(self.entries) >= self.max_entries:
+            del self.entries[next(iter(self.entries))]
+            metrics.messages_dropped_total.inc(labels=("evicted_size",))
+
+        expire_time = now + self.ttl_seconds
+        self.entries[tx_id] = (user_name, message, expire_time)
+        heapq.heappush(self.expiry_heap, (expire_time, tx_id))
+        # Heap still holds entries evicted by size, rebuild before it grows too much
+        if len(self.expiry_heap) > 2 * self.max_entries:
+            self.expiry_heap = [(e[2], t) for t, e in self.entries.items()]
+            heapq.heapify(self.expiry_heap)
+        metrics.messages_added_total.inc()
+        metrics.message_index_entries.set(len(self.entries))
+        if self.on_add is not None:
+            self.on_add(tx_id, user_name, message)
+        return True
+
+    # Drop pairs whose TTL passed.
+    def expire(self, now : float = None):
+        now = time.monotonic() if now is None else now
+        while len(self.expiry_heap) > 0 and self.expiry_heap[0][0] <= now:
+            expire_time, tx_id = heapq.heappop(self.expiry_heap)
+            entry = self.entries.get(tx_id)
+            if entry is not None and entry[2] == expire_time:
+                del self.entries[tx_id]
+                metrics.messages_dropped_total.inc(labels=("expired",))
+                metrics.message_index_entries.set(len(self.entries))
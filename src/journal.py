@@ -0,0 +1,129 @@
+import json         # Misc
+import os           # Atomic file replace
+
+from src.misc import *
+
+# <--------------------------------- Constant --------------------------------->
+
+# Rewrite the journal as a snapshot of the current state, after this many
+# entries were appended since the last snapshot.
+COMPACT_AFTER_ENTRIES = 1000
+
+# Output prefix
+PRE_MSG = "Journal"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Append-only log of the notifier state, one JSON object per line:
+#   {"op": "height",  "wallet": label, "height": int, "floor": int}
+#   {"op": "pending", "tx_id": hex, "amount": int, "seen": unix_time, "wallet": label}
+#   {"op": "queued",  "tx_id": hex, "user_name": str, "message": str}
+#   {"op": "handled", "tx_id": hex}
+# Replaying it on startup restores the scan cursors, handled tx_ids and txs
+# that were still waiting, so a restart doesn't re-scan the whole history,
+# doesn't show a pop-up twice and doesn't drop one that wasn't shown yet.
+class TxJournal:
+    def __init__(self, path : str, compact_after : int = COMPACT_AFTER_ENTRIES):
+        self.path = path
+        self.compact_after = compact_after
+        self.num_entries = 0
+        # Entries written by the last compaction, the snapshot alone can be
+        # bigger than `compact_after` once there are many handled txs.
+        self.snapshot_len = 0
+        self.file = None
+
+    # Returns the replayed state:
+    #   {"heights": {wallet_label : (height, floor)},
+    #    "pending": {tx_id_hex : {"amount", "seen", "wallet"}},
+    #    "queued": {tx_id_hex : {"amount", "seen", "wallet", "user_name", "message"}},
+    #    "handled": [tx_id_hex, ...]}
+    # Entries written before there were several wallets have the wallet label None.
+    def load(self):
+        state = {"heights": {}, "pending": {}, "queued": {}, "handled": {}}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="UTF-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line may be cut off, if we crashed while writing it
+                        printw(PRE_MSG, f"Skip corrupt entry: {line.strip()}")
+                        continue
+                    self.replay(state, entry)
+                    self.num_entries += 1
+
+        state["handled"] = list(state["handled"])
+        printm(PRE_MSG, f"Loaded {self.path}: {len(state['heights'])} wallet heights, "\
+                        f"{len(state['pending'])} pending, {len(state['queued'])} queued, "\
+                        f"{len(state['handled'])} handled.")
+
+        self.file = open(self.path, "a", encoding="UTF-8")
+        return state
+
+    @staticmethod
+    def replay(state : dict, entry : dict):
+        op = entry.get("op")
+        if op == "height":
+            state["heights"][entry.get("wallet")] = (entry["height"], entry["floor"])
+        elif op == "pending":
+            state["pending"][entry["tx_id"]] = {"amount": entry["amount"],
+                                                "seen": entry["seen"],
+                                                "wallet": entry.get("wallet")}
+        elif op == "queued":
+            tx = state["pending"].pop(entry["tx_id"], None)
+            if tx is not None:
+                tx.update(user_name=entry["user_name"], message=entry["message"])
+                state["queued"][entry["tx_id"]] = tx
+        elif op == "handled":
+            state["pending"].pop(entry["tx_id"], None)
+            state["queued"].pop(entry["tx_id"], None)
+            # dict keeps insertion order, so eviction order survives restarts
+            state["handled"][entry["tx_id"]] = None
+
+    def append(self, entry : dict):
+        if self.file is None:
+            return
+        self.file.write(json.dumps(entry) + "\n")
+        # Survives a crash of this process, no fsync per entry
+        self.file.flush()
+        self.num_entries += 1
+
+    def log_height(self, wallet : str, height : int, floor : int):
+        self.append({"op": "height", "wallet": wallet, "height": height, "floor": floor})
+
+    def log_pending(self, tx_id : bytes, amount : int, seen : float, wallet : str = None):
+        self.append({"op": "pending", "tx_id": tx_id.hex(), "amount": amount, "seen": seen, "wallet": wallet})
+
+    def log_queued(self, tx_id : bytes, user_name : str, message : str):
+        self.append({"op": "queued", "tx_id": tx_id.hex(), "user_name": user_name, "message": message})
+
+    def log_handled(self, tx_id : bytes):
+        self.append({"op": "handled", "tx_id": tx_id.hex()})
+
+    def is_compaction_due(self):
+        return self.num_entries - self.snapshot_len > self.compact_after
+
+    # Replace the journal with a snapshot of the current state.
+    # `entries` are the entries that recreate the current state.
+    def compact(self, entries : list):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="UTF-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self.file is not None:
+            self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a", encoding="UTF-8")
+        self.num_entries = len(entries)
+        self.snapshot_len = len(entries)
+        printd(PRE_MSG, f"Compacted to {self.num_entries} entries.")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
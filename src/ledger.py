@@ -0,0 +1,205 @@
+import heapq        # Timeout deadlines
+import time         # Misc
+
+from collections import deque
+
+from src.misc import *
+from src.tracer import tracer, STAGE_QUEUED, STAGE_TIMED_OUT
+
+# <--------------------------------- Constant --------------------------------->
+
+# Number of handled tx_ids that are remembered to skip txs seen again (re-scan
+# window, mempool tx confirming), oldest ones get evicted first.
+MAX_HANDLED_TX_IDS = 100000
+# Pop-ups of a tx that weren't shown (renderer crashed or got stuck), then it
+# is given up, so a pop-up that always kills the renderer doesn't block the queue.
+MAX_POP_UP_ATTEMPTS = 3
+
+# Output prefix
+PRE_MSG = "Ledger"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# One incoming tx, from first sighting until its pop-up is shown.
+class TxRecord:
+    __slots__ = ("tx_id", "amount", "timestamp", "seen", "wallet", "user_name", "message", "queued_time",
+                 "failed_attempts")
+
+    def __init__(self, tx_id : bytes, amount : int, timestamp : float, seen : float, wallet : str = None):
+        # 32 byte binary tx_id
+        self.tx_id = tx_id
+        # in atomic units
+        self.amount = amount
+        # time.monotonic() of first sighting
+        self.timestamp = timestamp
+        # time.time() of first sighting, survives restarts
+        self.seen = seen
+        # Label of the wallet that received it
+        self.wallet = wallet
+        # Set when the tx gets queued for a pop-up
+        self.user_name = None
+        self.message = None
+        # time.monotonic() when it got queued, for the queue wait
+        self.queued_time = None
+        # Pop-ups of this tx that weren't shown
+        self.failed_attempts = 0
+
+    def __repr__(self):
+        return f"TxRecord({self.tx_id.hex()}, {self.amount}, {self.wallet!r}, {self.user_name!r}, {self.message!r})"
+
+
+# Keeps track of every tx state, all lookups are O(1) and timeouts are popped
+# from a heap instead of scanning every pending tx.
+#   pending -> queued -> showing -> handled
+# A pop-up that isn't shown (renderer crashed or got stuck) puts its txs back
+# at the front of the queue, up to max_pop_up_attempts times.
+class TxLedger:
+    def __init__(self,
+                 wait_seconds : float = None,
+                 max_handled : int = MAX_HANDLED_TX_IDS,
+                 max_pop_up_attempts : int = MAX_POP_UP_ATTEMPTS,
+                 journal = None):
+
+        # - None: txs never time out, they wait for a message.
+        # - Otherwise seconds until a tx is queued with default name/message.
+        self.wait_seconds = wait_seconds
+        self.max_handled = max_handled
+        self.max_pop_up_attempts = max_pop_up_attempts
+        # Optional TxJournal, every state change gets appended to it
+        self.journal = journal
+
+        # { tx_id : TxRecord }, waiting for a message or timeout
+        self.pending = {}
+        # TxRecords waiting for their pop-up, plus their tx_ids for membership
+        self.queue = deque()
+        self.queued_tx_ids = set()
+        # { tx_id : TxRecord }, taken for a pop-up that isn't done yet
+        self.showing = {}
+        # Bounded set of tx_ids which already got a pop-up, deque for eviction order
+        self.handled = set()
+        self.handled_order = deque()
+        # [(deadline, tx_id), ...], entries of already queued txs are skipped lazily
+        self.deadlines = []
+
+    # tx_id as hex str (as used by wallet rpc and message receivers) -> 32 bytes
+    @staticmethod
+    def to_bin(tx_id : str):
+        return bytes.fromhex(tx_id)
+
+    def is_known(self, tx_id : bytes):
+        return tx_id in self.pending or\
+               tx_id in self.queued_tx_ids or\
+               tx_id in self.showing or\
+               tx_id in self.handled
+
+    # Returns False if tx is already known.
+    def add_tx(self, tx_id : bytes, amount : int, seen : float = None, wallet : str = None):
+        if self.is_known(tx_id):
+            return False
+
+        # Restored txs keep their age
+        now = time.time()
+        seen = now if seen is None else seen
+        timestamp = time.monotonic() - max(0, now - seen)
+
+        self.pending[tx_id] = TxRecord(tx_id, amount, timestamp, seen, wallet)
+        if self.wait_seconds is not None:
+            heapq.heappush(self.deadlines, (timestamp + self.wait_seconds, tx_id))
+        if self.journal is not None:
+            self.journal.log_pending(tx_id, amount, seen, wallet)
+        return True
+
+    # Move pending tx to the queue with the given name and message.
+    # Returns False if tx is not pending (unknown or already queued/handled).
+    def enqueue(self, tx_id : bytes, user_name : str, message : str):
+        rec = self.pending.pop(tx_id, None)
+        if rec is None:
+            return False
+
+        rec.user_name = user_name
+        rec.message = message
+        rec.queued_time = time.monotonic()
+        self.queue.append(rec)
+        self.queued_tx_ids.add(tx_id)
+        tracer.event(tx_id, STAGE_QUEUED)
+        if self.journal is not None:
+            self.journal.log_queued(tx_id, user_name, message)
+        printd(PRE_MSG, f"queued: {rec}")
+        return True
+
+    # Earliest timeout of a pending tx, or None.
+    def next_deadline(self):
+        while len(self.deadlines) > 0 and not self.deadlines[0][1] in self.pending:
+            heapq.heappop(self.deadlines)
+        return self.deadlines[0][0] if len(self.deadlines) > 0 else None
+
+    # Queue every pending tx whose deadline passed, with default name and message.
+    def enqueue_timed_out(self, now : float, user_name : str, message : str):
+        while len(self.deadlines) > 0 and self.deadlines[0][0] <= now:
+            _, tx_id = heapq.heappop(self.deadlines)
+            if tx_id in self.pending:
+                tracer.event(tx_id, STAGE_TIMED_OUT)
+                self.enqueue(tx_id, user_name, message)
+
+    # Take a queued tx for a pop-up, it is handled once the pop-up is done.
+    # The queue is short (pop-ups waiting to be shown), removing from its middle is cheap.
+    def take(self, rec : TxRecord):
+        self.queue.remove(rec)
+        self.queued_tx_ids.discard(rec.tx_id)
+        self.showing[rec.tx_id] = rec
+
+    # Pop-up of a taken tx is done. Remember it as handled if it was shown,
+    # otherwise put it back at the front of the queue, the journal still has
+    # it as queued. Given up (handled) after max_pop_up_attempts.
+    def finish(self, rec : TxRecord, is_shown : bool):
+        if self.showing.pop(rec.tx_id, None) is None:
+            return
+        if not is_shown:
+            rec.failed_attempts += 1
+            if rec.failed_attempts < self.max_pop_up_attempts:
+                self.queue.appendleft(rec)
+                self.queued_tx_ids.add(rec.tx_id)
+                return
+            printw(PRE_MSG, f"Pop-up not shown after {rec.failed_attempts} attempts, given up: {rec}")
+        self.mark_handled(rec.tx_id)
+
+    def mark_handled(self, tx_id : bytes):
+        if tx_id in self.handled:
+            return
+        self.handled.add(tx_id)
+        self.handled_order.append(tx_id)
+        if len(self.handled_order) > self.max_handled:
+            self.handled.discard(self.handled_order.popleft())
+        if self.journal is not None:
+            self.journal.log_handled(tx_id)
+
+    # Restore state loaded by TxJournal.load(), without writing it again.
+    def restore(self, state : dict):
+        journal, self.journal = self.journal, None
+
+        for tx_id in state["handled"]:
+            self.mark_handled(self.to_bin(tx_id))
+        for tx_id, tx in state["pending"].items():
+            self.add_tx(self.to_bin(tx_id), tx["amount"], tx["seen"], tx["wallet"])
+        for tx_id, tx in state["queued"].items():
+            self.add_tx(self.to_bin(tx_id), tx["amount"], tx["seen"], tx["wallet"])
+            self.enqueue(self.to_bin(tx_id), tx["user_name"], tx["message"])
+
+        self.journal = journal
+
+    # Journal entries that recreate the current state, for TxJournal.compact().
+    # `heights`: { wallet : (height, floor) }
+    def snapshot(self, heights : dict):
+        entries = [{"op": "height", "wallet": wallet, "height": height, "floor": floor}
+                   for wallet, (height, floor) in heights.items()]
+        for tx_id in self.handled_order:
+            entries.append({"op": "handled", "tx_id": tx_id.hex()})
+        queued = list(self.showing.values()) + list(self.queue)
+        for rec in list(self.pending.values()) + queued:
+            entries.append({"op": "pending", "tx_id": rec.tx_id.hex(),
+                            "amount": rec.amount, "seen": rec.seen, "wallet": rec.wallet})
+        for rec in queued:
+            entries.append({"op": "queued", "tx_id": rec.tx_id.hex(),
+                            "user_name": rec.user_name, "message": rec.message})
+        return entries
@@ -0,0 +1,64 @@
+from src.misc import *
+from src import metrics
+from src.ledger import TxLedger
+from src.tracer import tracer, STAGE_MESSAGE, STAGE_MATCHED
+
+# <--------------------------------- Constant --------------------------------->
+
+# Output prefix
+PRE_MSG = "Matcher"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Joins incoming txs with the <tx_id>:<msg> pairs of a MessageReceiver when
+# either side shows up, instead of re-joining every pending tx every loop:
+# - new tx: looks up a message that arrived first
+# - new message: looks up a pending tx that arrived first
+# Both are a single dict lookup, so the cost per event doesn't grow with the
+# number of pending txs or messages.
+class TxMessageMatcher:
+    def __init__(self,
+                 ledger          : TxLedger,
+                 message_index,
+                 default_name    : str,
+                 default_message : str,
+                 lookup          = None):
+
+        self.ledger = ledger
+        # MessageIndex of the MessageReceiver, calls on_message() for every new pair
+        self.message_index = message_index
+        self.message_index.on_add = self.on_message
+        self.default_name = default_name
+        self.default_message = default_message
+        # TxLookup, gets the tx_ids of messages that arrived before their tx
+        self.lookup = lookup
+
+    # Tx got added to the ledger, tx_id as hex str.
+    def on_tx(self, tx_id : str):
+        pair = self.message_index.get(tx_id)
+        if pair is not None:
+            user_name, message = next(iter(pair.items()))
+            self.match(TxLedger.to_bin(tx_id), user_name, message, "message")
+
+    # MessageReceiver accepted a new pair, tx_id as hex str.
+    def on_message(self, tx_id : str, user_name : str, message : str):
+        tracer.event(tx_id, STAGE_MESSAGE, user_name=user_name)
+        tx_id_bin = TxLedger.to_bin(tx_id)
+        # Tx not scanned yet, ask the wallet for it right away
+        if self.lookup is not None and not self.ledger.is_known(tx_id_bin):
+            self.lookup.request(tx_id)
+            return
+        self.match(tx_id_bin, user_name, message, "tx")
+
+    # Queue tx, if it is still pending (not unknown, queued or handled).
+    # `first`: "tx" or "message", whichever arrived first
+    def match(self, tx_id : bytes, user_name : str, message : str, first : str):
+        if not tx_id in self.ledger.pending:
+            return
+        tracer.event(tx_id, STAGE_MATCHED)
+        self.ledger.enqueue(tx_id,
+                            user_name if user_name else self.default_name,
+                            message if message else self.default_message)
+        metrics.matches_total.inc(labels=(first,))
+        printd(PRE_MSG, f"matched: {tx_id.hex()}")
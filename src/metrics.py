@@ -0,0 +1,181 @@
+import bisect       # Histogram buckets
+import threading    # Metrics are updated by worker threads too
+
+# <--------------------------------- Constant --------------------------------->
+
+# in sec, upper bounds of the histogram buckets (+Inf is added)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# in sec, tx first seen until pop-up, waits for messages up to WAIT_SECONDS_UNTIL_TX_SHOWN
+LATENCY_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Base of all metrics: one value (or histogram) per combination of label values.
+# Updates are cheap (a lock and a dict lookup), they are always on, the text
+# format is only rendered when /metrics is scraped.
+class Metric:
+    type_name = None
+
+    def __init__(self, name : str, help_text : str, label_names : tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        # { (label_value, ...) : value }
+        self.values = {}
+
+    def format_labels(self, label_values : tuple, extra : str = None):
+        pairs = [f'{name}="{escape_label_value(str(value))}"'
+                 for name, value in zip(self.label_names, label_values)]
+        if extra is not None:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if len(pairs) > 0 else ""
+
+    # Prometheus text format lines
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}",
+                 f"# TYPE {self.name} {self.type_name}"]
+        with self.lock:
+            items = list(self.values.items())
+        for label_values, value in items:
+            lines.extend(self.render_value(label_values, value))
+        return lines
+
+    def render_value(self, label_values : tuple, value):
+        return [f"{self.name}{self.format_labels(label_values)} {format_number(value)}"]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, value : float = 1, labels : tuple = ()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value : float, labels : tuple = ()):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name : str, help_text : str, label_names : tuple = (), buckets : tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    # value: [count per bucket (last one is +Inf), sum, count]
+    def observe(self, value : float, labels : tuple = ()):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            hist = self.values.get(labels)
+            if hist is None:
+                hist = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def render_value(self, label_values : tuple, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else format_number(bound)
+            labels = self.format_labels(label_values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self.format_labels(label_values)} {format_number(total)}")
+        lines.append(f"{self.name}_count{self.format_labels(label_values)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name : str, help_text : str, label_names : tuple = ()):
+        return self.add(Counter(name, help_text, label_names))
+
+    def gauge(self, name : str, help_text : str, label_names : tuple = ()):
+        return self.add(Gauge(name, help_text, label_names))
+
+    def histogram(self, name : str, help_text : str, label_names : tuple = (), buckets : tuple = DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help_text, label_names, buckets))
+
+    def add(self, metric : Metric):
+        self.metrics.append(metric)
+        return metric
+
+    # Prometheus text exposition format
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# <-------------------------------- Functions --------------------------------->
+
+def escape_label_value(value : str):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_number(value : float):
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+# <---------------------------------- Global ---------------------------------->
+
+registry = Registry()
+
+# Wallet rpc
+rpc_call_seconds = registry.histogram("xmr_rpc_call_seconds",
+        "Round-trip of one monero-wallet-rpc request (batches are joined with +).", ("method",))
+rpc_errors_total = registry.counter("xmr_rpc_errors_total",
+        "monero-wallet-rpc requests that failed after all retries.", ("method",))
+scan_seconds = registry.histogram("xmr_scan_seconds",
+        "Duration of update_incoming_tx_cache(), all due wallets.")
+tx_notify_fetches_total = registry.counter("xmr_tx_notify_fetches_total",
+        "New tx_ids pushed by --tx-notify and fetched with get_transfer_by_txid.")
+
+# Txs and pop-ups
+txs_total = registry.counter("xmr_txs_total",
+        "Incoming txs added to the ledger.", ("wallet",))
+tx_to_pop_up_seconds = registry.histogram("xmr_tx_to_pop_up_seconds",
+        "Tx first seen until its pop-up is shown.", buckets=LATENCY_BUCKETS)
+queue_wait_seconds = registry.histogram("xmr_queue_wait_seconds",
+        "Tx queued for a pop-up until its pop-up is shown.", buckets=LATENCY_BUCKETS)
+queue_depth = registry.gauge("xmr_queue_depth",
+        "Txs waiting for their pop-up.")
+pending_txs = registry.gauge("xmr_pending_txs",
+        "Txs waiting for a message or timeout.")
+matches_total = registry.counter("xmr_matches_total",
+        "Txs matched with a message, by which of both arrived first.", ("first",))
+pop_ups_total = registry.counter("xmr_pop_ups_total",
+        "Pop-ups shown, a coalesced pop-up counts once.")
+
+# Message receivers
+irc_lag_seconds = registry.histogram("xmr_irc_lag_seconds",
+        "Round-trip of a PING to the IRC server, how far the receive side lags.", ("server",))
+irc_reconnects_total = registry.counter("xmr_irc_reconnects_total",
+        "Scheduled IRC reconnects.", ("server",))
+messages_added_total = registry.counter("xmr_messages_added_total",
+        "<tx_id>:<msg> pairs added to the message index.")
+messages_dropped_total = registry.counter("xmr_messages_dropped_total",
+        "<tx_id>:<msg> pairs not added or dropped from the message index.", ("reason",))
+message_index_entries = registry.gauge("xmr_message_index_entries",
+        "<tx_id>:<msg> pairs waiting for their tx.")
+tx_lookups_total = registry.counter("xmr_tx_lookups_total",
+        "Lookups of tx_ids that were in a message before their tx was scanned.", ("result",))
+
+# Main loop, rate() gives iterations per second
+main_loop_iterations_total = registry.counter("xmr_main_loop_iterations_total",
+        "Main loop iterations.")
+worker_restarts_total = registry.counter("xmr_worker_restarts_total",
+        "Workers (scanner, renderer, tx_lookup) restarted after a crash or getting stuck.", ("worker",))
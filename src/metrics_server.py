@@ -0,0 +1,58 @@
+import threading    # Server thread
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.misc import *
+from src.metrics import Registry
+
+# <--------------------------------- Constant --------------------------------->
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Output prefix
+PRE_MSG = "Metrics"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    # Set by MetricsServer
+    registry = None
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        printd(PRE_MSG, f"{self.address_string()} {format % args}")
+
+
+# Serves the metrics registry on http://<host>:<port>/metrics in Prometheus
+# text format, from its own thread.
+class MetricsServer:
+    def __init__(self, host : str, port : int, registry : Registry):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        handler = type("Handler", (MetricsRequestHandler,), {"registry": self.registry})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        printm(PRE_MSG, f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -1,9 +1,38 @@
+import os
+import re
+import socket
+
 IS_DEBUG =  False
 
+# 64 lower case hex chars
+TX_ID_RE = re.compile(r"[0-9a-f]{64}")
+
 # Converts from atomic units (piconero) to rounded str in Monero.
 def amt2str(amount : int):
     return f"{amount/10**12:9.5f}"
 
+# Converts from Monero to atomic units (piconero).
+def xmr2amt(xmr : float):
+    return round(xmr*10**12)
+
+
+# True if tx_id could be valid (length and allowed chars), not if it exists.
+def is_tx_id(tx_id : str):
+    return TX_ID_RE.fullmatch(tx_id) is not None
+
+
+# Bind a Unix socket at `path` with file `mode`, replaces a stale socket file.
+# The mode is set through the umask, a chmod after bind leaves a window where
+# the socket has the umask permissions.
+def bind_unix_socket(sock : socket.socket, path : str, mode : int):
+    if os.path.exists(path):
+        os.remove(path)
+    old_umask = os.umask(0o777 & ~mode)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+
 
 # Print message.
 def printm(pre : str, msg : str):
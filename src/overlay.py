@@ -0,0 +1,209 @@
+import json         # Misc
+import os           # Asset paths
+import queue        # One queue per connected overlay client
+import threading    # Server thread
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.misc import *
+
+# <--------------------------------- Constant --------------------------------->
+
+# in sec, send a comment line to idle clients, keeps proxies and OBS from
+# closing the connection and lets us notice disconnected clients.
+KEEP_ALIVE_SECONDS = 15
+# Messages buffered per client, further pop-ups are skipped for a client that doesn't keep up.
+MAX_CLIENT_QUEUE = 64
+
+# Files that can be requested by the overlay page
+ASSETS = {"/assets/donation_bg.png"    : ("donation_bg.png", "image/png"),
+          "/assets/donation_sound.wav" : ("donation_sound.wav", "audio/wav"),
+          "/assets/monero_icon.png"    : ("monero_icon.png", "image/png")}
+
+# Output prefix
+PRE_MSG = "Overlay"
+
+# Overlay page, add `http://<host>:<port>/` as browser source in OBS.
+# Looks like the pygame pop-up, shows every pushed message for `duration` sec.
+OVERLAY_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Monero Donation</title>
+<style>
+  body { margin: 0; background: transparent; overflow: hidden; }
+  #pop-up { display: none; position: relative; width: %(width)dpx; height: %(height)dpx;
+            background: #000 url(/assets/donation_bg.png) no-repeat;
+            font-family: sans-serif; color: #fff; }
+  #user-name { position: absolute; left: 22px; top: 20px; font: bold 36px sans-serif; color: rgb(155,255,155); }
+  #prefix    { position: absolute; left: 22px; top: 64px; font: bold 24px sans-serif; }
+  #amount    { position: absolute; left: 114px; top: 56px; font: bold 36px sans-serif; color: rgb(255,102,0); }
+  #message   { position: absolute; left: 22px; top: 98px; right: 22px; font: 22px sans-serif;
+               line-height: 28px; max-height: %(message_height)dpx; overflow: hidden; word-wrap: break-word; }
+</style>
+</head>
+<body>
+<div id="pop-up">
+  <div id="user-name"></div><div id="prefix"></div><div id="amount"></div><div id="message"></div>
+</div>
+<audio id="sound" src="/assets/donation_sound.wav" preload="auto"></audio>
+<script>
+  const queue = [];
+  let isShowing = false;
+  function showNext() {
+    if (isShowing || queue.length == 0) return;
+    const m = queue.shift();
+    isShowing = true;
+    document.getElementById("user-name").textContent = m.user_name;
+    document.getElementById("prefix").textContent = m.prefix;
+    document.getElementById("amount").textContent = m.amount + " XMR";
+    document.getElementById("message").textContent = m.message;
+    document.getElementById("pop-up").style.display = "block";
+    document.getElementById("sound").play().catch(() => {});
+    setTimeout(() => {
+      document.getElementById("pop-up").style.display = "none";
+      isShowing = false;
+      showNext();
+    }, m.duration * 1000);
+  }
+  const events = new EventSource("/events");
+  events.addEventListener("pop-up", (e) => { queue.push(JSON.parse(e.data)); showNext(); });
+</script>
+</body>
+</html>
+"""
+
+
+# <----------------------------- Class definition ----------------------------->
+
+class OverlayRequestHandler(BaseHTTPRequestHandler):
+    # Set by OverlayServer
+    overlay = None
+
+    def do_GET(self):
+        if self.path == "/" or self.path == "/index.html":
+            self.send_body(self.overlay.page, "text/html; charset=utf-8")
+        elif self.path in ASSETS:
+            self.send_asset(*ASSETS[self.path])
+        elif self.path == "/events":
+            self.stream_events()
+        else:
+            self.send_error(404)
+
+    def send_body(self, body : bytes, content_type : str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_asset(self, file_name : str, content_type : str):
+        body = self.overlay.assets.get(file_name)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_body(body, content_type)
+
+    # Server-Sent Events, one long-lived response per client.
+    def stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        client = self.overlay.add_client()
+        try:
+            while True:
+                try:
+                    data = client.get(timeout=KEEP_ALIVE_SECONDS)
+                    self.wfile.write(b"event: pop-up\ndata: " + data + b"\n\n")
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.overlay.remove_client(client)
+
+    def log_message(self, format, *args):
+        printd(PRE_MSG, f"{self.address_string()} {format % args}")
+
+
+# Small built-in HTTP server, serves an overlay page for a browser source
+# (e.g. OBS) and pushes every pop-up to all connected pages via SSE.
+# No window, no subprocesses, no focus juggling.
+class OverlayServer:
+    def __init__(self,
+                 host       : str,
+                 port       : int,
+                 assets_dir : str,
+                 width      : int = 600,
+                 height     : int = 300):
+
+        self.host = host
+        self.port = port
+        self.page = (OVERLAY_HTML % {"width": width,
+                                     "height": height,
+                                     "message_height": height-98}).encode("UTF-8")
+
+        # Read assets once, served from memory
+        self.assets = {}
+        for file_name, _ in ASSETS.values():
+            path = os.path.join(assets_dir, file_name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self.assets[file_name] = f.read()
+
+        self.clients = set()
+        self.clients_lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        handler = type("Handler", (OverlayRequestHandler,), {"overlay": self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        printm(PRE_MSG, f"Serving overlay on http://{self.host}:{self.port}/")
+
+    def add_client(self):
+        client = queue.Queue(MAX_CLIENT_QUEUE)
+        with self.clients_lock:
+            self.clients.add(client)
+        printm(PRE_MSG, f"Overlay client connected ({len(self.clients)} total).")
+        return client
+
+    def remove_client(self, client : queue.Queue):
+        with self.clients_lock:
+            self.clients.discard(client)
+        printm(PRE_MSG, f"Overlay client disconnected ({len(self.clients)} total).")
+
+    # Send pop-up to every connected overlay, serialized once for all clients.
+    def push(self,
+             user_name : str,
+             prefix    : str,
+             amount    : int,
+             message   : str,
+             duration  : float):
+
+        data = json.dumps({"user_name": user_name,
+                           "prefix": prefix,
+                           "amount": amt2str(amount).strip(),
+                           "message": message,
+                           "duration": duration}).encode("UTF-8")
+
+        with self.clients_lock:
+            clients = list(self.clients)
+        if len(clients) == 0:
+            printw(PRE_MSG, "No overlay client connected, pop-up not shown.")
+        for client in clients:
+            try:
+                client.put_nowait(data)
+            except queue.Full:
+                printw(PRE_MSG, "Overlay client doesn't keep up, skipped pop-up.")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
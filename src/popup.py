@@ -0,0 +1,206 @@
+import os           # Environment variables for pygame
+import queue        # Pop-up requests to the render thread
+import threading    # Render thread
+import time         # Misc
+
+from src.misc import *
+from src.text_layout import TextRenderer
+
+# Popup display + text + sound
+# Imported by the render thread, so importing pygame, initializing it and
+# decoding the assets doesn't slow down startup.
+pygame = None
+
+# <--------------------------------- Constant --------------------------------->
+
+# in sec, how often window events get pumped while a pop-up is shown
+EVENT_PUMP_SECONDS = 0.05
+
+# Text layout
+PADDING_LEFT = 22
+MESSAGE_TOP  = 98
+LINE_HEIGHT  = 28
+COLOR_NAME   = (155, 255, 155)
+COLOR_TEXT   = (255, 255, 255)
+COLOR_AMOUNT = (255, 102, 0)
+
+# Font sizes
+FONT_SIZE_MED      = 30
+FONT_SIZE_MED_BOLD = 32
+FONT_SIZE_BIG_BOLD = 48
+
+# Output prefix
+PRE_MSG = "PopUp"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# One pygame window that stays alive (hidden) between pop-ups.
+# Background, frame and the static prefix label are composited once into a
+# cached surface, so a pop-up only blits that and draws name, amount and message.
+# Those are rendered through a TextRenderer, regular names, round amounts and
+# repeated messages are blitted from its cache.
+# SDL wants its window to be used by one thread only, so the window lives in
+# its own render thread and show() hands the pop-up over to it. The render
+# thread also imports pygame and loads the assets, start() warms it up in the
+# background.
+class PopUpWindow:
+    def __init__(self,
+                 pos_x         : int,
+                 pos_y         : int,
+                 width         : int,
+                 height        : int,
+                 caption       : str,
+                 prefix        : str,
+                 bg_png_path   : str,
+                 icon_png_path : str,
+                 sound_path    : str,
+                 max_len_rows  : int):
+
+        self.pos = (pos_x, pos_y)
+        self.size = (width, height)
+        self.caption = caption
+        self.prefix = prefix
+        self.bg_png_path = bg_png_path
+        self.icon_png_path = icon_png_path
+        self.sound_path = sound_path
+        self.max_len_rows = max_len_rows
+        # Messages are wrapped to the window width
+        self.max_line_width = width - 2*PADDING_LEFT
+        self.text = TextRenderer()
+
+        # Set by the render thread
+        self.display = None
+        self.base_surface = None
+        self.window_id = None
+        self.bg_png = None
+        self.icon_png = None
+        self.sound = None
+        self.font_med = None
+        self.font_med_bold = None
+        self.font_big_bold = None
+
+        self.requests = queue.Queue()
+        self.thread = None
+
+    # Start render thread, loads pygame + assets and creates the hidden window
+    # in the background.
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Show pop-up and block until it is hidden again.
+    # `on_shown(window_id)` is called right after the window is shown, e.g. to
+    # set window manager hints.
+    def show(self,
+             user_name : str,
+             amount    : int,
+             message   : str,
+             duration  : float,
+             on_shown  = None):
+
+        self.start()
+        done = threading.Event()
+        self.requests.put((user_name, amount, message, duration, on_shown, done))
+        done.wait()
+
+    # <-------------------------- Render thread --------------------------->
+
+    def run(self):
+        try:
+            self.load()
+            self.create_window()
+        except Exception as e:
+            # Keep serving requests, so show() doesn't block forever
+            printw(PRE_MSG, f"Unable to create pop-up window: {e}")
+
+        while True:
+            user_name, amount, message, duration, on_shown, done = self.requests.get()
+            try:
+                self.pop_up(user_name, amount, message, duration, on_shown)
+            except Exception as e:
+                printw(PRE_MSG, f"Pop-up failed: {e}")
+            finally:
+                done.set()
+
+    def load(self):
+        global pygame
+        os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+        # Set window position, pygame does not come with this functionality.
+        os.environ['SDL_VIDEO_WINDOW_POS'] = f"{self.pos[0]},{self.pos[1]}"
+        import pygame
+
+        pygame.init()
+
+        # Works with 300x300 image with transparent background.
+        # May need some adjustments for different sizes.
+        self.bg_png = pygame.image.load(self.bg_png_path)
+        self.icon_png = pygame.image.load(self.icon_png_path)
+        self.sound = pygame.mixer.Sound(self.sound_path)
+
+        # Fonts
+        self.font_med      = pygame.font.Font(None, FONT_SIZE_MED)
+        self.font_med_bold = pygame.font.Font(None, FONT_SIZE_MED_BOLD)
+        self.font_big_bold = pygame.font.Font(None, FONT_SIZE_BIG_BOLD)
+        self.font_med_bold.set_bold(True)
+        self.font_big_bold.set_bold(True)
+
+    def create_window(self):
+        pygame.display.init()
+        pygame.display.set_caption(self.caption)
+        pygame.display.set_icon(self.icon_png)
+        self.display = pygame.display.set_mode(self.size,
+                                               flags=pygame.NOFRAME | pygame.HIDDEN)
+        self.window_id = pygame.display.get_wm_info()["window"]
+
+        # Pre-composite everything that is the same for every pop-up
+        self.base_surface = pygame.Surface(self.size).convert()
+        self.base_surface.fill((0,0,0))
+        self.base_surface.blit(self.bg_png, self.bg_png.get_rect())
+        text = self.font_med_bold.render(self.prefix, True, COLOR_TEXT)
+        self.base_surface.blit(text, (PADDING_LEFT, 64))
+        printd(PRE_MSG, f"Created hidden window {self.window_id}.")
+
+    def draw(self, user_name : str, amount : int, message : str):
+        self.display.blit(self.base_surface, (0,0))
+
+        text = self.text.render(user_name, self.font_big_bold, COLOR_NAME)
+        self.display.blit(text, (PADDING_LEFT, 20))
+        text = self.text.render(f"{amt2str(amount)} XMR", self.font_big_bold, COLOR_AMOUNT)
+        self.display.blit(text, (PADDING_LEFT+92, 56))
+
+        lines = self.text.render_wrapped(message, self.font_med, COLOR_TEXT,
+                                         self.max_line_width, self.max_len_rows)
+        for row, text in enumerate(lines):
+            self.display.blit(text, (PADDING_LEFT, MESSAGE_TOP + row*LINE_HEIGHT))
+
+    def pop_up(self,
+               user_name : str,
+               amount    : int,
+               message   : str,
+               duration  : float,
+               on_shown):
+
+        # Sound
+        self.sound.play()
+
+        # pygame 2 reuses the existing window and only shows it
+        self.display = pygame.display.set_mode(self.size,
+                                               flags=pygame.NOFRAME | pygame.SHOWN)
+        self.draw(user_name, amount, message)
+        printd(PRE_MSG, f"Text cache {self.text.stats()}")
+        pygame.display.flip()
+        pygame.event.set_grab(False)
+        if on_shown is not None:
+            on_shown(self.window_id)
+
+        end_time = time.monotonic() + duration
+        while time.monotonic() < end_time:
+            pygame.event.pump()
+            time.sleep(EVENT_PUMP_SECONDS)
+
+        self.display = pygame.display.set_mode(self.size,
+                                               flags=pygame.NOFRAME | pygame.HIDDEN)
+        pygame.event.pump()
@@ -0,0 +1,128 @@
+import multiprocessing  # Render process
+import queue            # Render thread
+import threading        # Render thread
+import time             # Misc
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# in sec, a pop-up that isn't done this long after its duration counts as stuck
+RENDER_STUCK_SECONDS = 10
+# in sec, how long stop() waits for the render process to exit
+STOP_TIMEOUT_SECONDS = 1
+
+# Output prefix
+PRE_MSG = "Render_Worker"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Shows pop-ups on its own worker, so rendering never delays tx detection or
+# the MessageReceivers, show() only puts the pop-up into a queue.
+# `target(requests, events)` runs on the worker: it gets
+# (pop_up_id, user_name, amount, message, duration) from `requests` (None: exit),
+# shows one pop-up at a time and puts pop_up_id into `events` when it is done.
+# - process: own interpreter (no shared GIL with the main loop), needs a
+#   picklable module level target, it is started with "spawn", so it doesn't
+#   inherit threads or sockets of the main loop
+# - thread: for backends that only hand the pop-up over (notify-send, overlay)
+# Supervisor interface: a pop-up that overruns its duration by
+# RENDER_STUCK_SECONDS makes the worker count as stuck.
+class RenderWorker:
+    def __init__(self,
+                 name          : str,
+                 target,
+                 is_process    : bool,
+                 stuck_seconds : float = RENDER_STUCK_SECONDS):
+
+        self.name = name
+        self.target = target
+        self.is_process = is_process
+        self.stuck_seconds = stuck_seconds
+
+        self.context = multiprocessing.get_context("spawn") if is_process else None
+        self.worker = None
+        self.requests = None
+        self.events = None
+
+        self.next_pop_up_id = 0
+        # (pop_up_id, pop_up, stuck_time) shown right now, None if idle
+        self.current = None
+        # [(pop_up, is_shown), ...] done since the last take_done()
+        self.done = []
+
+    # <-------------------------- Supervisor ----------------------------->
+
+    # New queues, requests of a dead or stuck worker are not replayed
+    def start(self):
+        if self.is_process:
+            self.requests = self.context.Queue()
+            self.events = self.context.Queue()
+            self.worker = self.context.Process(target=self.target,
+                                               args=(self.requests, self.events),
+                                               name=self.name,
+                                               daemon=True)
+        else:
+            self.requests = queue.Queue()
+            self.events = queue.Queue()
+            self.worker = threading.Thread(target=self.target,
+                                           args=(self.requests, self.events),
+                                           name=self.name,
+                                           daemon=True)
+        self.worker.start()
+
+    def is_alive(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def stuck_time(self):
+        self.poll()
+        return self.current[2] if self.current is not None else None
+
+    # A process gets terminated, a thread can't be, it is left behind (daemon).
+    def stop(self):
+        if self.is_process and self.worker is not None and self.worker.is_alive():
+            self.worker.terminate()
+            self.worker.join(STOP_TIMEOUT_SECONDS)
+        elif not self.is_process and self.requests is not None:
+            self.requests.put(None)
+        if self.current is not None:
+            self.done.append((self.current[1], False))
+            self.current = None
+
+    # <-------------------------- Main thread ---------------------------->
+
+    def show(self, pop_up):
+        self.next_pop_up_id += 1
+        self.current = (self.next_pop_up_id, pop_up,
+                        time.monotonic() + pop_up.duration + self.stuck_seconds)
+        self.requests.put((self.next_pop_up_id,
+                           pop_up.user_name,
+                           pop_up.amount,
+                           pop_up.message,
+                           pop_up.duration))
+
+    def is_busy(self):
+        self.poll()
+        return self.current is not None
+
+    # Collect finished pop-ups from the worker.
+    def poll(self):
+        while True:
+            try:
+                pop_up_id = self.events.get_nowait()
+            except queue.Empty:
+                return
+            except (OSError, ValueError, EOFError):
+                # Queue of a terminated process
+                return
+            if self.current is not None and self.current[0] == pop_up_id:
+                self.done.append((self.current[1], True))
+                self.current = None
+
+    # Returns and forgets [(pop_up, is_shown), ...], not shown: the worker
+    # crashed or got stuck.
+    def take_done(self):
+        self.poll()
+        done, self.done = self.done, []
+        return done
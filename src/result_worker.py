@@ -0,0 +1,50 @@
+import queue        # Results between threads
+import selectors    # Wake up the main loop
+import socket       # Wake up the main loop
+
+# <----------------------------- Class definition ----------------------------->
+
+# Base of workers that hand results from their own thread to the main loop.
+# put_results() queues them and writes a byte to a socket that is registered
+# in the main loop selector, so the main loop wakes up and picks them up with
+# take().
+class ResultWorker:
+    def __init__(self):
+        # Worker thread -> main thread
+        self.results = queue.SimpleQueue()
+        # Worker thread writes a byte for every batch of results
+        self.wake_up_recv, self.wake_up_send = socket.socketpair()
+        self.wake_up_recv.setblocking(False)
+
+    # <-------------------------- Main thread ---------------------------->
+
+    def fileno(self):
+        return self.wake_up_recv.fileno()
+
+    def register(self, selector : selectors.BaseSelector):
+        selector.register(self, selectors.EVENT_READ, self)
+
+    # Wake-up socket readable, results are picked up with take().
+    def step(self):
+        try:
+            while len(self.wake_up_recv.recv(4096)) > 0:
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    # Returns and forgets the results put so far.
+    def take(self):
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    # <------------------------- Worker thread --------------------------->
+
+    def put_results(self, results : list):
+        for result in results:
+            self.results.put(result)
+        if len(results) > 0:
+            self.wake_up_send.send(b"\0")
@@ -0,0 +1,113 @@
+import queue        # Commands between threads
+import threading    # Scan thread
+import time         # Misc
+
+from src.result_worker import ResultWorker
+from src.wallet_poller import WalletPollerPool
+from src import metrics
+
+# <--------------------------------- Constant --------------------------------->
+
+# Output prefix
+PRE_MSG = "Scan_Worker"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Runs every wallet rpc call of the scan timer, scan requests (ZMQ) and pushed
+# tx_ids (`--tx-notify`) on its own thread, so a slow or unreachable wallet
+# never holds up the MessageReceivers (e.g. IRC PINGs) or the pop-ups.
+# The pollers belong to the scan thread once it runs, the main thread and
+# TxLookup only send commands, so a WalletRPC session is never used by two
+# threads at once. Results come back through take():
+#   [(poller, transfers, is_new_block, (height, floor)), ...]
+# Supervisor interface: restarted with the same pollers and queues if it
+# crashed, a scan is bounded by the rpc timeouts, so it is never stuck.
+class ScanWorker(ResultWorker):
+    name = "scanner"
+
+    def __init__(self, wallet_pool : WalletPollerPool):
+        super().__init__()
+        self.wallet_pool = wallet_pool
+
+        # Main thread -> scan thread: (method name, args)
+        self.commands = queue.SimpleQueue()
+
+        self.thread = None
+
+    # <-------------------------- Supervisor ----------------------------->
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stuck_time(self):
+        return None
+
+    # Already dead when the supervisor calls it
+    def stop(self):
+        pass
+
+    # <-------------------------- Main thread ---------------------------->
+
+    # See WalletPoller.request_scan()
+    def request_scan(self, is_new_block : bool, is_new_pool_tx : bool):
+        self.commands.put(("request_scan", (is_new_block, is_new_pool_tx, time.monotonic())))
+
+    # Timer of every poller, pool_scan_interval None: mempool is not scanned
+    def set_intervals(self, scan_interval : float, pool_scan_interval : float):
+        self.commands.put(("set_intervals", (scan_interval, pool_scan_interval)))
+
+    # { tx_id : wallet label or None }, see WalletPollerPool.fetch()
+    def fetch(self, tx_ids : dict):
+        self.commands.put(("fetch", (tx_ids,)))
+
+    # Like fetch(), but [(poller, transfers), ...] go to `reply` instead of
+    # take(), for TxLookup which retries tx_ids that weren't found.
+    def lookup(self, tx_ids : dict, reply : queue.SimpleQueue):
+        self.commands.put(("lookup", (tx_ids, reply)))
+
+    # <--------------------------- Scan thread ---------------------------->
+
+    def run(self):
+        while True:
+            timeout = max(0, self.wallet_pool.next_scan_time() - time.monotonic())
+            try:
+                self.handle(*self.commands.get(timeout=timeout))
+                while True:
+                    self.handle(*self.commands.get_nowait())
+            except queue.Empty:
+                pass
+
+            start_time = time.monotonic()
+            results = self.wallet_pool.scan()
+            # Only actual scans, not the wake-ups where nothing was due
+            if len(results) > 0:
+                metrics.scan_seconds.observe(time.monotonic() - start_time)
+            self.put_scan_results([(poller, transfers, is_new_block)
+                                   for poller, transfers, is_new_block in results
+                                   if len(transfers) > 0 or is_new_block])
+
+    def handle(self, command : str, args : tuple):
+        if command == "request_scan":
+            for poller in self.wallet_pool.pollers:
+                poller.request_scan(*args)
+        elif command == "set_intervals":
+            for poller in self.wallet_pool.pollers:
+                poller.scan_interval, poller.pool_scan_interval = args
+        elif command == "fetch":
+            self.put_scan_results([(poller, transfers, False)
+                                   for poller, transfers in self.wallet_pool.fetch(*args)
+                                   if len(transfers) > 0])
+        elif command == "lookup":
+            tx_ids, reply = args
+            reply.put(self.wallet_pool.fetch(tx_ids))
+
+    # Adds the current (height, floor) of the poller
+    def put_scan_results(self, results : list):
+        self.put_results([(poller, transfers, is_new_block,
+                           (poller.block_height, poller.scan_floor_height))
+                          for poller, transfers, is_new_block in results])
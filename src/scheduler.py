@@ -0,0 +1,123 @@
+import time         # Misc
+
+from src.misc import *
+from src.ledger import TxLedger
+from src import metrics
+
+# <--------------------------------- Constant --------------------------------->
+
+# Pop-up order
+# Oldest queued tx first
+ORDER_AGE    = 0
+# Biggest amount first, equal amounts oldest first
+ORDER_AMOUNT = 1
+
+# Output prefix
+PRE_MSG = "Scheduler"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# One pop-up to show, may stand for several coalesced txs.
+class PopUp:
+    __slots__ = ("user_name", "amount", "message", "duration", "records")
+
+    def __init__(self, user_name : str, amount : int, message : str, duration : float, records : list):
+        self.user_name = user_name
+        self.amount = amount
+        self.message = message
+        # in sec, how long it is shown
+        self.duration = duration
+        # TxRecords it was made of
+        self.records = records
+
+
+# Picks the next pop-up from the ledger queue, so a burst (e.g. a raid with
+# dozens of donations in one block) is shown while it still matters:
+# - display time shrinks with the queue length, so the queue is worked off
+#   within the latency budget (but never below min_duration)
+# - during a burst, txs below coalesce_max_amount become one summary pop-up
+# - order by age or amount
+class PopUpScheduler:
+    def __init__(self,
+                 duration               : float,
+                 min_duration           : float,
+                 latency_budget         : float,
+                 coalesce_min_queue_len : int,
+                 coalesce_max_amount    : int,
+                 coalesce_name          : str = "{count} donations",
+                 order                  : int = ORDER_AGE):
+
+        self.duration = duration
+        self.min_duration = min_duration
+        self.latency_budget = latency_budget
+        # - None: never coalesce
+        self.coalesce_min_queue_len = coalesce_min_queue_len
+        self.coalesce_max_amount = coalesce_max_amount
+        # User name of a summary pop-up, `{count}` is replaced by the number of txs
+        self.coalesce_name = coalesce_name
+        self.order = order
+
+        # in sec, queue wait of the last taken tx, from queued until shown.
+        # All of them go to the /metrics histograms.
+        self.last_wait = 0.0
+
+    # Display time for the current queue length.
+    def duration_for(self, queue_len : int):
+        return max(self.min_duration,
+                   min(self.duration, self.latency_budget / max(1, queue_len)))
+
+    def is_burst(self, queue_len : int):
+        return self.coalesce_min_queue_len is not None and queue_len >= self.coalesce_min_queue_len
+
+    # Takes the next pop-up out of the ledger queue, or returns None.
+    def next_pop_up(self, ledger : TxLedger):
+        queue_len = len(ledger.queue)
+        if queue_len == 0:
+            return None
+        duration = self.duration_for(queue_len)
+
+        if self.is_burst(queue_len):
+            small = [rec for rec in ledger.queue if rec.amount < self.coalesce_max_amount]
+            if len(small) > 1:
+                pop_up = self.coalesce(small, self.duration_for(queue_len - len(small) + 1))
+                return self.take(ledger, pop_up)
+
+        if self.order == ORDER_AMOUNT:
+            rec = max(ledger.queue, key=lambda rec: rec.amount)
+        else:
+            rec = ledger.queue[0]
+        return self.take(ledger, PopUp(rec.user_name, rec.amount, rec.message, duration, [rec]))
+
+    # One summary pop-up for many small txs.
+    def coalesce(self, records : list, duration : float):
+        user_names = []
+        for rec in records:
+            if not rec.user_name in user_names:
+                user_names.append(rec.user_name)
+        return PopUp(self.coalesce_name.format(count=len(records)),
+                     sum(rec.amount for rec in records),
+                     ", ".join(user_names),
+                     duration,
+                     records)
+
+    # Remove the pop-up txs from the ledger queue and update queue wait.
+    # Retries of a pop-up that wasn't shown are only counted the first time.
+    def take(self, ledger : TxLedger, pop_up : PopUp):
+        now = time.monotonic()
+        is_retry = True
+        for rec in pop_up.records:
+            ledger.take(rec)
+            if rec.failed_attempts > 0:
+                continue
+            is_retry = False
+            wait = now - rec.queued_time
+            self.last_wait = wait
+            metrics.queue_wait_seconds.observe(wait)
+            metrics.tx_to_pop_up_seconds.observe(now - rec.timestamp)
+        if not is_retry:
+            metrics.pop_ups_total.inc()
+        printd(PRE_MSG, f"{len(pop_up.records)} tx(s) for {pop_up.duration:.1f} s, "\
+                        f"waited {self.last_wait:.1f} s, {len(ledger.queue)} left in queue.")
+        return pop_up
+
@@ -0,0 +1,83 @@
+import time         # Misc
+
+from src.misc import *
+from src import metrics
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# in sec, first restart delay of a crashed worker, doubles with every crash ...
+RESTART_BACKOFF_SECONDS = 1
+# ... up to this. A worker that runs this long after a restart starts over.
+MAX_RESTART_BACKOFF_SECONDS = 60
+# in sec, how often workers get checked
+SUPERVISE_SECONDS = 1
+
+# Output prefix
+PRE_MSG = "Supervisor"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Restarts crashed or stuck workers, called from the main loop.
+# A worker has a `name` and:
+# - start(): (re)starts it, keeps its queues so callers don't notice
+# - is_alive()
+# - stuck_time(): monotonic time when it counts as stuck, None if it isn't busy
+# - stop(): stops (or abandons) it, start() follows
+class Supervisor:
+    def __init__(self,
+                 backoff     : float = RESTART_BACKOFF_SECONDS,
+                 max_backoff : float = MAX_RESTART_BACKOFF_SECONDS):
+
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # { worker : [start_time, restart_time or None, backoff] }
+        self.workers = {}
+
+    # Start worker and watch it.
+    def add(self, worker):
+        worker.start()
+        self.workers[worker] = [time.monotonic(), None, self.backoff]
+
+    def check(self, now : float = None):
+        now = time.monotonic() if now is None else now
+        for worker, state in self.workers.items():
+            start_time, restart_time, backoff = state
+
+            stuck_time = worker.stuck_time()
+            if restart_time is None and stuck_time is not None and now >= stuck_time:
+                printw(PRE_MSG, f"{worker.name} is stuck, restarting it.")
+                worker.stop()
+                # Stuck is not a crash loop, restart right away
+                state[1] = now
+                restart_time = now
+            elif restart_time is None:
+                if worker.is_alive():
+                    if backoff > self.backoff and now - start_time >= self.max_backoff:
+                        state[2] = self.backoff
+                    continue
+                printw(PRE_MSG, f"{worker.name} crashed, restarting it in {backoff:.0f} s.")
+                worker.stop()
+                state[1] = now + backoff
+                state[2] = min(backoff * 2, self.max_backoff)
+                continue
+
+            if now >= restart_time:
+                worker.start()
+                metrics.worker_restarts_total.inc(labels=(worker.name,))
+                printm(PRE_MSG, f"Restarted {worker.name}.")
+                state[0] = now
+                state[1] = None
+
+    # Next check, earlier if a restart or a stuck worker is due
+    def next_wake_up_time(self):
+        wake_up_time = time.monotonic() + SUPERVISE_SECONDS
+        for worker, (_, restart_time, _) in self.workers.items():
+            if restart_time is not None:
+                wake_up_time = min(wake_up_time, restart_time)
+            stuck_time = worker.stuck_time()
+            if stuck_time is not None:
+                wake_up_time = min(wake_up_time, stuck_time)
+        return wake_up_time
@@ -0,0 +1,152 @@
+import collections  # LRU order
+
+# Works with any font that has `size(text)` and `render(text, antialias, color)`,
+# i.e. pygame.font.Font, pygame is only imported by the renderer.
+
+# <--------------------------------- Constant --------------------------------->
+
+# Rendered surfaces kept, regular names, round amounts and message lines
+MAX_CACHED_SURFACES = 256
+# Wrapped messages kept
+MAX_CACHED_LAYOUTS = 64
+# Measured words kept per font, chat reuses most of its words
+MAX_CACHED_WIDTHS = 4096
+# Appended to the last row, if the message doesn't fit
+ELLIPSIS = "..."
+
+# Output prefix
+PRE_MSG = "Text_Layout"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Dict that forgets the least recently used entry once it is full.
+class LRUCache:
+    def __init__(self, max_entries : int):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+
+        # Counters
+        self.num_hits   = 0
+        self.num_misses = 0
+
+    # Returns the cached value of `key`, calls create() on a miss.
+    def get(self, key, create):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.num_misses += 1
+            value = create()
+            if self.max_entries > 0:
+                self.entries[key] = value
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return value
+        self.num_hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def hit_rate(self):
+        num_gets = self.num_hits + self.num_misses
+        return self.num_hits / num_gets if num_gets > 0 else 0
+
+
+# Wraps text at word boundaries to a width in pixels and renders it, both
+# cached: a message is only wrapped once, a (text, font, color) only rendered
+# once while it stays in the LRU cache. Word widths are kept across messages.
+# Not thread-safe, belongs to the render thread.
+class TextRenderer:
+    def __init__(self,
+                 max_surfaces : int = MAX_CACHED_SURFACES,
+                 max_layouts  : int = MAX_CACHED_LAYOUTS):
+
+        self.surfaces = LRUCache(max_surfaces)
+        self.layouts = LRUCache(max_layouts)
+        # { font : { word : width in px } }, starts over once it is full
+        self.widths = {}
+
+    # Antialiased surface of a single line.
+    def render(self, text : str, font, color : tuple):
+        return self.surfaces.get((text, font, color),
+                                 lambda: font.render(text, True, color))
+
+    # Returns the lines of `text`, at most `max_rows` of them.
+    def wrap(self, text : str, font, max_width : int, max_rows : int):
+        widths = self.widths.setdefault(font, {})
+        if len(widths) > MAX_CACHED_WIDTHS:
+            widths.clear()
+        return self.layouts.get((text, font, max_width, max_rows),
+                                lambda: wrap(text, font, max_width, max_rows, widths))
+
+    # Returns [surface, ...], one per line.
+    def render_wrapped(self, text : str, font, color : tuple, max_width : int, max_rows : int):
+        return [self.render(line, font, color)
+                for line in self.wrap(text, font, max_width, max_rows)]
+
+    def stats(self):
+        return f"surfaces: {self.surfaces.num_hits} hits, {self.surfaces.num_misses} misses, "\
+               f"layouts: {self.layouts.num_hits} hits, {self.layouts.num_misses} misses"
+
+
+# <---------------------------- Function definition --------------------------->
+
+# Returns a tuple of lines that are at most `max_width` px wide, broken at
+# whitespace. Words that are wider than a line on their own get split.
+# If the text needs more than `max_rows` lines, the last one ends with ELLIPSIS.
+# Every word is measured once (`widths`: { word : width } of earlier calls),
+# a line is measured as a whole only if the sum of its words is close to the
+# width (kerning across words).
+def wrap(text : str, font, max_width : int, max_rows : int, widths : dict = None):
+    space_width = font.size(" ")[0]
+    widths = {} if widths is None else widths
+    lines = []
+    line = ""
+    line_width = 0
+    for word in text.split():
+        word_width = widths.get(word)
+        if word_width is None:
+            word_width = widths[word] = font.size(word)[0]
+        if line != "":
+            candidate_width = line_width + space_width + word_width
+            if candidate_width <= max_width - space_width\
+               or (candidate_width <= max_width + space_width
+                   and font.size(f"{line} {word}")[0] <= max_width):
+                line = f"{line} {word}"
+                line_width = candidate_width
+                continue
+            lines.append(line)
+            if len(lines) >= max_rows:
+                return ellipsize(lines, font, max_width)
+        while len(word) > 1 and word_width > max_width:
+            cut = fit(word, font, max_width)
+            lines.append(word[:cut])
+            if len(lines) >= max_rows:
+                return ellipsize(lines, font, max_width)
+            word = word[cut:]
+            word_width = font.size(word)[0]
+        line = word
+        line_width = word_width
+    if line != "":
+        lines.append(line)
+    return tuple(lines)
+
+
+# Returns the length of the longest prefix of `text` that fits, at least 1.
+def fit(text : str, font, max_width : int):
+    low, high = 1, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if font.size(text[:mid])[0] <= max_width:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+# Marks the last of the cut off lines with ELLIPSIS, shortened until it fits.
+def ellipsize(lines : list, font, max_width : int):
+    last = lines[-1]
+    while len(last) > 0 and font.size(last + ELLIPSIS)[0] > max_width:
+        last = last[:-1]
+    lines[-1] = last.rstrip() + ELLIPSIS
+    return tuple(lines)
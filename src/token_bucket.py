@@ -0,0 +1,35 @@
+import time         # Misc
+
+# <----------------------------- Class definition ----------------------------->
+
+# Rate limit: up to `burst` takes at once, refilled with `per_second`.
+class TokenBucket:
+    __slots__ = ("burst", "per_second", "tokens", "last_refill_time")
+
+    def __init__(self, burst : int, per_second : float, now : float = None):
+        self.burst = burst
+        self.per_second = per_second
+        # Starts full
+        self.tokens = burst
+        self.last_refill_time = time.monotonic() if now is None else now
+
+    # Returns the available tokens.
+    def refill(self, now : float):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill_time) * self.per_second)
+        self.last_refill_time = now
+        return self.tokens
+
+    # Returns True if a token was left, takes it.
+    def take(self, now : float):
+        if self.refill(now) < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    # in sec, until the next token is available
+    def wait_time(self, now : float):
+        return max(0, (1 - self.refill(now)) / self.per_second)
+
+    # Full again, behaves like a new bucket
+    def is_full(self, now : float):
+        return self.refill(now) >= self.burst
@@ -0,0 +1,240 @@
+import atexit       # Flush on exit
+import json         # Misc
+import os           # Rotation
+import queue        # Events to the writer thread
+import statistics   # Summary
+import threading    # Writer thread
+import time         # Misc
+
+from src.misc import *
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# in bytes, the trace file is rotated to <path>.1, <path>.2, ... when it gets bigger
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+# Number of rotated files kept
+TRACE_BACKUPS = 3
+# in sec, how long events are buffered before they are written
+TRACE_FLUSH_SECONDS = 1.0
+# in bytes, write buffer of the trace file
+TRACE_BUFFER_SIZE = 64 * 1024
+
+# Lifecycle of a tx, in order
+STAGE_SEEN         = "seen"          # first seen in pool or block
+STAGE_MESSAGE      = "message"       # MessageReceiver accepted a message for it
+STAGE_MATCHED      = "matched"       # joined with its message
+STAGE_TIMED_OUT    = "timed_out"     # no message in time, default name/message
+STAGE_QUEUED       = "queued"        # waiting for its pop-up
+STAGE_POP_UP_START = "pop_up_start"
+STAGE_POP_UP_END   = "pop_up_end"
+
+# Output prefix
+PRE_MSG = "Tracer"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Writes one JSON line per tx lifecycle event:
+#   {"ts": unix_time, "t": monotonic, "run": id, "tx_id": hex, "stage": str, ...}
+# event() only puts a tuple into a queue, the writer thread encodes the events
+# and writes them in batches, so tracing doesn't slow down the main loop.
+# `t` is time.monotonic() of the process `run`, across restarts `ts` is used.
+class TxTracer:
+    def __init__(self):
+        self.path = None
+        self.events = queue.SimpleQueue()
+        self.thread = None
+        self.file = None
+        self.size = 0
+        self.run = None
+        self.max_bytes = TRACE_MAX_BYTES
+        self.backups = TRACE_BACKUPS
+
+    @property
+    def is_enabled(self):
+        return self.thread is not None
+
+    def start(self,
+              path      : str,
+              max_bytes : int = TRACE_MAX_BYTES,
+              backups   : int = TRACE_BACKUPS):
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        # Tells runs apart, their monotonic clocks don't compare
+        self.run = int(time.time() * 1000)
+        self.open()
+        self.thread = threading.Thread(target=self.write_events, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        printm(PRE_MSG, f"Tracing tx lifecycle to {self.path}")
+
+    # tx_id as hex str or 32 bytes, fields must be JSON serializable.
+    def event(self, tx_id, stage : str, **fields):
+        if self.thread is None:
+            return
+        self.events.put((time.time(), time.monotonic(), tx_id, stage, fields))
+
+    # <-------------------------- Writer thread --------------------------->
+
+    def write_events(self):
+        is_closed = False
+        while not is_closed:
+            batch = [self.events.get()]
+            # Collect everything that comes in until the next flush
+            end_time = time.monotonic() + TRACE_FLUSH_SECONDS
+            while batch[-1] is not None:
+                timeout = end_time - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.events.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            # None: close() was called
+            if batch[-1] is None:
+                batch.pop()
+                is_closed = True
+            try:
+                self.write_lines(batch)
+            except (OSError, TypeError, ValueError) as e:
+                printw(PRE_MSG, f"Unable to write trace: {e}")
+        self.file.close()
+
+    # Writes what is still buffered, the writer thread is a daemon and would lose it.
+    def close(self):
+        if self.thread is None:
+            return
+        thread, self.thread = self.thread, None
+        self.events.put(None)
+        thread.join(timeout=TRACE_FLUSH_SECONDS * 5)
+
+    def write_lines(self, batch : list):
+        for ts, t, tx_id, stage, fields in batch:
+            entry = {"ts": round(ts, 6), "t": round(t, 6), "run": self.run,
+                     "tx_id": tx_id.hex() if isinstance(tx_id, bytes) else tx_id,
+                     "stage": stage}
+            entry.update(fields)
+            line = json.dumps(entry) + "\n"
+            self.file.write(line)
+            self.size += len(line)
+            if self.size >= self.max_bytes:
+                self.rotate()
+        self.file.flush()
+
+    # <path> -> <path>.1 -> <path>.2 ..., oldest one is dropped
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i+1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open()
+        printd(PRE_MSG, f"Rotated {self.path}")
+
+    def open(self):
+        self.file = open(self.path, "a", encoding="UTF-8", buffering=TRACE_BUFFER_SIZE)
+        # in bytes, lines are ASCII (json.dumps escapes everything else)
+        self.size = self.file.tell()
+
+
+# <-------------------------------- Functions --------------------------------->
+
+# Trace files, oldest first.
+def trace_paths(path : str, backups : int = TRACE_BACKUPS):
+    paths = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    return [p for p in paths if os.path.exists(p)]
+
+# Returns { tx_id : { stage : entry } }, first entry of each stage wins.
+def load_traces(paths : list):
+    txs = {}
+    for path in paths:
+        with open(path, "r", encoding="UTF-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                stages = txs.setdefault(entry["tx_id"], {})
+                stages.setdefault(entry["stage"], entry)
+    return txs
+
+# in sec, monotonic within one run, wall clock across restarts
+def elapsed(start : dict, end : dict):
+    if start["run"] == end["run"]:
+        return end["t"] - start["t"]
+    return end["ts"] - start["ts"]
+
+def percentile(values : list, p : float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def print_summary(txs : dict):
+    intervals = [("seen -> queued", STAGE_SEEN, STAGE_QUEUED),
+                 ("message -> queued", STAGE_MESSAGE, STAGE_QUEUED),
+                 ("queued -> pop-up", STAGE_QUEUED, STAGE_POP_UP_START),
+                 ("pop-up shown", STAGE_POP_UP_START, STAGE_POP_UP_END),
+                 ("seen -> pop-up", STAGE_SEEN, STAGE_POP_UP_START)]
+    counts = {stage : 0 for stage in [STAGE_SEEN, STAGE_MESSAGE, STAGE_MATCHED, STAGE_TIMED_OUT,
+                                      STAGE_QUEUED, STAGE_POP_UP_START, STAGE_POP_UP_END]}
+    for stages in txs.values():
+        for stage in stages:
+            if stage in counts:
+                counts[stage] += 1
+
+    print(f"{len(txs)} txs")
+    for stage, count in counts.items():
+        print(f"  {stage:<14} {count:8d}")
+    print(f"  {'no pop-up':<14} {counts[STAGE_SEEN] - counts[STAGE_POP_UP_START]:8d}")
+    print()
+    print(f"  {'stage (sec)':<18} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'avg':>8}")
+    for name, start, end in intervals:
+        values = [elapsed(stages[start], stages[end])
+                  for stages in txs.values() if start in stages and end in stages]
+        if len(values) == 0:
+            print(f"  {name:<18} {0:6d}")
+            continue
+        print(f"  {name:<18} {len(values):6d} {percentile(values, 50):8.2f} {percentile(values, 90):8.2f} "\
+              f"{percentile(values, 99):8.2f} {max(values):8.2f} {statistics.mean(values):8.2f}")
+
+def print_tx(txs : dict, tx_id : str):
+    stages = txs.get(tx_id)
+    if stages is None:
+        print(f"{tx_id} not found")
+        return
+    entries = sorted(stages.values(), key=lambda entry: entry["ts"])
+    first = entries[0]
+    for entry in entries:
+        extra = {k : v for k, v in entry.items() if not k in ("ts", "t", "run", "tx_id", "stage")}
+        print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['ts']))} "\
+              f"{elapsed(first, entry):+9.2f} s  {entry['stage']:<14} {json.dumps(extra) if extra else ''}")
+
+
+# <---------------------------------- Global ---------------------------------->
+
+# Disabled until started, event() is a no-op then
+tracer = TxTracer()
+
+
+# <------------------------------------ CLI ----------------------------------->
+
+# Summarize a trace, from repository root:
+#   python3 -m src.tracer tx_trace.jsonl [--tx <tx_id>]
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarizes the tx lifecycle trace.")
+    parser.add_argument("path", help="trace file, rotated files next to it are read too")
+    parser.add_argument("--tx", help="print the lifecycle of a single tx_id")
+    args = parser.parse_args()
+
+    txs = load_traces(trace_paths(args.path))
+    if args.tx is not None:
+        print_tx(txs, args.tx.strip().lower())
+    else:
+        print_summary(txs)
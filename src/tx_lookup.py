@@ -0,0 +1,162 @@
+import heapq        # Retry schedule
+import queue        # Requests between threads
+import threading    # Lookup thread
+import time         # Misc
+
+from src.misc import *
+from src.result_worker import ResultWorker
+from src.scan_worker import ScanWorker
+from src.token_bucket import TokenBucket
+from src import metrics
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# in sec after the first lookup, the wallet may not have seen a tx the donor
+# just sent. Not found after the last one: the next scan picks it up.
+LOOKUP_RETRY_SECONDS = (5, 20, 60)
+# Lookups of all users together, token bucket: burst size and refill rate
+LOOKUP_BURST      = 20
+LOOKUP_PER_SECOND = 5
+# tx_ids waiting for a lookup or retry, further ones are dropped
+MAX_PENDING_LOOKUPS = 200
+# in sec, a tx_id is only looked up once (with its retries) in this time
+LOOKUP_DEDUPE_SECONDS = 300
+# in sec, how long a lookup waits for the scan thread, which may be in the
+# middle of a scan of an unreachable wallet. Counts as not found.
+LOOKUP_REPLY_TIMEOUT_SECONDS = 60
+
+# Output prefix
+PRE_MSG = "Tx_Lookup"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Looks up tx_ids of messages that arrived before their tx was scanned, with
+# `get_transfer_by_txid` (mempool and mined), so message-first donations don't
+# wait for the next scan.
+# request() is called on the main thread and only queues the tx_id, lookups
+# are scheduled on their own thread so they never block the MessageReceiver.
+# The wallet rpc calls go through the ScanWorker, which owns the pollers.
+# Everything that is due at the same time is looked up together (concurrently
+# for several wallets). Found transfers are handed back through take():
+#   [(poller, transfers), ...]
+# Supervisor interface: restarted with the same queues if it crashed.
+class TxLookup(ResultWorker):
+    name = "tx_lookup"
+
+    def __init__(self,
+                 scan_worker   : ScanWorker,
+                 retry_seconds : tuple = LOOKUP_RETRY_SECONDS,
+                 burst         : int = LOOKUP_BURST,
+                 per_second    : float = LOOKUP_PER_SECOND,
+                 max_pending   : int = MAX_PENDING_LOOKUPS):
+
+        super().__init__()
+        self.scan_worker = scan_worker
+        self.retry_seconds = retry_seconds
+        self.max_pending = max_pending
+
+        # Main thread -> lookup thread: tx_ids
+        self.requests = queue.SimpleQueue()
+
+        # Lookup thread only
+        # [(due_time, tx_id, attempt), ...]
+        self.due = []
+        # { tx_id : first request time }, insertion ordered
+        self.requested = {}
+        self.tokens = TokenBucket(burst, per_second)
+
+        self.thread = None
+
+    # <-------------------------- Supervisor ----------------------------->
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # Lookups are bounded by the rpc timeouts
+    def stuck_time(self):
+        return None
+
+    def stop(self):
+        pass
+
+    # <--------------------------- Main thread ---------------------------->
+
+    # Message with an unknown tx_id (hex str) arrived.
+    def request(self, tx_id : str):
+        self.requests.put(tx_id)
+
+    # <-------------------------- Lookup thread --------------------------->
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            timeout = None
+            if len(self.due) > 0:
+                timeout = max(0, self.due[0][0] - now)
+                # Out of tokens, wait for the next one
+                if timeout == 0:
+                    timeout = self.tokens.wait_time(now)
+            try:
+                self.add_request(self.requests.get(timeout=timeout))
+                # Coalesce: everything that came in meanwhile goes out together
+                while True:
+                    self.add_request(self.requests.get_nowait())
+            except queue.Empty:
+                pass
+            self.lookup_due()
+
+    def add_request(self, tx_id : str):
+        now = time.monotonic()
+        # Forget old requests, the dict is ordered by request time
+        while len(self.requested) > 0:
+            first_tx_id, request_time = next(iter(self.requested.items()))
+            if now - request_time < LOOKUP_DEDUPE_SECONDS:
+                break
+            del self.requested[first_tx_id]
+        if tx_id in self.requested:
+            return
+        if len(self.due) >= self.max_pending:
+            metrics.tx_lookups_total.inc(labels=("dropped",))
+            printw(PRE_MSG, f"Too many pending lookups, dropped: {tx_id}")
+            return
+        self.requested[tx_id] = now
+        heapq.heappush(self.due, (now, tx_id, 0))
+
+    def lookup_due(self):
+        now = time.monotonic()
+        batch = {}
+        while len(self.due) > 0 and self.due[0][0] <= now and self.tokens.take(now):
+            _, tx_id, attempt = heapq.heappop(self.due)
+            batch[tx_id] = attempt
+        if len(batch) == 0:
+            return
+
+        # Messages don't say which wallet got the tx, ask all of them
+        reply = queue.SimpleQueue()
+        self.scan_worker.lookup({tx_id : None for tx_id in batch}, reply)
+        try:
+            results = reply.get(timeout=LOOKUP_REPLY_TIMEOUT_SECONDS)
+        except queue.Empty:
+            printw(PRE_MSG, f"Scan thread didn't answer, retry {len(batch)} lookup(s).")
+            results = []
+
+        results = [(poller, transfers) for poller, transfers in results if len(transfers) > 0]
+        found = {transfer["txid"] for _, transfers in results for transfer in transfers}
+        self.put_results(results)
+
+        for tx_id, attempt in batch.items():
+            if tx_id in found:
+                metrics.tx_lookups_total.inc(labels=("found",))
+                printd(PRE_MSG, f"found: {tx_id}")
+            elif attempt < len(self.retry_seconds):
+                heapq.heappush(self.due, (now + self.retry_seconds[attempt], tx_id, attempt + 1))
+            else:
+                metrics.tx_lookups_total.inc(labels=("not_found",))
+                printd(PRE_MSG, f"not found: {tx_id}")
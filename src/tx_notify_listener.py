@@ -0,0 +1,109 @@
+import selectors
+import socket
+
+from src.misc import *
+
+# <---------------------------------- Config ---------------------------------->
+
+# Linux: Unix datagram socket, monero-wallet-rpc needs write permission to it.
+TX_NOTIFY_SOCKET_PATH = "/tmp/xmr_tx_notify_tx.sock"
+# Windows (no Unix sockets): UDP on localhost.
+TX_NOTIFY_IP   = "127.0.0.1"
+TX_NOTIFY_PORT = 18103
+
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+MAX_DATAGRAM_SIZE = 512   # in bytes, "<tx_id> <wallet label>"
+MAX_PUSHED        = 1000  # tx_ids waiting to be fetched, further ones are dropped
+
+# Output prefix
+PRE_MSG = "Tx_Notify"
+
+
+# <-------------------------------- Functions --------------------------------->
+
+# Datagram sent by tx_notify.py, the label picks the wallet (None: any wallet).
+def encode_push(tx_id : str, label : str = None):
+    return (tx_id if label is None else f"{tx_id} {label}").encode("UTF-8")
+
+# Returns (tx_id, label), raises ValueError.
+def decode_push(data : bytes):
+    tx_id, _, label = data.decode("UTF-8").strip().partition(" ")
+    tx_id = tx_id.lower()
+    if not is_tx_id(tx_id):
+        raise ValueError(f"invalid tx_id: {tx_id[:64]}")
+    return tx_id, label if label else None
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Receives the tx_ids that monero-wallet-rpc pushes for every tx of its wallet
+# (`--tx-notify`, see tx_notify.py), so new txs don't have to wait for the next
+# `get_transfers` scan. Only collects them, the main loop fetches the txs.
+class TxNotifyListener:
+    def __init__(self,
+                 socket_path : str = TX_NOTIFY_SOCKET_PATH,
+                 ip          : str = TX_NOTIFY_IP,
+                 port        : int = TX_NOTIFY_PORT):
+
+        # { tx_id : wallet label or None }, in arrival order
+        self.pushed = {}
+        self.num_received = 0
+        self.num_rejected = 0
+
+        if hasattr(socket, "AF_UNIX"):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            # Owner and group, monero-wallet-rpc may run as another user in our group
+            bind_unix_socket(self.sock, socket_path, 0o660)
+            address = socket_path
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind((ip, port))
+            address = f"{ip}:{port}"
+        self.sock.setblocking(False)
+
+        printm(PRE_MSG, f"Listening for pushed tx_ids on {address}.")
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def register(self, selector : selectors.BaseSelector):
+        selector.register(self, selectors.EVENT_READ, self)
+
+    # Socket readable: collect every queued datagram.
+    def step(self):
+        while True:
+            try:
+                data = self.sock.recv(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                printw(PRE_MSG, f"Receive failed: {e}")
+                return
+            try:
+                tx_id, label = decode_push(data)
+            except ValueError as e:
+                self.num_rejected += 1
+                printw(PRE_MSG, f"Abort: {e}")
+                continue
+            if len(self.pushed) >= MAX_PUSHED:
+                self.num_rejected += 1
+                printw(PRE_MSG, f"Too many pushed tx_ids, dropped: {tx_id}")
+                continue
+            self.num_received += 1
+            self.pushed[tx_id] = label
+            printd(PRE_MSG, f"pushed: {tx_id} ({label})")
+
+    def has_pushed(self):
+        return len(self.pushed) > 0
+
+    # Returns and forgets the collected { tx_id : wallet label or None }.
+    def take(self):
+        pushed, self.pushed = self.pushed, {}
+        return pushed
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,232 @@
+import time         # Misc
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.misc import *
+from src.wallet_rpc import WalletRPC, WalletRPCError
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# Wallets scanned at the same time, a scan mostly waits for the wallet rpc.
+MAX_SCAN_WORKERS = 8
+
+# Output prefix
+PRE_MSG = "Wallet_Poller"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Scan cursor of one monero-wallet-rpc (and one of its accounts).
+# scan() only talks to the wallet and returns the new incoming transfers, so
+# several pollers can run in worker threads while the ledger stays on the
+# main thread.
+class WalletPoller:
+    def __init__(self,
+                 label              : str,
+                 rpc                : WalletRPC,
+                 account_index      : int = 0,
+                 subaddr_indices    : list = None,
+                 scan_interval      : float = 40,
+                 pool_scan_interval : float = None,
+                 pool_min_amount    : int = 0,
+                 reorg_depth        : int = 10):
+
+        # Shown in logs and kept with every tx, to know which wallet got it
+        self.label = label
+        self.rpc = rpc
+        self.account_index = account_index
+        # Empty: every subaddress of the account
+        self.subaddr_indices = [] if subaddr_indices is None else subaddr_indices
+        self.scan_interval = scan_interval
+        # - None: mempool is not scanned
+        # - Otherwise seconds between mempool scans
+        self.pool_scan_interval = pool_scan_interval
+        # Smaller 0-conf txs are only returned once they are mined
+        self.pool_min_amount = pool_min_amount
+        self.reorg_depth = reorg_depth
+
+        # Last scanned height, scans never go below scan_floor_height
+        self.block_height = None
+        self.scan_floor_height = None
+        # time.monotonic() timestamps
+        self.last_scan_time      = float("-inf")
+        self.last_pool_scan_time = float("-inf")
+        # Scans requested by request_scan(), inf if there is none
+        self.requested_scan_time      = float("inf")
+        self.requested_pool_scan_time = float("inf")
+
+    # Start scanning at the current height of the wallet (or the given one).
+    # Raises WalletRPCError.
+    def init_height(self, height : int = None, floor : int = None):
+        if height is None:
+            height = int(self.rpc.call("get_height")["height"])
+        self.block_height = height
+        # `get_height` is the number of blocks, so the next block has this
+        # height. `min_height` is exclusive, the floor is the last old block.
+        self.scan_floor_height = height - 1 if floor is None else floor
+
+    def next_scan_time(self):
+        scan_time = min(self.last_scan_time + self.scan_interval, self.requested_scan_time)
+        if self.pool_scan_interval is not None:
+            scan_time = min(scan_time,
+                            self.last_pool_scan_time + self.pool_scan_interval,
+                            self.requested_pool_scan_time)
+        return scan_time
+
+    # Scan before the timer is due, e.g. monerod announced a new block or pool
+    # tx. The wallet refreshes first for a new block, it may not have seen it yet.
+    def request_scan(self, is_new_block : bool, is_new_pool_tx : bool, scan_time : float = None):
+        scan_time = time.monotonic() if scan_time is None else scan_time
+        if is_new_block:
+            self.requested_scan_time = min(self.requested_scan_time, scan_time)
+        if is_new_pool_tx and self.pool_scan_interval is not None:
+            self.requested_pool_scan_time = min(self.requested_pool_scan_time, scan_time)
+
+    def is_scan_due(self, now : float):
+        return now >= self.next_scan_time()
+
+    # `get_transfers` args for this account
+    def transfer_args(self, args : dict):
+        args["account_index"] = self.account_index
+        if len(self.subaddr_indices) > 0:
+            args["subaddr_indices"] = self.subaddr_indices
+        return args
+
+    # Returns (new incoming transfers, True if there was a new block).
+    # RPC errors are logged, the scan is tried again next time.
+    def scan(self):
+        now = time.monotonic()
+        is_refresh = now >= self.requested_scan_time
+        is_block_scan_due = is_refresh or now - self.last_scan_time >= self.scan_interval
+        is_pool_scan_due  = self.pool_scan_interval is not None and\
+                (now >= self.requested_pool_scan_time or
+                 now - self.last_pool_scan_time >= self.pool_scan_interval)
+        if not is_block_scan_due and not is_pool_scan_due:
+            return [], False
+
+        # For spam scan protection
+        self.last_scan_time = now
+        self.requested_scan_time = float("inf")
+        if is_pool_scan_due:
+            self.last_pool_scan_time = now
+            self.requested_pool_scan_time = float("inf")
+
+        transfers = []
+        try:
+            # RPC call `get_height` is cheap, in mempool mode it goes out in the
+            # same round-trip as the pool `get_transfers`. A requested `refresh`
+            # goes first, the wallet handles a batch in order.
+            calls = [("refresh", {})] if is_refresh else []
+            calls.append(("get_height", {}))
+            if is_pool_scan_due:
+                calls.append(("get_transfers", self.transfer_args({"pool": True})))
+            results = self.rpc.batch(calls)[len(calls) - (2 if is_pool_scan_due else 1):]
+            new_block_height = int(results[0]["height"])
+
+            if is_pool_scan_due:
+                printd(PRE_MSG, f"[{self.label}] get_transfers pool response:\n{results[1]}")
+                for transfer in results[1].get("pool", []):
+                    # Small 0-conf txs wait for their confirmation
+                    if sum(transfer["amounts"]) >= self.pool_min_amount:
+                        transfers.append(transfer)
+
+            # Only call `get_transfers` for blocks if there is a new block.
+            if new_block_height == self.block_height:
+                return transfers, False
+
+            # RPC call `get_transfers`
+            # Only scan the new blocks plus a small re-scan window below the last
+            # scanned height (`min_height` is exclusive), so the cost grows with new
+            # blocks and not with the wallet history.
+            args = {"in": True,
+                    "filter_by_height": True,
+                    "min_height": max(self.scan_floor_height,
+                                      min(self.block_height, new_block_height) - self.reorg_depth)}
+            res = self.rpc.call("get_transfers", self.transfer_args(args))
+        except WalletRPCError as e:
+            # Keep running, try again next scan
+            printw(PRE_MSG, f"[{self.label}] Scan failed: {e}")
+            return transfers, False
+
+        # DEBUG
+        printd(PRE_MSG, f"[{self.label}] get_transfers response:\n{res}")
+
+        transfers.extend(res.get("in", []))
+        self.block_height = new_block_height
+        return transfers, True
+
+    # Returns the incoming transfers of a single tx, e.g. pushed by
+    # `--tx-notify`, that scan() would return as well:
+    # - mined, above the scan floor
+    # - 0-conf, only if the mempool is scanned and above pool_min_amount
+    # - in this account (and one of its subaddr_indices)
+    # A tx that isn't in this wallet is logged, returns no transfers.
+    def fetch(self, tx_id : str):
+        try:
+            res = self.rpc.call("get_transfer_by_txid", {"txid": tx_id,
+                                                         "account_index": self.account_index})
+        except WalletRPCError as e:
+            printd(PRE_MSG, f"[{self.label}] Fetch {tx_id} failed: {e}")
+            return []
+        printd(PRE_MSG, f"[{self.label}] get_transfer_by_txid response:\n{res}")
+
+        transfers = []
+        # `transfers`: one per subaddress, older wallets only return `transfer`
+        for transfer in res.get("transfers", [res["transfer"]] if "transfer" in res else []):
+            if transfer.get("subaddr_index", {}).get("major", self.account_index) != self.account_index:
+                continue
+            if len(self.subaddr_indices) > 0 and\
+                    not transfer.get("subaddr_index", {}).get("minor") in self.subaddr_indices:
+                continue
+            if transfer["type"] == "in":
+                if transfer["height"] > self.scan_floor_height:
+                    transfers.append(transfer)
+            elif transfer["type"] == "pool":
+                if self.pool_scan_interval is not None and\
+                        sum(transfer["amounts"]) >= self.pool_min_amount:
+                    transfers.append(transfer)
+        return transfers
+
+
+# Scans every wallet that is due at the same time, so adding wallets doesn't
+# add up their round-trips.
+class WalletPollerPool:
+    def __init__(self, pollers : list, max_workers : int = MAX_SCAN_WORKERS):
+        self.pollers = pollers
+        # A single wallet is scanned on the calling thread
+        self.executor = None
+        if len(pollers) > 1:
+            self.executor = ThreadPoolExecutor(max_workers = min(max_workers, len(pollers)),
+                                               thread_name_prefix = "wallet_scan")
+
+    def next_scan_time(self):
+        return min(poller.next_scan_time() for poller in self.pollers)
+
+    # Returns [(poller, transfers, is_new_block), ...] of every scanned wallet.
+    def scan(self):
+        now = time.monotonic()
+        due = [poller for poller in self.pollers if poller.is_scan_due(now)]
+        if len(due) == 0:
+            return []
+        if self.executor is None or len(due) == 1:
+            return [(poller, *poller.scan()) for poller in due]
+        futures = [(poller, self.executor.submit(poller.scan)) for poller in due]
+        return [(poller, *future.result()) for poller, future in futures]
+
+    # Returns [(poller, transfers), ...] of the given { tx_id : wallet label },
+    # a tx_id without label is looked up in every wallet.
+    def fetch(self, tx_ids : dict):
+        jobs = [(poller, tx_id) for tx_id, label in tx_ids.items()
+                for poller in self.pollers if label is None or label == poller.label]
+        if self.executor is None or len(jobs) <= 1:
+            return [(poller, poller.fetch(tx_id)) for poller, tx_id in jobs]
+        futures = [(poller, self.executor.submit(poller.fetch, tx_id)) for poller, tx_id in jobs]
+        return [(poller, future.result()) for poller, future in futures]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        for poller in self.pollers:
+            poller.rpc.close()
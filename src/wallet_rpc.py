@@ -0,0 +1,138 @@
+import itertools    # Call ids
+import json         # Misc
+import time         # Misc
+import requests     # Talk to monero-wallet-rpc
+
+from src.misc import *
+from src import metrics
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# in sec, (connect timeout, read timeout)
+RPC_TIMEOUT = (5, 30)
+# Retries per call, after the first attempt failed
+RPC_RETRIES = 3
+# in sec, wait before first retry, doubles with every retry
+RPC_BACKOFF_SECONDS = 0.5
+
+# Output prefix
+PRE_MSG = "Wallet_RPC"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Raised if a call still fails after all retries, or the wallet returns an error.
+# Callers can decide to skip this scan and try again later.
+class WalletRPCError(Exception):
+    pass
+
+
+class WalletRPC:
+    def __init__(self,
+                 url      : str,
+                 username : str,
+                 password : str,
+                 timeout  : tuple = RPC_TIMEOUT,
+                 retries  : int = RPC_RETRIES,
+                 backoff  : float = RPC_BACKOFF_SECONDS):
+
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # Thread-safe counter
+        self.call_ids = itertools.count(1)
+        # Set to False, if the wallet does not understand JSON-RPC batches,
+        # then batches are sent as single calls over the same connection.
+        self.is_batch_supported = True
+
+        # One pooled keep-alive connection. The auth object lives as long as
+        # the session, so the digest nonce is reused and the 401 challenge
+        # round-trip only happens once (or when the wallet rotates the nonce).
+        self.session = requests.Session()
+        self.session.auth = requests.auth.HTTPDigestAuth(username, password)
+        self.session.headers.update({"Content-Type":"application/json"})
+
+    def next_id(self):
+        return str(next(self.call_ids))
+
+    def request(self, method : str, params : dict = None):
+        return {"jsonrpc":"2.0",
+                "id":self.next_id(),
+                "method":method,
+                "params":params if params is not None else {}}
+
+    # POST payload, retry with exponential backoff on connection problems,
+    # timeouts and 5xx responses. Returns the parsed JSON response.
+    # `method` labels the latency metrics.
+    def post(self, payload, method : str):
+        data = json.dumps(payload)
+        wait = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                start_time = time.monotonic()
+                res = self.session.post(self.url, data=data, timeout=self.timeout)
+                metrics.rpc_call_seconds.observe(time.monotonic() - start_time, (method,))
+                if res.status_code < 500:
+                    break
+                err = f"Response status code: {res.status_code}"
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                err = f"Unable to connect to wallet rpc: {self.url} ({type(e).__name__})"
+
+            if attempt < self.retries:
+                printw(PRE_MSG, f"{err}, retry in {wait:.1f} sec.")
+                time.sleep(wait)
+                wait *= 2
+        else:
+            metrics.rpc_errors_total.inc(labels=(method,))
+            raise WalletRPCError(f"{err}\n"\
+                                 f"Make sure monero-wallet-rpc is running and the config is set accordingly.")
+
+        if res.status_code != 200:
+            raise WalletRPCError(f"Response status code: {res.status_code}\n"\
+                                 f"Response:\n{res.text}")
+        try:
+            return res.json()
+        except ValueError:
+            raise WalletRPCError(f"Invalid JSON response:\n{res.text}")
+
+    # Single call, returns the `result` dict.
+    def call(self, method : str, params : dict = None):
+        res = self.post(self.request(method, params), method)
+        if "error" in res:
+            raise WalletRPCError(f"\nMethod: {method}\n"\
+                                 f"Params: {params}\n"\
+                                 f"RPC-response: {res}")
+        return res["result"]
+
+    # Several calls in one round-trip, e.g. [("get_height", {}), ("get_transfers", {...})].
+    # Returns the `result` dicts in the same order as the calls.
+    def batch(self, calls : list):
+        if not self.is_batch_supported:
+            return [self.call(method, params) for method, params in calls]
+
+        reqs = [self.request(method, params) for method, params in calls]
+        res = self.post(reqs, "+".join(method for method, _ in calls))
+
+        # Wallet does not support batches, it answers with a single error object.
+        if not isinstance(res, list):
+            printw(PRE_MSG, "JSON-RPC batches not supported by wallet, falling back to single calls.")
+            self.is_batch_supported = False
+            return [self.call(method, params) for method, params in calls]
+
+        by_id = {r.get("id") : r for r in res}
+        results = []
+        for req in reqs:
+            r = by_id.get(req["id"])
+            if r is None or "error" in r:
+                raise WalletRPCError(f"\nMethod: {req['method']}\n"\
+                                     f"Params: {req['params']}\n"\
+                                     f"RPC-response: {r}")
+            results.append(r["result"])
+        return results
+
+    def close(self):
+        self.session.close()
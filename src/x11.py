@@ -0,0 +1,87 @@
+from Xlib import X, display, error      # In-process X11 client (python-xlib)
+from Xlib.protocol import event
+
+from src.misc import *
+
+# <--------------------------------- Constant --------------------------------->
+
+# _NET_WM_STATE client message actions (EWMH)
+NET_WM_STATE_REMOVE = 0
+NET_WM_STATE_ADD    = 1
+
+# Output prefix
+PRE_MSG = "X11"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Does what `xdotool getactivewindow`, `xprop _NET_WM_STATE`, `wmctrl -b` and
+# `xdotool windowfocus` did, over one X11 connection that is opened once and
+# reused, instead of forking a process per call.
+# Like the xdotool path, a window that closes meanwhile only makes the hack
+# fail, errors are logged and never raised into the pop-up.
+class X11WindowControl:
+    def __init__(self):
+        self.display = display.Display()
+        # Errors of requests without reply (send_event, set_input_focus) come
+        # in later, log them instead of printing to stderr
+        self.display.set_error_handler(self.on_error)
+        self.root = self.display.screen().root
+
+        # Intern atoms once
+        self.atom = {name : self.display.intern_atom(name) for name in
+                     ["_NET_ACTIVE_WINDOW",
+                      "_NET_WM_STATE",
+                      "_NET_WM_STATE_FULLSCREEN",
+                      "_NET_WM_STATE_ABOVE",
+                      "_NET_WM_STATE_BELOW",
+                      "_NET_WM_STATE_SKIP_TASKBAR"]}
+
+    def on_error(self, err, request):
+        printd(PRE_MSG, f"Async error: {err}")
+
+    # Returns window id of the currently focused window, or None.
+    def get_active_window(self):
+        try:
+            prop = self.root.get_full_property(self.atom["_NET_ACTIVE_WINDOW"], X.AnyPropertyType)
+        except error.XError as e:
+            printd(PRE_MSG, f"get_active_window() failed: {e}")
+            return None
+        if prop is None or len(prop.value) == 0 or prop.value[0] == 0:
+            return None
+        return int(prop.value[0])
+
+    def is_fullscreen(self, window_id : int):
+        try:
+            window = self.display.create_resource_object("window", window_id)
+            prop = window.get_full_property(self.atom["_NET_WM_STATE"], X.AnyPropertyType)
+        except error.XError as e:
+            printd(PRE_MSG, f"is_fullscreen({window_id}) failed: {e}")
+            return False
+        return prop is not None and self.atom["_NET_WM_STATE_FULLSCREEN"] in prop.value
+
+    # Ask the window manager to add/remove up to two _NET_WM_STATE_* states,
+    # e.g. set_state(id, ["_NET_WM_STATE_ABOVE", "_NET_WM_STATE_SKIP_TASKBAR"])
+    def set_state(self, window_id : int, states : list, action : int = NET_WM_STATE_ADD):
+        atoms = [self.atom[s] for s in states] + [0, 0]
+        try:
+            window = self.display.create_resource_object("window", window_id)
+            msg = event.ClientMessage(window = window,
+                                      client_type = self.atom["_NET_WM_STATE"],
+                                      data = (32, [action, atoms[0], atoms[1], 1, 0]))
+            self.root.send_event(msg,
+                                 event_mask = X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+            self.display.flush()
+        except error.XError as e:
+            printd(PRE_MSG, f"set_state({window_id}, {states}) failed: {e}")
+
+    def focus(self, window_id : int):
+        try:
+            window = self.display.create_resource_object("window", window_id)
+            window.set_input_focus(X.RevertToParent, X.CurrentTime)
+            self.display.flush()
+        except error.XError as e:
+            printd(PRE_MSG, f"focus({window_id}) failed: {e}")
+
+    def close(self):
+        self.display.close()
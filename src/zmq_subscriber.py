@@ -0,0 +1,125 @@
+import json         # Misc
+import selectors    # Wait for events in the main loop
+import time         # Misc
+import zmq          # monerod --zmq-pub
+
+from src.misc import *
+
+# <--------------------------------- Constant --------------------------------->
+
+# Don't touch these, unless you know what you're doing.
+
+# monerod topics, "minimal" only has the ids, the blobs aren't needed
+TOPIC_CHAIN_MAIN  = b"json-minimal-chain_main"
+TOPIC_TXPOOL_ADD  = b"json-minimal-txpool_add"
+# in sec, events within this time after the first one cause a single scan
+ZMQ_DEBOUNCE_SECONDS = 0.25
+# in sec, without any event the feed counts as quiet and the timer takes over
+ZMQ_QUIET_SECONDS = 900
+
+# Output prefix
+PRE_MSG = "ZMQ"
+
+
+# <----------------------------- Class definition ----------------------------->
+
+# Subscribes to new blocks and pool txs that monerod publishes over ZMQ
+# (`--zmq-pub tcp://127.0.0.1:18083`), so the wallets get scanned when
+# something changed, instead of on a fixed timer.
+# A burst of events (e.g. a block and its txs leaving the pool) is debounced
+# into one scan. is_alive() turns False if the feed goes quiet, e.g. monerod
+# restarted without --zmq-pub, then the caller falls back to the timer.
+class ChainSubscriber:
+    def __init__(self,
+                 url              : str,
+                 debounce_seconds : float = ZMQ_DEBOUNCE_SECONDS,
+                 quiet_seconds    : float = ZMQ_QUIET_SECONDS):
+
+        self.url = url
+        self.debounce_seconds = debounce_seconds
+        self.quiet_seconds = quiet_seconds
+
+        # Connects in the background and reconnects on its own
+        self.sock = zmq.Context.instance().socket(zmq.SUB)
+        self.sock.setsockopt(zmq.SUBSCRIBE, TOPIC_CHAIN_MAIN)
+        self.sock.setsockopt(zmq.SUBSCRIBE, TOPIC_TXPOOL_ADD)
+        self.sock.connect(url)
+
+        # time.monotonic() timestamps
+        self.last_event_time = float("-inf")
+        # First event of the current burst, None if there is none
+        self.first_event_time = None
+        self.is_new_block = False
+        self.is_new_pool_tx = False
+
+        # Counters
+        self.num_blocks   = 0
+        self.num_pool_txs = 0
+
+        printm(PRE_MSG, f"Subscribed to new blocks and pool txs on {url}.")
+
+    # Signals readable when ZMQ has something to do, step() drains it
+    def fileno(self):
+        return self.sock.getsockopt(zmq.FD)
+
+    def register(self, selector : selectors.BaseSelector):
+        selector.register(self, selectors.EVENT_READ, self)
+
+    # Called by the main loop every iteration as well, the ZMQ fd is edge
+    # triggered, messages that arrived meanwhile don't signal it again.
+    def step(self):
+        while True:
+            try:
+                data = self.sock.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            except zmq.ZMQError as e:
+                printw(PRE_MSG, f"Receive failed: {e}")
+                return
+            self.handle(data)
+
+    # "<topic>:<json>"
+    def handle(self, data : bytes):
+        topic, _, payload = data.partition(b":")
+        now = time.monotonic()
+        if topic == TOPIC_CHAIN_MAIN:
+            self.is_new_block = True
+            self.num_blocks += 1
+            try:
+                printd(PRE_MSG, f"New block at height {json.loads(payload).get('first_height')}")
+            except (ValueError, AttributeError):
+                pass
+        elif topic == TOPIC_TXPOOL_ADD:
+            self.is_new_pool_tx = True
+            self.num_pool_txs += 1
+        else:
+            return
+        if not self.is_alive(now):
+            printm(PRE_MSG, "Receiving events, scans follow them.")
+        self.last_event_time = now
+        if self.first_event_time is None:
+            self.first_event_time = now
+
+    def is_alive(self, now : float = None):
+        now = time.monotonic() if now is None else now
+        return now - self.last_event_time < self.quiet_seconds
+
+    # Monotonic time when the current burst is over, None without events
+    def next_wake_up_time(self):
+        if self.first_event_time is None:
+            return None
+        return self.first_event_time + self.debounce_seconds
+
+    # Returns (new block, new pool tx) once the burst is over and forgets them.
+    def take(self, now : float = None):
+        now = time.monotonic() if now is None else now
+        if self.first_event_time is None or now < self.first_event_time + self.debounce_seconds:
+            return False, False
+        events = (self.is_new_block, self.is_new_pool_tx)
+        self.first_event_time = None
+        self.is_new_block = False
+        self.is_new_pool_tx = False
+        return events
+
+    def close(self):
+        self.sock.close(linger=0)
@@ -0,0 +1,71 @@
+# IRCBot against a fake socket, no network.
+#
+# Usage (from repository root):
+#   python3 -m pytest tests/test_irc_bot.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("socks")
+
+from src.bots.irc_bot import IRCBot
+
+
+# Connected TLS socket stand-in, recv() returns the given chunks
+class FakeSocket:
+    def __init__(self, chunks : list, send_error : OSError = None):
+        self.chunks = list(chunks)
+        self.send_error = send_error
+        self.sent = []
+
+    def recv(self, size : int):
+        return self.chunks.pop(0) if len(self.chunks) > 0 else b""
+
+    def send(self, data : bytes):
+        if self.send_error is not None:
+            raise self.send_error
+        self.sent.append(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def connected_bot(sock : FakeSocket):
+    bot = IRCBot(server="irc.example.org", use_proxy=False, is_auto_connect=False)
+    bot.sock = sock
+    bot.is_connected = True
+    return bot
+
+
+def test_ping_gets_pong():
+    sock = FakeSocket([b"PING :abc\r\n"])
+    bot = connected_bot(sock)
+    bot.step()
+    assert sock.sent == [b"PONG :abc\r\n"]
+    assert bot.is_connected
+
+
+# Broken connection while answering, the manager reconnects
+def test_failed_send_marks_connection_lost():
+    sock = FakeSocket([b"PING :abc\r\nPING :def\r\n"], BrokenPipeError("broken pipe"))
+    bot = connected_bot(sock)
+    bot.step()
+    assert not bot.is_connected
+
+
+def test_failed_lag_ping_marks_connection_lost():
+    bot = connected_bot(FakeSocket([], TimeoutError("timed out")))
+    bot.send_lag_ping(0)
+    assert not bot.is_connected
+
+
+def test_manager_without_networks():
+    from src.bots.irc_manager import IRCReceiverManager
+    manager = IRCReceiverManager([])
+    manager.step()
+    assert manager.next_wake_up_time() is None
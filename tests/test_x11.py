@@ -0,0 +1,92 @@
+# X11WindowControl against a real X server: $DISPLAY, or an Xvfb that gets
+# started for the test. Skipped without python-xlib or an X server.
+#
+# Usage (from repository root):
+#   python3 -m pytest tests/test_x11.py
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("Xlib")
+from Xlib import X, display
+
+from src.x11 import X11WindowControl
+
+XVFB_DISPLAY = ":97"
+
+
+@pytest.fixture(scope="module")
+def x_display():
+    if os.environ.get("DISPLAY"):
+        yield os.environ["DISPLAY"]
+        return
+    if shutil.which("Xvfb") is None:
+        pytest.skip("no X server: neither $DISPLAY nor Xvfb")
+    xvfb = subprocess.Popen(["Xvfb", XVFB_DISPLAY, "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = XVFB_DISPLAY
+    try:
+        # Wait until it accepts connections
+        for _ in range(50):
+            try:
+                display.Display().close()
+                break
+            except Exception:
+                time.sleep(0.1)
+        else:
+            pytest.skip("Xvfb did not start")
+        yield XVFB_DISPLAY
+    finally:
+        del os.environ["DISPLAY"]
+        xvfb.terminate()
+        xvfb.wait()
+
+
+# Window of another client, like the pop-up window of pygame
+def create_window(disp):
+    window = disp.screen().root.create_window(0, 0, 100, 100, 0, X.CopyFromParent)
+    window.map()
+    disp.sync()
+    return window
+
+
+def test_window_hacks(x_display):
+    x11 = X11WindowControl()
+    other = display.Display()
+    window = create_window(other)
+    try:
+        active = x11.get_active_window()
+        assert active is None or isinstance(active, int)
+        assert not x11.is_fullscreen(window.id)
+        x11.set_state(window.id, ["_NET_WM_STATE_ABOVE", "_NET_WM_STATE_SKIP_TASKBAR"])
+        x11.focus(window.id)
+        x11.display.sync()
+    finally:
+        x11.close()
+        other.close()
+
+
+# Window closes while the hack runs, nothing is raised into the renderer
+def test_closed_window(x_display):
+    x11 = X11WindowControl()
+    other = display.Display()
+    window = create_window(other)
+    window_id = window.id
+    window.destroy()
+    other.sync()
+    try:
+        assert not x11.is_fullscreen(window_id)
+        x11.set_state(window_id, ["_NET_WM_STATE_BELOW"])
+        x11.focus(window_id)
+        # Async errors of the requests above come in here
+        x11.display.sync()
+    finally:
+        x11.close()
+        other.close()
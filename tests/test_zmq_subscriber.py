@@ -0,0 +1,116 @@
+# ChainSubscriber against a local stand-in for monerod --zmq-pub.
+#
+# Usage (from repository root):
+#   python3 -m pytest tests/test_zmq_subscriber.py
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+zmq = pytest.importorskip("zmq")
+
+from src.zmq_subscriber import ChainSubscriber, TOPIC_CHAIN_MAIN, TOPIC_TXPOOL_ADD
+
+DEBOUNCE_SECONDS = 0.2
+QUIET_SECONDS    = 0.5
+TIMEOUT_SECONDS  = 5
+
+
+@pytest.fixture
+def publisher():
+    pub = zmq.Context.instance().socket(zmq.PUB)
+    port = pub.bind_to_random_port("tcp://127.0.0.1")
+    yield pub, f"tcp://127.0.0.1:{port}"
+    pub.close(linger=0)
+
+
+def block(height : int):
+    return TOPIC_CHAIN_MAIN + b':{"first_height":' + str(height).encode() + b',"ids":[]}'
+
+
+def pool_tx():
+    return TOPIC_TXPOOL_ADD + b':[{"id":"' + b"ab" * 32 + b'"}]'
+
+
+# Publish until the subscription is up (ZMQ drops messages before that),
+# then forget the warm-up event.
+def connect(pub, sub):
+    deadline = time.monotonic() + TIMEOUT_SECONDS
+    while sub.num_blocks == 0:
+        assert time.monotonic() < deadline, "subscriber never connected"
+        pub.send(block(0))
+        time.sleep(0.05)
+        sub.step()
+    # Warm-up events still on the way
+    time.sleep(0.05)
+    sub.step()
+    sub.take(time.monotonic() + DEBOUNCE_SECONDS)
+
+
+def receive(sub, num_blocks : int, num_pool_txs : int):
+    deadline = time.monotonic() + TIMEOUT_SECONDS
+    while sub.num_blocks < num_blocks or sub.num_pool_txs < num_pool_txs:
+        assert time.monotonic() < deadline, "events missing"
+        time.sleep(0.01)
+        sub.step()
+
+
+def test_burst_is_one_scan(publisher):
+    pub, url = publisher
+    sub = ChainSubscriber(url, DEBOUNCE_SECONDS, QUIET_SECONDS)
+    try:
+        connect(pub, sub)
+        num_blocks = sub.num_blocks
+
+        # A block and its txs leaving the pool, plus new pool txs
+        pub.send(block(1))
+        for _ in range(10):
+            pub.send(pool_tx())
+        receive(sub, num_blocks + 1, 10)
+
+        # Still within the burst
+        assert sub.take(sub.first_event_time) == (False, False)
+        wake_up_time = sub.next_wake_up_time()
+        assert wake_up_time == sub.first_event_time + DEBOUNCE_SECONDS
+        # Exactly one result once it is over
+        assert sub.take(wake_up_time) == (True, True)
+        assert sub.take(wake_up_time + 1) == (False, False)
+        assert sub.next_wake_up_time() is None
+    finally:
+        sub.close()
+
+
+def test_unknown_topic_is_ignored(publisher):
+    pub, url = publisher
+    sub = ChainSubscriber(url, DEBOUNCE_SECONDS, QUIET_SECONDS)
+    try:
+        sub.handle(b"json-full-txpool_add:[]")
+        assert sub.next_wake_up_time() is None
+        assert not sub.is_alive()
+    finally:
+        sub.close()
+
+
+# Timer takes over once the feed goes quiet, and gives back on the next event
+def test_quiet_feed(publisher):
+    pub, url = publisher
+    sub = ChainSubscriber(url, DEBOUNCE_SECONDS, QUIET_SECONDS)
+    try:
+        assert not sub.is_alive()
+        connect(pub, sub)
+        assert sub.is_alive()
+
+        time.sleep(QUIET_SECONDS)
+        sub.step()
+        assert not sub.is_alive()
+
+        pub.send(pool_tx())
+        receive(sub, 0, 1)
+        assert sub.is_alive()
+        assert sub.take(time.monotonic() + DEBOUNCE_SECONDS) == (False, True)
+    finally:
+        sub.close()
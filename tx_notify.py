@@ -0,0 +1,31 @@
+#! /usr/bin/python3
+
+# Hands the tx_id of a new tx from monero-wallet-rpc to a running
+# xmr_tx_notify.py (IS_TX_NOTIFY = True) and returns right away.
+# monero-wallet-rpc runs it for every tx of its wallet:
+#   monero-wallet-rpc ... --tx-notify "/usr/bin/python3 /path/to/tx_notify.py %s"
+# With several WALLETS, add the label of the wallet, so only that one is asked:
+#   --tx-notify "/usr/bin/python3 /path/to/tx_notify.py %s <label>"
+
+import socket
+import sys
+
+from src.tx_notify_listener import TX_NOTIFY_SOCKET_PATH, TX_NOTIFY_IP, TX_NOTIFY_PORT, encode_push
+
+if __name__ == "__main__":
+    if not len(sys.argv) in (2, 3):
+        print(f"Usage: {sys.argv[0]} <tx_id> [<wallet label>]", file=sys.stderr)
+        sys.exit(2)
+    data = encode_push(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else None)
+
+    try:
+        if hasattr(socket, "AF_UNIX"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(data, TX_NOTIFY_SOCKET_PATH)
+        else:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.sendto(data, (TX_NOTIFY_IP, TX_NOTIFY_PORT))
+    except OSError as e:
+        # Not running, the tx still gets picked up by the next scan
+        print(f"Unable to push {sys.argv[1]}: {e}", file=sys.stderr)
+        sys.exit(1)
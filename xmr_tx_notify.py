@@ -19,6 +19,13 @@ MODE_NOTIFICATION = 0
 # (Advanced mode)
 MODE_DONATION     = 1
 
+# MessageReceivers (MODE_DONATION only)
+
+# IRC-Bot(s), waiting for private messages
+RECEIVER_IRC   = 0
+# Local socket, accepts NDJSON submissions, e.g. from a donation web page
+RECEIVER_LOCAL = 1
+
 # Currently supported operating systems
 SUPPORTED_OS = ["Linux", "Windows"]
 
@@ -34,19 +41,49 @@ PRE_MSG = "Main"
 # - Set to False to just use OS dependent notification system without sound and
 #   without the need for special dependencies.
 IS_FANCY_NOTIFY = True
+# - Set to True to serve pop-ups to a browser source (e.g. OBS) from a built-in
+#   overlay server, instead of showing a window. Takes precedence over
+#   IS_FANCY_NOTIFY.
+IS_OVERLAY_NOTIFY = False
+# - Set to True to serve Prometheus metrics (RPC latency, scan duration,
+#   pop-up latency, queue depth, IRC lag, ...) on a local /metrics endpoint.
+IS_METRICS = False
+# - Set to True if monero-wallet-rpc pushes new txs, it has to run with
+#   `--tx-notify "/usr/bin/python3 /path/to/tx_notify.py %s"`. New txs are
+#   fetched as soon as the wallet sees them, scanning is only a slow safety net
+#   (TX_NOTIFY_SCAN_INTERVAL_SECONDS).
+IS_TX_NOTIFY = False
+# - Set to True to scan as soon as monerod announces a new block or pool tx
+#   over ZMQ, it has to run with `--zmq-pub tcp://127.0.0.1:18083`. Needs
+#   pyzmq. If the feed goes quiet, the timer (SCAN_INTERVAL_SECONDS) takes over.
+IS_ZMQ = False
 # Set to one of the modes listet above
 MODE = MODE_DONATION
+# Set to one of the MessageReceivers listed above
+MESSAGE_RECEIVER = RECEIVER_IRC
 
 
 # <---------------------------------- Import ---------------------------------->
 
-import json         # Misc
+import os           # Misc
+import sys          # Exit code of --check
 import time         # Misc
-import threading    # Misc
-import requests     # Talk to monero-wallet-rpc
+import selectors    # Wait for IRC socket or next deadline, without spinning
 import platform     # run OS dependent code
 
 from src.misc import *
+from src.wallet_rpc import WalletRPC, WalletRPCError    # Talk to monero-wallet-rpc
+from src.wallet_poller import WalletPoller, WalletPollerPool # Scan all wallets at once
+from src.ledger import TxLedger                         # Tx state
+from src.journal import TxJournal                       # Tx state on disk
+from src.matcher import TxMessageMatcher                # Join txs with messages
+from src.tx_lookup import TxLookup                      # Fetch txs of early messages
+from src.scan_worker import ScanWorker                  # Wallet rpc off the main loop
+from src.render_worker import RenderWorker              # Pop-ups off the main loop
+from src.supervisor import Supervisor                   # Restart crashed workers
+from src.scheduler import PopUpScheduler, ORDER_AGE, ORDER_AMOUNT # Pop-up order and timing
+from src import metrics                                 # Counters and histograms
+from src.tracer import tracer, STAGE_SEEN, STAGE_POP_UP_START, STAGE_POP_UP_END # Tx lifecycle trace
 
 # Exit if OS is not supported
 OS = platform.system()
@@ -54,22 +91,42 @@ if not OS in SUPPORTED_OS:
     printe(PRE_MSG, f"OS `{OS}` not implemented.\n"\
             f"Currently there's only support for: {', '.join(str(os) for os in SUPPORTED_OS)}.")
 
+# Overlay replaces the pop-up window
+if IS_OVERLAY_NOTIFY:
+    IS_FANCY_NOTIFY = False
+    from src.overlay import OverlayServer
+
+if IS_METRICS:
+    from src.metrics_server import MetricsServer
+
+if IS_TX_NOTIFY:
+    from src.tx_notify_listener import TxNotifyListener
+
+if IS_ZMQ:
+    from src.zmq_subscriber import ChainSubscriber
+
 if OS == "Linux":
     # Window hacks (if IS_FANCY_NOTIFY) / Notification (else)
     import subprocess
+    if IS_FANCY_NOTIFY:
+        # Window hacks in-process, falls back to subprocess if not installed
+        try:
+            from src.x11 import X11WindowControl
+        except ImportError:
+            X11WindowControl = None
 
 if IS_FANCY_NOTIFY:
-    # Sets environment variables for pygame
-    import os
-    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-    # Popup display + text + sound
-    import pygame
-
     if "Windows" in OS:
         import win32gui
 
+    # Popup display + text + sound, imports pygame in the background
+    from src.popup import PopUpWindow
+
 if MODE == MODE_DONATION:
-    from src.bots.irc_bot import IRCBot as MessageReceiver
+    if MESSAGE_RECEIVER == RECEIVER_IRC:
+        from src.bots.irc_manager import IRCReceiverManager as MessageReceiver
+    elif MESSAGE_RECEIVER == RECEIVER_LOCAL:
+        from src.bots.local_receiver import LocalReceiver as MessageReceiver
 
 
 # <---------------------------- post-import Config ---------------------------->
@@ -80,8 +137,17 @@ RPC_PORT = 18099
 RPC_LOGIN_USERNAME = "notification_wallet"
 RPC_LOGIN_PASSWORD = "password"
 
-RPC_URL = f"http://{RPC_IP}:{RPC_PORT}/json_rpc"
-RPC_LOGIN_AUTH = requests.auth.HTTPDigestAuth(RPC_LOGIN_USERNAME, RPC_LOGIN_PASSWORD)
+# Wallets to watch (all at once), each one can overwrite the settings above and
+# pick an account and its subaddresses (empty: all of them), e.g.
+#   {"label": "mining", "port": 18098, "account_index": 1},
+#   {"label": "stream", "ip": "10.0.0.2", "username": "stream_wallet",
+#    "password": "password", "subaddr_indices": [0, 3]},
+# The label is kept with every tx, to know which wallet got it.
+WALLETS = [
+    {"label": "main", "ip": RPC_IP, "port": RPC_PORT,
+     "username": RPC_LOGIN_USERNAME, "password": RPC_LOGIN_PASSWORD,
+     "account_index": 0, "subaddr_indices": []},
+]
 
 # Display
 if IS_FANCY_NOTIFY:
@@ -98,137 +164,283 @@ if IS_FANCY_NOTIFY:
     WINDOW_WIDTH  =  600
     WINDOW_HEIGHT =  300
 
-    # Any character beyond will be cut off and not shown in pop-up
+    # Messages are wrapped at word boundaries to the window width, lines
+    # beyond are cut off and not shown in pop-up (the last one ends with "...").
     MAX_LEN_ROWS = 7
-    # Auto-wrap messages, characters per line.
-    MAX_LEN_LINE = 30
+
+# Overlay server
+if IS_OVERLAY_NOTIFY:
+    # Add http://<OVERLAY_IP>:<OVERLAY_PORT>/ as browser source in OBS
+    OVERLAY_IP   = "127.0.0.1"
+    OVERLAY_PORT = 18100
+    OVERLAY_WIDTH  = 600
+    OVERLAY_HEIGHT = 300
+
+# Metrics server
+if IS_METRICS:
+    # Scrape http://<METRICS_IP>:<METRICS_PORT>/metrics with Prometheus
+    METRICS_IP   = "127.0.0.1"
+    METRICS_PORT = 18102
+
+# Pushed txs
+if IS_TX_NOTIFY:
+    # Replaces SCAN_INTERVAL_SECONDS and MEMPOOL_SCAN_INTERVAL_SECONDS, only
+    # catches txs whose push got lost (e.g. while we were restarting).
+    TX_NOTIFY_SCAN_INTERVAL_SECONDS = 600
+
+# monerod ZMQ feed
+if IS_ZMQ:
+    # Same as monerod --zmq-pub
+    ZMQ_URL = "tcp://127.0.0.1:18083"
+    # Timer while the feed is alive, only a safety net then.
+    ZMQ_SCAN_INTERVAL_SECONDS = 300
 
 # Notification pop-up message
 if MODE == MODE_NOTIFICATION:
     DEFAULT_NOTIFICATION_NAME    = "Miner"
     NOTIFICATION_PREFIX          = "  mined"
     DEFAULT_NOTIFICATION_MESSAGE = ""
+    # Summary pop-up of coalesced txs, `{count}` is the number of txs
+    COALESCED_NOTIFICATION_NAME  = "{count} payouts"
 elif MODE == MODE_DONATION:
     DEFAULT_NOTIFICATION_NAME    = "anon"
     NOTIFICATION_PREFIX          = "donated"
     DEFAULT_NOTIFICATION_MESSAGE = "*had nothing to say*"
+    # Summary pop-up of coalesced txs, `{count}` is the number of txs
+    COALESCED_NOTIFICATION_NAME  = "{count} donations"
     # - Set to 0 to get instantly notified, without waiting for a message.
     # - Set to -1 to wait until message arrives, if you never receive a message
     #   for a given tx_id you'll never get notified.
     # - Otherwise set this to reasonable amount to wait for donator to write
     #   and MessageReceiver to pick up the message.
     WAIT_SECONDS_UNTIL_TX_SHOWN = 300
+    # - Set to True to ask the wallet right away for the tx of a message that
+    #   arrived before its tx was scanned (donor pasted the tx_id right after
+    #   sending). Lookups are rate limited and run in the background.
+    # - Set to False to wait for the next scan.
+    IS_MESSAGE_TX_LOOKUP = True
 
 # How long notification appears on screen.
 SHOW_NOTIFICATION_DURATION_SECONDS = 8
+
+# Bursts (e.g. a raid with dozens of donations in one block)
+# in sec, the display time gets shorter as the queue grows, so every queued
+# pop-up is shown within this time ...
+POP_UP_LATENCY_BUDGET_SECONDS = 60
+# ... but never shorter than this.
+MIN_SHOW_NOTIFICATION_DURATION_SECONDS = 3
+# With at least this many queued pop-ups, all txs below COALESCE_MAX_AMOUNT
+# are shown as one summary pop-up. Set to None to never coalesce.
+COALESCE_MIN_QUEUE_LEN = 5
+COALESCE_MAX_AMOUNT = xmr2amt(0.01)
+# ORDER_AGE: oldest first, ORDER_AMOUNT: biggest amount first
+POP_UP_ORDER = ORDER_AGE
 # How often the monero-wallet-rpc gets called to look for new incoming tx.
 # Average block time is 120 seconds.
 SCAN_INTERVAL_SECONDS = 40
+# Number of blocks below the last scanned height that get scanned again, when
+# a new block arrives. Catches txs that moved to another height in a reorg.
+SCAN_REORG_DEPTH = 10
+# in sec, how often to check if a pop-up that overran its duration is done.
+POP_UP_POLL_SECONDS = 0.1
+# in sec, how long `--check` waits for the MessageReceiver to be ready.
+CHECK_RECEIVER_TIMEOUT_SECONDS = 60
+
+# Mempool (0-conf) detection
+# - Set to True to get notified as soon as a tx shows up in the mempool,
+#   instead of waiting until it is mined. The same tx is not shown again, when
+#   it confirms.
+# - Set to False to only get notified for mined txs.
+IS_MEMPOOL_DETECTION = False
+# How often the mempool gets scanned, if IS_MEMPOOL_DETECTION.
+MEMPOOL_SCAN_INTERVAL_SECONDS = 10
+# Smaller 0-conf txs are only shown once they are mined (in XMR).
+MEMPOOL_MIN_AMOUNT = xmr2amt(0.0)
+
+# Journal file that keeps the scan height, handled and pending txs over restarts.
+# - Set to None to start from the current height with an empty state every time.
+JOURNAL_PATH = "tx_journal.log"
+
+# Trace file with every step of every tx (seen, message, matched/timed out,
+# queued, pop-up), to find out why a pop-up was late or missing.
+# Summary: `python3 -m src.tracer <TRACE_PATH>`, single tx: add `--tx <tx_id>`
+# - Set to None to disable.
+# - Otherwise e.g. "tx_trace.jsonl", rotated every 10 MB.
+TRACE_PATH = None
 
 
 # <----------------------------------- Init ----------------------------------->
 
-if IS_FANCY_NOTIFY:
-    pygame.init()
-    # Set window position, pygame does not come with this functionality.
-    os.environ['SDL_VIDEO_WINDOW_POS'] = f"{WINDOW_POS_X},{WINDOW_POS_Y}"
-
-    # Load assets
-    # can be found and easily changed in `assets/`.
-
-    # Works with 300x300 image with transparent background.
-    # May need some adjustments for different sizes.
-    if OS == "Linux":
-        DONATION_BG_PNG = pygame.image.load("assets/donation_bg.png")
-        DONATION_SOUND  = pygame.mixer.Sound("assets/donation_sound.wav")
-        MONERO_ICON_PNG = pygame.image.load("assets/monero_icon.png")
-    elif OS == "Windows":
-        DONATION_BG_PNG = pygame.image.load(r"assets\donation_bg.png")
-        DONATION_SOUND  = pygame.mixer.Sound(r"assets\donation_sound.wav")
-        MONERO_ICON_PNG = pygame.image.load(r"assets\monero_icon.png")
-
-    # Fonts
-    FONT_SMALL      = pygame.font.Font(None, 24)
-    FONT_MED        = pygame.font.Font(None, 30)
-    FONT_MED_BOLD   = pygame.font.Font(None, 32)
-    FONT_BIG_BOLD   = pygame.font.Font(None, 48)
+# Load assets
+# can be found and easily changed in `assets/`.
+ASSETS_DIR      = "assets"
+DONATION_BG_PNG = os.path.join(ASSETS_DIR, "donation_bg.png")
+DONATION_SOUND  = os.path.join(ASSETS_DIR, "donation_sound.wav")
+MONERO_ICON_PNG = os.path.join(ASSETS_DIR, "monero_icon.png")
 
-    FONT_MED_BOLD.set_bold(True)
-    FONT_BIG_BOLD.set_bold(True)
+if IS_FANCY_NOTIFY:
+    # One window for all pop-ups, hidden in between.
+    # pygame, assets and fonts are loaded by its render thread, when it is
+    # started in main(), so they don't slow down startup.
+    pop_up_window = PopUpWindow(WINDOW_POS_X, WINDOW_POS_Y,
+                                WINDOW_WIDTH, WINDOW_HEIGHT,
+                                "Monero Donation",
+                                NOTIFICATION_PREFIX,
+                                DONATION_BG_PNG,
+                                MONERO_ICON_PNG,
+                                DONATION_SOUND,
+                                MAX_LEN_ROWS)
 
 
 # <---------------------------------- Global ---------------------------------->
 
-last_scan_time    = 0
-pop_up_start_time = 0
-rpc_call_id       = 0
+# Pooled keep-alive connection and scan cursor per monero-wallet-rpc
+# Returns (block scan interval, mempool scan interval or None).
+# Pushed txs and a live ZMQ feed leave the timer as a slow safety net.
+def scan_intervals(is_zmq_alive : bool = False):
+    if IS_TX_NOTIFY:
+        intervals = (TX_NOTIFY_SCAN_INTERVAL_SECONDS, TX_NOTIFY_SCAN_INTERVAL_SECONDS)
+    else:
+        intervals = (SCAN_INTERVAL_SECONDS, MEMPOOL_SCAN_INTERVAL_SECONDS)
+    if is_zmq_alive:
+        intervals = tuple(max(interval, ZMQ_SCAN_INTERVAL_SECONDS) for interval in intervals)
+    return intervals[0], intervals[1] if IS_MEMPOOL_DETECTION else None
+
+wallet_pool = WalletPollerPool([
+    WalletPoller(wallet["label"],
+                 WalletRPC(f"http://{wallet.get('ip', RPC_IP)}:{wallet.get('port', RPC_PORT)}/json_rpc",
+                           wallet.get("username", RPC_LOGIN_USERNAME),
+                           wallet.get("password", RPC_LOGIN_PASSWORD)),
+                 wallet.get("account_index", 0),
+                 wallet.get("subaddr_indices"),
+                 *scan_intervals(),
+                 MEMPOOL_MIN_AMOUNT,
+                 SCAN_REORG_DEPTH)
+    for wallet in WALLETS])
+
+if IS_OVERLAY_NOTIFY:
+    overlay_server = OverlayServer(OVERLAY_IP, OVERLAY_PORT, ASSETS_DIR,
+                                   OVERLAY_WIDTH, OVERLAY_HEIGHT)
+
+if IS_METRICS:
+    metrics_server = MetricsServer(METRICS_IP, METRICS_PORT, metrics.registry)
+
+# X11 connection for window hacks, opened by the render worker
+x11 = None
+
+# Workers, created in main()
+scan_worker = None
+renderer = None
+supervisor = None
+
+# Joins txs with MessageReceiver messages (MODE_DONATION), created in main()
+matcher = None
+
+# Receives tx_ids pushed by monero-wallet-rpc (IS_TX_NOTIFY), created in main()
+tx_notify_listener = None
+
+# New blocks and pool txs announced by monerod (IS_ZMQ), created in main()
+chain_subscriber = None
+# Last known state of the feed, the scan timer follows it
+is_zmq_alive = False
+
+# Picks the next pop-up and its display time from the queue
+scheduler = PopUpScheduler(SHOW_NOTIFICATION_DURATION_SECONDS,
+                           MIN_SHOW_NOTIFICATION_DURATION_SECONDS,
+                           POP_UP_LATENCY_BUDGET_SECONDS,
+                           COALESCE_MIN_QUEUE_LEN,
+                           COALESCE_MAX_AMOUNT,
+                           COALESCED_NOTIFICATION_NAME,
+                           POP_UP_ORDER)
+
+# time.monotonic() timestamp, when the current pop-up is over
+pop_up_end_time = float("-inf")
 
 
 # <-------------------------------- Functions --------------------------------->
 
-# monero-wallet-rpc
-def rpc_call(method : str, params : dict = {}):
-    global rpc_call_id
-
-    try:
-        res = requests.post(RPC_URL,
-                            headers = {"Content-Type":"application/json"},
-                            auth    = RPC_LOGIN_AUTH,
-                            data    = json.dumps({"jsonrpc":"2.0",
-                                                  "id":str(rpc_call_id),
-                                                  "method":method,
-                                                  "params":params}))
-    except requests.exceptions.ConnectionError:
-        printe(PRE_MSG, f"Unable to connect to wallet rpc: {RPC_URL}\n"\
-                        f"Make sure monero-wallet-rpc is running and the config in {__file__} is set accordingly.")
-
-    if res.status_code != 200:
-        printe(PRE_MSG, f"Response status code: {res.status_code}\n"\
-                        f"Response:\n{res.text}")
-
-    if "error" in res.json():
-        printe(PRE_MSG, f"\nMethod: {method}\n"\
-                        f"Params: {params}\n"\
-                        f"RPC-response: {res.json()}")
-
-    rpc_call_id += 1
-    return res.json()
-
-
-
 # Notification pop-up
 def notification_pop_up(user_name : str,
                         amount : float,
-                        message : str):
+                        message : str,
+                        duration : float):
 
-    if IS_FANCY_NOTIFY:
+    if IS_OVERLAY_NOTIFY:
+        notification_overlay_pop_up(user_name, amount, message, duration)
+    elif IS_FANCY_NOTIFY:
         if OS == "Linux":
-            notification_fancy_pop_up_linux(user_name, amount, message)
+            notification_fancy_pop_up_linux(user_name, amount, message, duration)
         elif OS == "Windows":
-            notification_fancy_pop_up_windows(user_name, amount, message)
+            notification_fancy_pop_up_windows(user_name, amount, message, duration)
     else:
-        notification_non_fancy_pop_up(user_name, amount, message)
+        notification_non_fancy_pop_up(user_name, amount, message, duration)
 
 
 # Uses OS dependent notification method
 def notification_non_fancy_pop_up(user_name : str,
                                   amount : float,
-                                  message : str):
+                                  message : str,
+                                  duration : float):
 
     if OS == "Linux":
         subprocess.Popen(["notify-send",
+                      "-t", str(int(duration*1000)),
                       user_name,
                       f"{NOTIFICATION_PREFIX} {amt2str(amount)} {message}"])
     elif OS == "Windows":
         printw(PRE_MSG, "TODO : implement notification_non_fancy_pop_up() for Windows.")
 
 
-# Uses pygame window + background image + sound
+# Pushes pop-up to every connected browser source of the overlay server
+def notification_overlay_pop_up(user_name : str,
+                                amount : float,
+                                message : str,
+                                duration : float):
+
+    overlay_server.push(user_name,
+                        NOTIFICATION_PREFIX,
+                        amount,
+                        message,
+                        duration)
+
+
+# Uses persistent pygame window + background image + sound
 def notification_fancy_pop_up_linux(user_name : str,
                                     amount : float,
-                                    message : str):
+                                    message : str,
+                                    duration : float):
+
+    if x11 is None:
+        notification_fancy_pop_up_linux_subprocess(user_name, amount, message, duration)
+        return
 
     # Get currently used window id, to give back focus after pop-up is spawned.
+    previously_used_window_id = x11.get_active_window()
+    # Check if window is fullscreen
+    is_prev_used_window_fullscreen = previously_used_window_id is not None and\
+            x11.is_fullscreen(previously_used_window_id)
+
+    # Hack to keep the window always on top, but don't focus.
+    # Window manager drops these hints when the window gets hidden, so they
+    # are set again every time it is shown.
+    def on_shown(window_id : int):
+        if is_prev_used_window_fullscreen:
+            x11.set_state(previously_used_window_id, ["_NET_WM_STATE_BELOW"])
+        x11.set_state(window_id, ["_NET_WM_STATE_ABOVE", "_NET_WM_STATE_SKIP_TASKBAR"])
+        if previously_used_window_id is not None:
+            x11.focus(previously_used_window_id)
+
+    # Sound + pop-up
+    pop_up_window.show(user_name, amount, message, duration, on_shown)
+
+
+# Same as notification_fancy_pop_up_linux(), but uses xdotool, xprop and wmctrl,
+# if python-xlib is not installed.
+def notification_fancy_pop_up_linux_subprocess(user_name : str,
+                                               amount : float,
+                                               message : str,
+                                               duration : float):
+    # Get currently used window id, to give back focus after pop-up is spawned.
     subp_out = subprocess.check_output(["xdotool", "getactivewindow"])
     previously_used_window_id = subp_out.decode("UTF-8").strip("\n")
 
@@ -239,261 +451,426 @@ def notification_fancy_pop_up_linux(user_name : str,
                                         "_NET_WM_STATE"])
     is_prev_used_window_fullscreen = "_NET_WM_STATE_FULLSCREEN" in subp_out.decode("UTF-8").strip("\n")
 
-    # Sound
-    pygame.mixer.Sound.play(DONATION_SOUND)
-
-    # New window
-    pygame.display.init()
-    pygame.display.set_caption("Monero Donation")
-    display = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT),
-                                      flags=pygame.NOFRAME)
-
     # Hack to keep the window always on top, but don't focus.
-    window_id = pygame.display.get_wm_info()["window"]
-    # This is not optimal, but for now I have not found a better alternative
-    # to put pop-up infront of a fullscreen window.
-    # If you open/focus another window in the wrong time,
-    # the notification does not get diplayed in front.
-    if is_prev_used_window_fullscreen:
-        subprocess.Popen(["wmctrl", "-i", "-r", str(previously_used_window_id), "-b", "add,below"])
-    subprocess.Popen(["wmctrl", "-i", "-r", str(window_id), "-b", "add,above,skip_taskbar"])
-    subprocess.Popen(["xdotool", "windowfocus", str(previously_used_window_id)])
-
-    # Background
-    display.fill((0,0,0), (0,0, WINDOW_WIDTH, WINDOW_HEIGHT))
-    display.blit(DONATION_BG_PNG, DONATION_BG_PNG.get_rect())
-
-    # Text
-    padding_left = 22
-    text = FONT_BIG_BOLD.render(user_name, True, (155, 255, 155))
-    display.blit(text, (padding_left, 20))
-    text = FONT_MED_BOLD.render(NOTIFICATION_PREFIX, True, (255, 255, 255))
-    display.blit(text, (padding_left, 64))
-    text = FONT_BIG_BOLD.render(f"{amt2str(amount)} XMR", True, (255, 102, 0))
-    display.blit(text, (padding_left+92, 56))
-
-    row = 0
-    sub_str = ""
-    for i in range(len(message)):
-        sub_str += message[i]
-        if (i != 0) and (i % MAX_LEN_LINE == 0) or (i == len(message)-1):
-            text = FONT_MED.render(sub_str, True, (255, 255, 255))
-            display.blit(text, (padding_left, 98+row*28))
-            row += 1
-            sub_str = ""
-            if row == MAX_LEN_ROWS:
-                break
-
-    pygame.display.set_icon(MONERO_ICON_PNG)
-    pygame.display.update()
-    pygame.event.set_grab(False)
-
-    # QUIT
-    time.sleep(SHOW_NOTIFICATION_DURATION_SECONDS)
-    pygame.display.quit()
-
-
-# Uses pygame window + background image + sound
+    # Window manager drops these hints when the window gets hidden, so they
+    # are set again every time it is shown.
+    def on_shown(window_id : int):
+        # This is not optimal, but for now I have not found a better alternative
+        # to put pop-up infront of a fullscreen window.
+        # If you open/focus another window in the wrong time,
+        # the notification does not get diplayed in front.
+        if is_prev_used_window_fullscreen:
+            subprocess.Popen(["wmctrl", "-i", "-r", str(previously_used_window_id), "-b", "add,below"])
+        subprocess.Popen(["wmctrl", "-i", "-r", str(window_id), "-b", "add,above,skip_taskbar"])
+        subprocess.Popen(["xdotool", "windowfocus", str(previously_used_window_id)])
+
+    # Sound + pop-up
+    pop_up_window.show(user_name, amount, message, duration, on_shown)
+
+
+# Uses persistent pygame window + background image + sound
 def notification_fancy_pop_up_windows(user_name : str,
                                       amount : float,
-                                      message : str):
-    # Sound
-    pygame.mixer.Sound.play(DONATION_SOUND)
-
-    # New window
-    pygame.display.init()
-    pygame.display.set_caption("Monero Donation")
-    display = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT),
-                                      flags=pygame.NOFRAME)
+                                      message : str,
+                                      duration : float):
 
     # Put pop-up in foreground
-    window_id = pygame.display.get_wm_info()["window"]
-    win32gui.SetWindowPos(window_id, -1, WINDOW_POS_X, WINDOW_POS_Y, 0, 0, 1)
-
-    # Background
-    display.fill((0,0,0), (0,0, WINDOW_WIDTH, WINDOW_HEIGHT))
-    display.blit(DONATION_BG_PNG, DONATION_BG_PNG.get_rect())
-
-    # Text
-    padding_left = 22
-    text = FONT_BIG_BOLD.render(user_name, True, (155, 255, 155))
-    display.blit(text, (padding_left, 20))
-    text = FONT_MED_BOLD.render(NOTIFICATION_PREFIX, True, (255, 255, 255))
-    display.blit(text, (padding_left, 64))
-    text = FONT_BIG_BOLD.render(f"{amt2str(amount)} XMR", True, (255, 102, 0))
-    display.blit(text, (padding_left+92, 56))
-    row = 0
-    sub_str = ""
-    for i in range(len(message)):
-        sub_str += message[i]
-        if (i != 0) and (i % MAX_LEN_LINE == 0) or (i == len(message)-1):
-            text = FONT_MED.render(sub_str, True, (255, 255, 255))
-            display.blit(text, (padding_left, 98+row*28))
-            row += 1
-            sub_str = ""
-            if row == MAX_LEN_ROWS:
-                break
-
-    pygame.display.set_icon(MONERO_ICON_PNG)
-    pygame.display.update()
-    pygame.event.set_grab(False)
-
-    # QUIT
-    time.sleep(SHOW_NOTIFICATION_DURATION_SECONDS)
-    pygame.display.quit()
-
-
-
-def update_incoming_tx_cache(incoming_tx_cache : dict,
-                             already_handled_tx_ids : list,
-                             block_height : int):
-
-    global last_scan_time
-
-    # Remove already handled txs
-    for tx_id in already_handled_tx_ids:
-        if tx_id in incoming_tx_cache:
-            del incoming_tx_cache[tx_id]
-
-    # Don't spam scan
-    if time.mktime(time.gmtime()) - last_scan_time < SCAN_INTERVAL_SECONDS:
-        return block_height
-
-    # RPC call `get_transfers`
-    args = {"in": True,
-            "filter_by_height": True,
-            "min_height": block_height}
-    res = rpc_call("get_transfers", args)
-    # DEBUG
-    printd(PRE_MSG, f"get_transfers response:\n{res}")
-
-    # For spam scan protection
-    last_scan_time = time.mktime(time.gmtime())
-
-    # No new block since last scan
-    if res["result"] == {}:
-        return block_height
-
-    printd(PRE_MSG, "get_transfers response:")
-    printd(PRE_MSG, res["result"])
-
-    # Add info from freshly scanned tx to incoming_tx_cache, if tx_id is not already handled
-    for inp in res["result"]["in"]:
-        if inp["txid"] in incoming_tx_cache or\
-                inp["txid"] in already_handled_tx_ids:
-            printw(PRE_MSG, f"Skip already handled tx_id: {inp['txid']}")
-            continue
-
-        incoming_tx_cache[inp["txid"]] = {"timestamp" : time.mktime(time.gmtime()),
-                                          "amount" : sum(inp['amounts'])}
-
-        # Update next scan height
-        block_height = block_height if not inp["height"] > block_height else inp["height"]
-
-    return block_height
-
-
-def update_confirmed_messages(incoming_tx_cache : dict,
-                              potential_msg_from_receiver : dict,
-                              message_queue : list,
-                              already_handled_tx_ids : list):
-
-    for tx_id in incoming_tx_cache:
-        if tx_id in potential_msg_from_receiver and not tx_id in already_handled_tx_ids:
-            user_name = list(potential_msg_from_receiver[tx_id].keys())[0]
-            data = {"tx_id"     : tx_id,
-                    "user_name" : user_name,
-                    "amount"    : incoming_tx_cache[tx_id]["amount"],
-                    "message"   : potential_msg_from_receiver[tx_id][user_name]}
-            printd(PRE_MSG, f"data: {data}")
-            message_queue.append(data)
-
-
-def update_timed_out_messages(incoming_tx_cache : dict,
-                              message_queue : list,
-                              already_handled_tx_ids : list):
-
-    # Skip function if timed out messages are disabled
-    if MODE == MODE_DONATION and WAIT_SECONDS_UNTIL_TX_SHOWN == -1:
+    def on_shown(window_id : int):
+        win32gui.SetWindowPos(window_id, -1, WINDOW_POS_X, WINDOW_POS_Y, 0, 0, 1)
+
+    # Sound + pop-up
+    pop_up_window.show(user_name, amount, message, duration, on_shown)
+
+
+
+# Add a freshly scanned tx to the ledger, if tx_id is not already known.
+# A tx that was already picked up in the mempool is skipped, when it later confirms.
+def add_incoming_tx(ledger : TxLedger, transfer : dict, wallet : str):
+    if not ledger.add_tx(TxLedger.to_bin(transfer["txid"]), sum(transfer["amounts"]), wallet = wallet):
+        printd(PRE_MSG, f"Skip already known tx_id: {transfer['txid']}")
         return
+    printd(PRE_MSG, f"New tx {transfer['txid']} in wallet {wallet}")
+    metrics.txs_total.inc(labels=(wallet,))
+    tracer.event(transfer["txid"], STAGE_SEEN, wallet=wallet, source=transfer.get("type"),
+                 height=transfer.get("height"), amount=sum(transfer["amounts"]))
+    # Message may have arrived before the tx
+    if matcher is not None:
+        matcher.on_tx(transfer["txid"])
+
 
-    for tx_id in incoming_tx_cache:
-        if tx_id in already_handled_tx_ids:
-            printw(PRE_MSG, "tx_id in already_handled_tx_ids, this should not happen.")
-            continue
+# Render worker, see RenderWorker. Shows one pop-up after the other.
+# With IS_FANCY_NOTIFY it runs in its own process: loads pygame + assets,
+# creates the hidden pop-up window and opens its own X11 connection.
+def run_renderer(requests, events):
+    global x11
 
-        # Use DEFAULT_ values for timed out messages
-        if (MODE == MODE_DONATION and time.mktime(time.gmtime()) - incoming_tx_cache[tx_id]["timestamp"] > WAIT_SECONDS_UNTIL_TX_SHOWN)\
-                or\
-                MODE == MODE_NOTIFICATION:
+    if IS_FANCY_NOTIFY:
+        pop_up_window.start()
+        # One X11 connection for all window hacks
+        if OS == "Linux":
+            try:
+                x11 = X11WindowControl() if X11WindowControl is not None else None
+            except Exception as e:
+                printw(PRE_MSG, f"Unable to connect to X11: {e}")
+            if x11 is None:
+                printw(PRE_MSG, "Using xdotool/xprop/wmctrl for window hacks.")
+
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        pop_up_id, user_name, amount, message, duration = request
+        try:
+            notification_pop_up(user_name, amount, message, duration)
+        except Exception as e:
+            printw(PRE_MSG, f"Pop-up failed: {e}")
+        events.put(pop_up_id)
+
+
+# Add the txs the scan worker found, from scans and pushed tx_ids.
+# Returns { wallet label : (height, floor) } of the wallets with a new block.
+def update_incoming_tx_cache(ledger : TxLedger):
+    new_heights = {}
+    for poller, transfers, is_new_block, height_floor in scan_worker.take():
+        for transfer in transfers:
+            add_incoming_tx(ledger, transfer, poller.label)
+        if is_new_block:
+            new_heights[poller.label] = height_floor
+    return new_heights
+
+
+# Fetch the txs pushed by monero-wallet-rpc `--tx-notify`, instead of waiting
+# for the next scan. Unknown tx_ids only, a 0-conf tx is pushed again when it
+# gets mined.
+def update_pushed_txs(ledger : TxLedger):
+    tx_ids = {tx_id : label for tx_id, label in tx_notify_listener.take().items()
+              if not ledger.is_known(TxLedger.to_bin(tx_id))}
+    if len(tx_ids) == 0:
+        return
+    metrics.tx_notify_fetches_total.inc(len(tx_ids))
+    labels = {poller.label for poller in wallet_pool.pollers}
+    for tx_id, label in tx_ids.items():
+        if label is not None and not label in labels:
+            printw(PRE_MSG, f"Pushed tx_id {tx_id} for unknown wallet: {label}")
+    # Found txs come back with the scan results
+    scan_worker.fetch(tx_ids)
+
+
+# Scan right away, once a burst of monerod ZMQ events is over. The timer only
+# runs as a safety net while the feed is alive.
+def update_chain_events():
+    global is_zmq_alive
+
+    now = time.monotonic()
+    is_new_block, is_new_pool_tx = chain_subscriber.take(now)
+    if is_new_block or is_new_pool_tx:
+        printd(PRE_MSG, f"ZMQ: new block: {is_new_block}, new pool tx: {is_new_pool_tx}")
+        scan_worker.request_scan(is_new_block, is_new_pool_tx)
+
+    is_alive = chain_subscriber.is_alive(now)
+    if is_alive != is_zmq_alive:
+        is_zmq_alive = is_alive
+        scan_interval, pool_scan_interval = scan_intervals(is_alive)
+        if not is_alive:
+            printw(PRE_MSG, f"ZMQ feed is quiet, scanning every {scan_interval} s.")
+        scan_worker.set_intervals(scan_interval, pool_scan_interval)
+
+
+# Add the txs that TxLookup found for messages that arrived first, the
+# messages get matched right away.
+def update_looked_up_txs(ledger : TxLedger, tx_lookup : TxLookup):
+    for poller, transfers in tx_lookup.take():
+        for transfer in transfers:
+            add_incoming_tx(ledger, transfer, poller.label)
+
+
+# Timed-out txs get a default user name and message.
+def update_timed_out_messages(ledger : TxLedger):
+    ledger.enqueue_timed_out(time.monotonic(),
+                             DEFAULT_NOTIFICATION_NAME,
+                             DEFAULT_NOTIFICATION_MESSAGE)
+
+
+# Returns the monotonic time when the main loop has work to do next:
+# next worker check, earliest tx timeout or pop-up expiry.
+# Scan results wake the main loop up on their own.
+def next_wake_up_time(ledger : TxLedger):
+    wake_up_time = supervisor.next_wake_up_time()
+
+    # Earliest tx timeout
+    deadline = ledger.next_deadline()
+    if deadline is not None:
+        wake_up_time = min(wake_up_time, deadline)
+
+    # Pop-up expiry, only matters if there is something to show next
+    if len(ledger.queue) > 0:
+        end_time = pop_up_end_time
+        if renderer.is_busy():
+            # Pop-up takes longer than expected, check again soon
+            end_time = max(end_time, time.monotonic() + POP_UP_POLL_SECONDS)
+        wake_up_time = min(wake_up_time, end_time)
+
+    return wake_up_time
+
+
+# Sleep until a registered socket is readable or timeout, handle readable sockets.
+def wait_for_events(selector : selectors.BaseSelector, timeout : float):
+    # select() on Windows fails without any socket
+    if len(selector.get_map()) == 0:
+        time.sleep(timeout)
+        return
+    for key, _ in selector.select(timeout):
+        key.data.step()
+
+
+# <---------------------------------- Check ---------------------------------->
+
+# Returns list of config problems.
+def check_config():
+    problems = []
+    if MODE not in (MODE_NOTIFICATION, MODE_DONATION):
+        problems.append(f"MODE must be MODE_NOTIFICATION or MODE_DONATION, got {MODE}.")
+    if MODE == MODE_DONATION and WAIT_SECONDS_UNTIL_TX_SHOWN < -1:
+        problems.append(f"WAIT_SECONDS_UNTIL_TX_SHOWN must be >= -1, got {WAIT_SECONDS_UNTIL_TX_SHOWN}.")
+    for name in ["SCAN_INTERVAL_SECONDS", "MEMPOOL_SCAN_INTERVAL_SECONDS", "SHOW_NOTIFICATION_DURATION_SECONDS",
+                 "MIN_SHOW_NOTIFICATION_DURATION_SECONDS", "POP_UP_LATENCY_BUDGET_SECONDS"]:
+        if globals()[name] <= 0:
+            problems.append(f"{name} must be > 0, got {globals()[name]}.")
+    if MIN_SHOW_NOTIFICATION_DURATION_SECONDS > SHOW_NOTIFICATION_DURATION_SECONDS:
+        problems.append("MIN_SHOW_NOTIFICATION_DURATION_SECONDS must be <= SHOW_NOTIFICATION_DURATION_SECONDS.")
+    if SCAN_REORG_DEPTH < 1:
+        problems.append(f"SCAN_REORG_DEPTH must be >= 1, got {SCAN_REORG_DEPTH}.")
+    if MODE == MODE_DONATION and MESSAGE_RECEIVER == RECEIVER_IRC:
+        from src.bots.irc_bot import IRC_NETWORKS
+        if len(IRC_NETWORKS) == 0:
+            problems.append("IRC_NETWORKS must have at least one network.")
+    if IS_FANCY_NOTIFY or IS_OVERLAY_NOTIFY:
+        for path in [DONATION_BG_PNG, DONATION_SOUND, MONERO_ICON_PNG]:
+            if not os.path.exists(path):
+                problems.append(f"Asset not found: {path}")
+    return problems
+
+
+# Validate config, monero-wallet-rpc and MessageReceiver without showing
+# anything, returns exit code.
+def check():
+    is_ok = True
+
+    problems = check_config()
+    for problem in problems:
+        printw(PRE_MSG, f"Config: {problem}")
+    if len(problems) == 0:
+        printm(PRE_MSG, "Config: OK")
+    is_ok &= len(problems) == 0
+
+    for poller in wallet_pool.pollers:
+        try:
+            height = int(poller.rpc.call("get_height")["height"])
+            printm(PRE_MSG, f"RPC [{poller.label}]: OK, {poller.rpc.url} at height {height}")
+        except WalletRPCError as e:
+            printw(PRE_MSG, f"RPC [{poller.label}]: {e}")
+            is_ok = False
+
+    if MODE == MODE_DONATION:
+        try:
+            msg_recvr = MessageReceiver()
+            selector = selectors.DefaultSelector()
+            msg_recvr.register(selector)
+            # Wait until e.g. the IRC servers welcomed us and we joined the
+            # channels, a refused connect fails right away
+            end_time = time.monotonic() + CHECK_RECEIVER_TIMEOUT_SECONDS
+            while not msg_recvr.is_ready and not msg_recvr.is_failed and time.monotonic() < end_time:
+                wait_for_events(selector, POP_UP_POLL_SECONDS)
+                msg_recvr.step()
+            if msg_recvr.is_ready:
+                printm(PRE_MSG, "MessageReceiver: OK")
+            elif msg_recvr.is_failed:
+                printw(PRE_MSG, "MessageReceiver: connect failed.")
+                is_ok = False
+            else:
+                printw(PRE_MSG, "MessageReceiver: not ready in time.")
+                is_ok = False
+        except OSError as e:
+            printw(PRE_MSG, f"MessageReceiver: {e}")
+            is_ok = False
 
-            data = {"tx_id"     : tx_id,
-                    "user_name" : DEFAULT_NOTIFICATION_NAME,
-                    "amount"    : incoming_tx_cache[tx_id]["amount"],
-                    "message"   : DEFAULT_NOTIFICATION_MESSAGE}
-            if not data in message_queue:
-                message_queue.append(data)
+    return 0 if is_ok else 1
 
 
 # <----------------------------------- Main ----------------------------------->
 
 def main():
-    global pop_up_start_time
-
-    # {tx_id : {"timestamp" : timestamp, "amount" : amount} }
-    incoming_tx_cache = {}
-    # [{"tx_id" : tx_id, "name" : user_name, "message" : message, "amount" : amount}, ... ]
-    message_queue = []
-    already_handled_tx_ids = []
-
-    pop_up_thread = None
+    global pop_up_end_time
+    global matcher
+    global tx_notify_listener
+    global chain_subscriber
+    global scan_worker
+    global renderer
+    global supervisor
+
+    if TRACE_PATH is not None:
+        tracer.start(TRACE_PATH)
+
+    # Pending txs, pop-up queue and handled tx_ids
+    journal = TxJournal(JOURNAL_PATH) if JOURNAL_PATH is not None else None
+    if MODE == MODE_NOTIFICATION:
+        # Notify right away
+        ledger = TxLedger(wait_seconds = 0, journal = journal)
+    elif WAIT_SECONDS_UNTIL_TX_SHOWN == -1:
+        # Never time out, wait for message
+        ledger = TxLedger(wait_seconds = None, journal = journal)
+    else:
+        ledger = TxLedger(wait_seconds = WAIT_SECONDS_UNTIL_TX_SHOWN, journal = journal)
+    journal_state = journal.load() if journal is not None else None
+    if journal_state is not None:
+        ledger.restore(journal_state)
+
+    tx_lookup = None
+    # Wallet scans, pop-ups and lookups run apart from the main loop, which
+    # only handles the MessageReceivers, the ledger and the journal.
+    # The supervisor restarts workers that crash or get stuck.
+    supervisor = Supervisor()
+    scan_worker = ScanWorker(wallet_pool)
+    # Pop-up window in its own process, so pygame doesn't share the GIL with
+    # the MessageReceivers. The other backends only hand the pop-up over.
+    renderer = RenderWorker("renderer", run_renderer, is_process = IS_FANCY_NOTIFY)
+    # Load pygame + assets and create hidden pop-up window in the background
+    supervisor.add(renderer)
+    if IS_OVERLAY_NOTIFY:
+        overlay_server.start()
+    if IS_METRICS:
+        metrics_server.start()
+
+    # Initial block height, only txs in later blocks get notified.
+    # Checked first, so a misconfigured RPC fails fast.
+    for poller in wallet_pool.pollers:
+        try:
+            poller.init_height()
+        except WalletRPCError as e:
+            printe(PRE_MSG, f"[{poller.label}] {e}")
 
     # Currently selected mode
     if MODE == MODE_NOTIFICATION:
         printm(PRE_MSG, "Running in NOTIFICATION mode.")
     elif MODE == MODE_DONATION:
         printm(PRE_MSG, "Running in DONATION mode.")
-        # Init MessageReceiver
+        # Init MessageReceiver, its messages get matched with txs as they arrive
         msg_recvr = MessageReceiver()
-
-    # Initial block height
-    res = rpc_call("get_height")
-    block_height = int(res["result"]["height"])
-    block_height = 0
-    printm(PRE_MSG, f"Initial block height: {block_height}")
+        if IS_MESSAGE_TX_LOOKUP:
+            tx_lookup = TxLookup(scan_worker)
+        matcher = TxMessageMatcher(ledger,
+                                   msg_recvr.potential_tx_id_msg_map,
+                                   DEFAULT_NOTIFICATION_NAME,
+                                   DEFAULT_NOTIFICATION_MESSAGE,
+                                   tx_lookup)
+
+    # Sleep until a MessageReceiver socket is readable or the next deadline is reached
+    selector = selectors.DefaultSelector()
+    if MODE == MODE_DONATION:
+        msg_recvr.register(selector)
+    scan_worker.register(selector)
+    if tx_lookup is not None:
+        tx_lookup.register(selector)
+    if IS_TX_NOTIFY:
+        tx_notify_listener = TxNotifyListener()
+        tx_notify_listener.register(selector)
+    if IS_ZMQ:
+        chain_subscriber = ChainSubscriber(ZMQ_URL)
+        chain_subscriber.register(selector)
+
+    for poller in wallet_pool.pollers:
+        # Continue from journal, txs that arrived while we were down get scanned.
+        # Journals of a single wallet setup have no label.
+        if journal_state is not None:
+            heights = journal_state["heights"]
+            height_floor = heights.get(poller.label, heights.get(None))
+            if height_floor is not None:
+                poller.init_height(*height_floor)
+        printm(PRE_MSG, f"[{poller.label}] Initial block height: {poller.block_height}")
+        if journal is not None:
+            journal.log_height(poller.label, poller.block_height, poller.scan_floor_height)
+    # { wallet label : (height, floor) } of the scans that were added to the
+    # ledger, the pollers are ahead while their results are on the way.
+    scan_heights = {poller.label : (poller.block_height, poller.scan_floor_height)
+                    for poller in wallet_pool.pollers}
+
+    # The pollers belong to the scan worker from here on
+    supervisor.add(scan_worker)
+    if tx_lookup is not None:
+        supervisor.add(tx_lookup)
 
     while True:
-        block_height = update_incoming_tx_cache(incoming_tx_cache, already_handled_tx_ids, block_height)
+        metrics.main_loop_iterations_total.inc()
+        supervisor.check()
+        if IS_ZMQ:
+            update_chain_events()
+        for label, height_floor in update_incoming_tx_cache(ledger).items():
+            scan_heights[label] = height_floor
+            if journal is not None:
+                journal.log_height(label, *height_floor)
+        if IS_TX_NOTIFY and tx_notify_listener.has_pushed():
+            update_pushed_txs(ledger)
+        if tx_lookup is not None:
+            update_looked_up_txs(ledger, tx_lookup)
+
+        update_timed_out_messages(ledger)
 
+        # Pop-Up
+        for pop_up, is_shown in renderer.take_done():
+            if not is_shown:
+                printw(PRE_MSG, f"Pop-up for {len(pop_up.records)} tx(s) not shown, renderer restarted.")
+            for rec in pop_up.records:
+                tracer.event(rec.tx_id, STAGE_POP_UP_END, is_shown=is_shown)
+                ledger.finish(rec, is_shown)
+        if len(ledger.queue) > 0 and\
+                not renderer.is_busy() and\
+                time.monotonic() >= pop_up_end_time:
+            pop_up = scheduler.next_pop_up(ledger)
+            printm(PRE_MSG, f"Pop-up for {len(pop_up.records)} tx(s), {pop_up.duration:.1f} s, "\
+                            f"queue wait {scheduler.last_wait:.1f} s, {len(ledger.queue)} still queued.")
+
+            for rec in pop_up.records:
+                tracer.event(rec.tx_id, STAGE_POP_UP_START, num_txs=len(pop_up.records))
+
+            # Non-blocking, the render worker shows it
+            renderer.show(pop_up)
+            pop_up_end_time = time.monotonic() + pop_up.duration
+
+        metrics.queue_depth.set(len(ledger.queue))
+        metrics.pending_txs.set(len(ledger.pending))
+
+        if journal is not None and journal.is_compaction_due():
+            journal.compact(ledger.snapshot(scan_heights))
+
+        # Wait for the next event
+        wake_up_time = next_wake_up_time(ledger)
         if MODE == MODE_DONATION:
-            msg_recvr.step()
-
-            if len(incoming_tx_cache) > 0:
-                update_confirmed_messages(incoming_tx_cache, msg_recvr.potential_tx_id_msg_map, message_queue, already_handled_tx_ids)
-
-        # Timed-out txs get a default user name and message, those get added to confirmed messages
-        update_timed_out_messages(incoming_tx_cache, message_queue, already_handled_tx_ids)
+            recvr_wake_up_time = msg_recvr.next_wake_up_time()
+            if recvr_wake_up_time is not None:
+                wake_up_time = min(wake_up_time, recvr_wake_up_time)
+            # TLS may hold already decrypted data, that the socket doesn't signal
+            if msg_recvr.has_pending():
+                wake_up_time = time.monotonic()
+        if IS_ZMQ:
+            zmq_wake_up_time = chain_subscriber.next_wake_up_time()
+            if zmq_wake_up_time is not None:
+                wake_up_time = min(wake_up_time, zmq_wake_up_time)
+        wait_for_events(selector, max(0, wake_up_time - time.monotonic()))
+
+        if IS_ZMQ:
+            chain_subscriber.step()
 
-        # Pop-Up
-        if len(message_queue) > 0 and\
-                (time.mktime(time.gmtime()) - pop_up_start_time > SHOW_NOTIFICATION_DURATION_SECONDS):
-            m = message_queue.pop(0)
-            already_handled_tx_ids.append(m["tx_id"])
-
-            # Spawn non-blocking pop-up
-            pop_up_thread = threading.Thread(target = notification_pop_up,
-                                             args= (m["user_name"],
-                                                    m['amount'],
-                                                    m["message"]))
-
-            pop_up_thread.start()
-            pop_up_start_time = time.mktime(time.gmtime())
-
-        while pop_up_thread != None and pop_up_thread.is_alive():
-            pop_up_thread.join(0.5)
-            if MODE == MODE_DONATION:
-                msg_recvr.step()
+        if MODE == MODE_DONATION:
+            msg_recvr.step()
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Shows a pop-up for incoming Monero transactions.")
+    parser.add_argument("--check", action="store_true",
+                        help="only validate config, wallet rpc and message receiver, then exit")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(check())
     main()